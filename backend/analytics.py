@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, Float, Integer, delete, distinct, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from .models import (
+    AnalyticsRefresh, Company, CompanyDailyAnalytics, DailyAnalytics, Flight, FlightArchive, RouteLoadAnalytics,
+    Ticket, TicketArchive, TicketStatus, User,
+)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен: без него укрупнение рядов считается в Python
+    np = None
+
+# Аналитика для админки.
+# Сводные таблицы (models: analytics_*) пересчитываются фоновой задачей раз в
+# ANALYTICS_REFRESH_SECONDS сгруппированными запросами: дневные ряды — только за
+# последние ANALYTICS_LOOKBACK_DAYS дней (более ранние дни уже не меняются),
+# загрузка маршрутов — целиком по таблице рейсов. Первый пересчёт строит всё.
+# Эндпоинты читают только сводные таблицы, поэтому их время не растёт
+# вместе с числом билетов. Рейсы и билеты читаются и из архива (archive.py),
+# чтобы перенос не менял уже посчитанную историю. Ручной пересчёт:
+#     python -m backend.analytics
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "300"))
+ANALYTICS_LOOKBACK_DAYS = int(os.getenv("ANALYTICS_LOOKBACK_DAYS", "3"))
+MAX_ANALYTICS_DAYS = 366
+BUCKETS = ("day", "week", "month")
+ROLLUPS = "rollups"
+
+SOLD = (TicketStatus.active, TicketStatus.refunded)  # проданные билеты, в том числе позже возвращённые
+ADDITIVE_FIELDS = ("bookings", "refunds", "revenue", "refunded", "new_users")
+# (билеты, рейсы): горячие таблицы и архив
+SOURCES = ((Ticket, Flight), (TicketArchive, FlightArchive))
+
+
+def _day(column):
+    return func.date(column, type_=Date)
+
+
+def _company_daily(since: datetime | None):
+    parts = []
+    for ticket, flight in SOURCES:
+        bookings = (
+            select(
+                flight.company_id, _day(ticket.created_at).label("day"),
+                func.count(ticket.id).label("bookings"), literal(0, Integer).label("refunds"),
+                func.sum(ticket.price).label("revenue"), literal(0.0, Float).label("refunded"),
+            )
+            .join(flight, flight.id == ticket.flight_id)
+            .where(ticket.status.in_(SOLD))
+            .group_by(flight.company_id, _day(ticket.created_at))
+        )
+        refunds = (
+            select(
+                flight.company_id, _day(ticket.canceled_at).label("day"),
+                literal(0, Integer).label("bookings"), func.count(ticket.id).label("refunds"),
+                literal(0.0, Float).label("revenue"), func.sum(ticket.price).label("refunded"),
+            )
+            .join(flight, flight.id == ticket.flight_id)
+            .where(ticket.status == TicketStatus.refunded)
+            .group_by(flight.company_id, _day(ticket.canceled_at))
+        )
+        if since is not None:
+            bookings = bookings.where(ticket.created_at >= since)
+            refunds = refunds.where(ticket.canceled_at >= since)
+        parts += [bookings, refunds]
+    parts = union_all(*parts).subquery()
+    return select(
+        parts.c.company_id, parts.c.day,
+        func.sum(parts.c.bookings), func.sum(parts.c.refunds),
+        func.sum(parts.c.revenue), func.sum(parts.c.refunded),
+    ).group_by(parts.c.company_id, parts.c.day)
+
+
+def _daily_rows(db: Session, since: datetime | None):
+    rows = {}
+
+    def row(day):
+        return rows.setdefault(day, {"day": day, **{f: 0 for f in ADDITIVE_FIELDS}, "active_users": 0})
+
+    totals = select(
+        CompanyDailyAnalytics.day,
+        func.sum(CompanyDailyAnalytics.bookings), func.sum(CompanyDailyAnalytics.refunds),
+        func.sum(CompanyDailyAnalytics.revenue), func.sum(CompanyDailyAnalytics.refunded),
+    ).group_by(CompanyDailyAnalytics.day)
+    # Покупатель считается один раз за день, даже если часть его билетов уже в архиве
+    purchases = []
+    for ticket, _ in SOURCES:
+        query = select(_day(ticket.created_at).label("day"), ticket.user_id).where(ticket.status.in_(SOLD))
+        if since is not None:
+            query = query.where(ticket.created_at >= since)
+        purchases.append(query)
+    purchases = union_all(*purchases).subquery()
+    buyers = select(purchases.c.day, func.count(distinct(purchases.c.user_id))).group_by(purchases.c.day)
+    signups = select(_day(User.created_at), func.count(User.id)).group_by(_day(User.created_at))
+    if since is not None:
+        totals = totals.where(CompanyDailyAnalytics.day >= since.date())
+        signups = signups.where(User.created_at >= since)
+    for day, bookings, refunds, revenue, refunded in db.execute(totals):
+        row(day).update(bookings=bookings, refunds=refunds, revenue=revenue, refunded=refunded)
+    for day, active_users in db.execute(buyers):
+        row(day)["active_users"] = active_users
+    for day, new_users in db.execute(signups):
+        if day is not None:
+            row(day)["new_users"] = new_users
+    return list(rows.values())
+
+
+def _route_load():
+    flights = union_all(*(
+        select(
+            flight.id, flight.departure_city_key, flight.arrival_city_key,
+            flight.departure_city, flight.arrival_city, flight.total_seats, flight.available_seats,
+        ).where(flight.departure_city_key.is_not(None), flight.arrival_city_key.is_not(None))
+        for flight in (Flight, FlightArchive)
+    )).subquery()
+    sold = func.sum(flights.c.total_seats - flights.c.available_seats)
+    total = func.sum(flights.c.total_seats)
+    return select(
+        flights.c.departure_city_key, flights.c.arrival_city_key,
+        func.min(flights.c.departure_city), func.min(flights.c.arrival_city),
+        func.count(flights.c.id), total, sold,
+        func.coalesce(sold * 1.0 / func.nullif(total, 0), 0.0),
+    ).group_by(flights.c.departure_city_key, flights.c.arrival_city_key)
+
+
+def last_refresh(db: Session):
+    return db.execute(select(AnalyticsRefresh.refreshed_at).where(AnalyticsRefresh.name == ROLLUPS)).scalar()
+
+
+def refresh_rollups(db: Session, full: bool = False):
+    """
+    Пересчитывает сводные таблицы в одной транзакции: читатели видят либо
+    прежние, либо новые данные. full=True (или первый запуск) — за всё время.
+    """
+    now = datetime.utcnow()
+    since = None
+    if not full and last_refresh(db) is not None:
+        since = datetime.combine(now.date() - timedelta(days=ANALYTICS_LOOKBACK_DAYS), datetime.min.time())
+
+    clear_company = delete(CompanyDailyAnalytics)
+    clear_daily = delete(DailyAnalytics)
+    if since is not None:
+        clear_company = clear_company.where(CompanyDailyAnalytics.day >= since.date())
+        clear_daily = clear_daily.where(DailyAnalytics.day >= since.date())
+    db.execute(clear_company)
+    db.execute(insert(CompanyDailyAnalytics).from_select(
+        ["company_id", "day", "bookings", "refunds", "revenue", "refunded"], _company_daily(since),
+    ))
+    db.execute(clear_daily)
+    daily = _daily_rows(db, since)
+    if daily:
+        db.execute(insert(DailyAnalytics), daily)
+
+    db.execute(delete(RouteLoadAnalytics))
+    db.execute(insert(RouteLoadAnalytics).from_select(
+        ["departure_city_key", "arrival_city_key", "departure_city", "arrival_city",
+         "flights", "total_seats", "sold_seats", "load_factor"],
+        _route_load(),
+    ))
+    db.execute(delete(AnalyticsRefresh).where(AnalyticsRefresh.name == ROLLUPS))
+    db.execute(insert(AnalyticsRefresh).values(name=ROLLUPS, refreshed_at=now))
+    db.commit()
+    return now
+
+
+# Чтение
+
+def _bucket_start(day: date, bucket: str):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def rebucket(rows: list[dict], bucket: str):
+    """
+    Укрупняет дневной ряд (по возрастанию day) до недель или месяцев.
+    Аддитивные поля суммируются; active_users — максимум за день в периоде
+    (число разных покупателей за неделю из дневных итогов не восстановить).
+    """
+    if bucket == "day" or not rows:
+        return rows
+    starts = [_bucket_start(row["day"], bucket) for row in rows]
+    boundaries = [i for i in range(len(rows)) if i == 0 or starts[i] != starts[i - 1]]
+    if np is not None:
+        sums = np.add.reduceat(np.array([[row[f] for f in ADDITIVE_FIELDS] for row in rows], dtype=float), boundaries)
+        peaks = np.maximum.reduceat(np.array([row["active_users"] for row in rows]), boundaries)
+        totals = [dict(zip(ADDITIVE_FIELDS, values.tolist())) for values in sums]
+        peaks = peaks.tolist()
+    else:
+        ends = boundaries[1:] + [len(rows)]
+        totals = [{f: sum(row[f] for row in rows[i:j]) for f in ADDITIVE_FIELDS} for i, j in zip(boundaries, ends)]
+        peaks = [max(row["active_users"] for row in rows[i:j]) for i, j in zip(boundaries, ends)]
+    result = []
+    for index, total, peak in zip(boundaries, totals, peaks):
+        for field in ("bookings", "refunds", "new_users"):
+            total[field] = int(total[field])
+        result.append({"day": starts[index], **total, "active_users": int(peak)})
+    return result
+
+
+def _with_rates(row: dict):
+    row["refund_rate"] = round(row["refunds"] / row["bookings"], 4) if row["bookings"] else 0.0
+    return row
+
+
+def get_overview(db: Session, days: int = 30, bucket: str = "day"):
+    """Ряд по дням (неделям, месяцам) за последние days дней; пустые дни — нулями."""
+    start = date.today() - timedelta(days=days - 1)
+    stored = {
+        row.day: row
+        for row in db.execute(
+            select(DailyAnalytics).where(DailyAnalytics.day >= start).order_by(DailyAnalytics.day)
+        ).scalars()
+    }
+    rows = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = stored.get(day)
+        rows.append({
+            "day": day,
+            **{f: getattr(row, f) if row else 0 for f in ADDITIVE_FIELDS},
+            "active_users": row.active_users if row else 0,
+        })
+    return {"refreshed_at": last_refresh(db), "series": [_with_rates(row) for row in rebucket(rows, bucket)]}
+
+
+def get_company_revenue(db: Session, days: int = 30):
+    """Итоги компаний за последние days дней, по убыванию выручки."""
+    start = date.today() - timedelta(days=days - 1)
+    query = (
+        select(
+            CompanyDailyAnalytics.company_id, Company.name.label("company_name"),
+            func.sum(CompanyDailyAnalytics.bookings).label("bookings"),
+            func.sum(CompanyDailyAnalytics.refunds).label("refunds"),
+            func.sum(CompanyDailyAnalytics.revenue).label("revenue"),
+            func.sum(CompanyDailyAnalytics.refunded).label("refunded"),
+        )
+        .join(Company, Company.id == CompanyDailyAnalytics.company_id)
+        .where(CompanyDailyAnalytics.day >= start)
+        .group_by(CompanyDailyAnalytics.company_id, Company.name)
+        .order_by(func.sum(CompanyDailyAnalytics.revenue).desc())
+    )
+    return [_with_rates(dict(row._mapping)) for row in db.execute(query)]
+
+
+def get_company_daily(db: Session, company_id: int, days: int = 30):
+    start = date.today() - timedelta(days=days - 1)
+    query = (
+        select(CompanyDailyAnalytics)
+        .where(CompanyDailyAnalytics.company_id == company_id, CompanyDailyAnalytics.day >= start)
+        .order_by(CompanyDailyAnalytics.day)
+    )
+    return [
+        _with_rates({
+            "day": row.day, "bookings": row.bookings, "refunds": row.refunds,
+            "revenue": row.revenue, "refunded": row.refunded,
+        })
+        for row in db.execute(query).scalars()
+    ]
+
+
+def get_route_load(db: Session, limit: int = 20, ascending: bool = False):
+    """Самые загруженные (или, с ascending, самые пустые) маршруты."""
+    order = RouteLoadAnalytics.load_factor.asc() if ascending else RouteLoadAnalytics.load_factor.desc()
+    return db.execute(select(RouteLoadAnalytics).order_by(order).limit(limit)).scalars().all()
+
+
+async def run_refresher(session_factory, interval: float = ANALYTICS_REFRESH_SECONDS):
+    """
+    Фоновая задача приложения (см. lifespan в main.py). session_factory —
+    синхронный sessionmaker: пересчёт идёт в отдельном потоке и не задерживает
+    ни запросы, ни продление аренды лидера (shared_state).
+    """
+    def refresh():
+        db = session_factory()
+        try:
+            return refresh_rollups(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            await asyncio.to_thread(refresh)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Analytics refresh failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal, engine
+    from .migrations import migrate
+
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        started = datetime.utcnow()
+        refresh_rollups(db, full=True)
+        print(f"Сводные таблицы аналитики пересчитаны за {(datetime.utcnow() - started).total_seconds():.1f} с")
+    finally:
+        db.close()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import DateTime, delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from . import flight_cache
+from .models import Flight, FlightArchive, Ticket, TicketArchive
+
+# Архив улетевших рейсов.
+# Рейсы, вылетевшие раньше чем ARCHIVE_AFTER_DAYS дней назад, вместе со всеми
+# их билетами переносятся из flights/tickets в flights_archive/tickets_archive
+# пачками по ARCHIVE_BATCH рейсов (INSERT ... SELECT и DELETE в одной
+# транзакции на пачку). Горячие таблицы, по которым идут поиск, покупка,
+# «мои билеты» и списки компании, остаются небольшими; история доступна:
+#   * пассажиры рейса (/company/flights/{id}/passengers) ищутся и в архиве;
+#   * ?archived=true у /company/flights и /tickets/my — архивные списки;
+#   * аналитика и пересчёт статистики компаний читают обе пары таблиц.
+# Счётчики company_stats перенос не меняет. Фоновая задача — раз в
+# ARCHIVE_INTERVAL_SECONDS; ручной запуск:
+#     python -m backend.archive
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "1").lower() in ("1", "true", "yes", "on")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "1000"))
+
+# Колонки архива (кроме archived_at) копируются из одноимённых колонок горячих таблиц
+FLIGHT_COLUMNS = [c.name for c in FlightArchive.__table__.columns if c.name != "archived_at"]
+TICKET_COLUMNS = [c.name for c in TicketArchive.__table__.columns if c.name != "archived_at"]
+
+
+def _copy(source, target, columns, condition, now: datetime):
+    return insert(target).from_select(
+        columns + ["archived_at"],
+        select(*(source.c[name] for name in columns), literal(now, DateTime)).where(condition),
+    )
+
+
+def archive_batch(db: Session, cutoff: date, batch_size: int = ARCHIVE_BATCH):
+    """
+    Переносит до batch_size рейсов с вылетом до cutoff и их билеты (без
+    коммита). Возвращает (id перенесённых рейсов, число билетов).
+    """
+    # id сохраняются в архиве; повторно они не выдаются (AUTOINCREMENT, миграция 10)
+    flight_ids = db.execute(
+        select(Flight.id)
+        .where(Flight.departure_date < cutoff)
+        .order_by(Flight.departure_date)
+        .limit(batch_size)
+    ).scalars().all()
+    if not flight_ids:
+        return [], 0
+    now = datetime.utcnow()
+    flights, tickets = Flight.__table__, Ticket.__table__
+    db.execute(_copy(flights, FlightArchive.__table__, FLIGHT_COLUMNS, flights.c.id.in_(flight_ids), now))
+    copied = db.execute(_copy(tickets, TicketArchive.__table__, TICKET_COLUMNS, tickets.c.flight_id.in_(flight_ids), now))
+    db.execute(delete(tickets).where(tickets.c.flight_id.in_(flight_ids)))
+    db.execute(delete(flights).where(flights.c.id.in_(flight_ids)))
+    return flight_ids, copied.rowcount
+
+
+def archive_departed(db: Session, today: date | None = None, after_days: int = ARCHIVE_AFTER_DAYS,
+                     batch_size: int = ARCHIVE_BATCH):
+    """
+    Переносит в архив все рейсы, вылетевшие раньше чем after_days дней назад.
+    Каждая пачка — своя транзакция; после коммита из кэша поиска убираются
+    страницы с перенесёнными рейсами. Возвращает {"flights": n, "tickets": m}.
+    """
+    cutoff = (today or date.today()) - timedelta(days=after_days)
+    result = {"flights": 0, "tickets": 0}
+    while True:
+        flight_ids, tickets = archive_batch(db, cutoff, batch_size)
+        if not flight_ids:
+            break
+        db.commit()
+        flight_cache.invalidate_seats(flight_ids)
+        result["flights"] += len(flight_ids)
+        result["tickets"] += tickets
+    return result
+
+
+async def run_archiver(session_factory, interval: float = ARCHIVE_INTERVAL_SECONDS):
+    """
+    Фоновая задача приложения (см. lifespan в main.py). session_factory —
+    синхронный sessionmaker: перенос идёт в отдельном потоке.
+    """
+    def archive():
+        db = session_factory()
+        try:
+            return archive_departed(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            result = await asyncio.to_thread(archive)
+            if result["flights"]:
+                logger.info("Archived %(flights)s flights and %(tickets)s tickets", result)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Archiving failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .database import SessionLocal, engine
+    from .migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Перенос улетевших рейсов и их билетов в архив")
+    parser.add_argument("--after-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        started = datetime.utcnow()
+        result = archive_departed(db, after_days=args.after_days)
+        print(f"В архив перенесено рейсов: {result['flights']}, билетов: {result['tickets']} "
+              f"за {(datetime.utcnow() - started).total_seconds():.1f} с")
+    finally:
+        db.close()
@@ -0,0 +1,145 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import analytics, archive, crud, group_commit, pricing, routing, schemas, search
+from .database import SessionLocal
+from .models import Flight, User
+from .pagination import DEFAULT_PAGE_SIZE
+
+# Асинхронные версии функций crud для роутеров на async def.
+# Простые чтения выполняются напрямую через AsyncSession, а операции из
+# нескольких шагов (учёт мест, статистика компаний) — через run_sync:
+# та же логика из crud исполняется в greenlet поверх асинхронного драйвера,
+# не блокируя event loop и не дублируясь в двух местах. Но run_sync исполняет
+# Python-код в потоке цикла событий: долгие вычисления (поиск по графу
+# рейсов, пересчёты по всей таблице) идут через _in_thread — в отдельном
+# потоке с собственной синхронной сессией.
+
+
+async def _in_thread(func, *args, **kwargs):
+    def run():
+        db = SessionLocal()
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await asyncio.to_thread(run)
+
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+async def check_user_active(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.check_user_active, user_id)
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate, hashed_password: str | None = None):
+    return await db.run_sync(crud.create_user, user, hashed_password)
+
+async def get_all_users(db: AsyncSession, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE):
+    return await db.run_sync(crud.get_all_users, cursor, limit)
+
+async def get_all_companies(db: AsyncSession, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE):
+    return await db.run_sync(crud.get_all_companies, cursor, limit)
+
+async def create_manager(db: AsyncSession, manager: schemas.ManagerCreate, hashed_password: str | None = None):
+    return await db.run_sync(crud.create_manager, manager, hashed_password)
+
+async def update_password_hash(db: AsyncSession, user_id: int, hashed_password: str):
+    return await db.run_sync(crud.update_password_hash, user_id, hashed_password)
+
+async def update_user_status(db: AsyncSession, user_id: int, is_active: bool):
+    return await db.run_sync(crud.update_user_status, user_id, is_active)
+
+async def get_admin_stats(db: AsyncSession):
+    return await db.run_sync(crud.get_admin_stats)
+
+# Аналитика (сводные таблицы, см. analytics.py)
+async def get_analytics_overview(db: AsyncSession, days: int, bucket: str):
+    return await db.run_sync(analytics.get_overview, days, bucket)
+
+async def get_company_revenue(db: AsyncSession, days: int):
+    return await db.run_sync(analytics.get_company_revenue, days)
+
+async def get_company_daily(db: AsyncSession, company_id: int, days: int):
+    return await db.run_sync(analytics.get_company_daily, company_id, days)
+
+async def get_route_load(db: AsyncSession, limit: int, ascending: bool):
+    return await db.run_sync(analytics.get_route_load, limit, ascending)
+
+async def refresh_analytics(full: bool = False):
+    # Полный пересчёт идёт по всем билетам и архиву — в отдельном потоке
+    return await _in_thread(analytics.refresh_rollups, full)
+
+async def reprice_flights():
+    # Все рейсы пачками — как и фоновая задача, в отдельном потоке
+    return await _in_thread(pricing.reprice_all)
+
+async def archive_departed():
+    # Пачки переноса со своими транзакциями — в отдельном потоке, как у run_archiver
+    return await _in_thread(archive.archive_departed)
+
+# Рейсы
+async def create_flight(db: AsyncSession, flight: schemas.FlightCreate, company_id: int):
+    return await db.run_sync(crud.create_flight, flight, company_id)
+
+async def get_company_flights(db: AsyncSession, company_id: int, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                              archived: bool = False):
+    return await db.run_sync(crud.get_company_flights, company_id, cursor, limit, archived)
+
+async def update_flight_status(db: AsyncSession, flight_id: int, company_id: int, is_active: bool):
+    return await db.run_sync(crud.update_flight_status, flight_id, company_id, is_active)
+
+async def delete_flight(db: AsyncSession, flight_id: int, company_id: int):
+    return await db.run_sync(crud.delete_flight, flight_id, company_id)
+
+async def get_flight_passengers(db: AsyncSession, flight_id: int, company_id: int):
+    return await db.run_sync(crud.get_flight_passengers, flight_id, company_id)
+
+async def get_flight_availability(db: AsyncSession, flight_ids: list[int]):
+    result = await db.execute(select(Flight.id, Flight.available_seats, Flight.is_active, Flight.current_price).where(Flight.id.in_(flight_ids)))
+    return result.all()
+
+async def get_company_stats(db: AsyncSession, company_id: int):
+    return await db.run_sync(crud.get_company_stats, company_id)
+
+async def search_flights(db: AsyncSession, departure_city=None, arrival_city=None, date=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    return await db.run_sync(search.search_flights_page, departure_city, arrival_city, date, cursor, limit)
+
+async def search_itineraries(departure_city: str, arrival_city: str, date, **options):
+    # (Пере)загрузка графа и поиск по нему — процессорная работа
+    return await _in_thread(routing.search_itineraries, departure_city, arrival_city, date, **options)
+
+async def load_city_index(db: AsyncSession):
+    await db.run_sync(search.city_index.ensure_loaded)
+
+async def autocomplete_cities(db: AsyncSession, prefix: str, limit: int = 10):
+    return await db.run_sync(search.autocomplete, prefix, limit)
+
+# Билеты
+async def create_ticket(db: AsyncSession, user_id: int, flight_id: int):
+    # При GROUP_COMMIT=1 покупка идёт через общий конвейер коммитов (group_commit.py)
+    if group_commit.writer is not None:
+        return await group_commit.writer.book(user_id, flight_id)
+    return await db.run_sync(crud.create_ticket, user_id, flight_id)
+
+async def create_tickets(db: AsyncSession, user_id: int, items: list[schemas.TicketBatchItem], hold: bool = False):
+    return await db.run_sync(crud.create_tickets, user_id, items, hold)
+
+async def confirm_holds(db: AsyncSession, user_id: int, ticket_ids: list[int]):
+    return await db.run_sync(crud.confirm_holds, user_id, ticket_ids)
+
+async def release_holds(db: AsyncSession, user_id: int, ticket_ids: list[int]):
+    return await db.run_sync(crud.release_holds, user_id, ticket_ids)
+
+async def get_user_tickets(db: AsyncSession, user_id: int, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                           archived: bool = False):
+    return await db.run_sync(crud.get_user_tickets, user_id, cursor, limit, archived)
+
+async def cancel_ticket(db: AsyncSession, user_id: int, ticket_id: int):
+    if group_commit.writer is not None:
+        return await group_commit.writer.refund(user_id, ticket_id)
+    return await db.run_sync(crud.cancel_ticket, user_id, ticket_id)
@@ -1,27 +1,27 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from .database import get_db
-from . import crud, models, schemas
+from sqlalchemy.ext.asyncio import AsyncSession
+import time
+from .cache import TTLCache
+from .hashing import pwd_context, hash_sync
+from .database import get_async_db
+from . import async_crud, models, schemas, shared_state
 
 SECRET_KEY = "your_secret_key"  # Замени на безопасный ключ
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Синхронные варианты для скриптов и сидирования; роутеры используют пул из hashing.py
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    # Truncate password if it's too long for bcrypt
-    if len(password) > 72:
-        password = password[:72]
-    return pwd_context.hash(password)
+    return hash_sync(password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -29,16 +29,86 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Кэш горячего пути авторизации: токен -> email и email -> снимок пользователя.
+# Снимок сбрасывается через invalidate_user при блокировке/смене роли,
+# поэтому отзыв доступа срабатывает сразу, а не через TTL (на всех воркерах:
+# сброс рассылается через shared_state).
+TOKEN_CACHE_TTL_SECONDS = 300
+USER_CACHE_TTL_SECONDS = 60
+AUTH_CACHE_SIZE = 10000
+USER_CHANNEL = "auth_user"
+
+token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=TOKEN_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Неизменяемый снимок пользователя, не привязанный к сессии БД."""
+    id: int
+    email: str
+    first_name: str | None
+    last_name: str | None
+    role: models.UserRole
+    company_id: int | None
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, user: models.User):
+        return cls(
+            id=user.id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            role=user.role,
+            company_id=user.company_id,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+def invalidate_user(email: str):
+    user_cache.delete(email)
+    shared_state.broadcast(USER_CHANNEL, email)
+
+
+@shared_state.on(USER_CHANNEL)
+def _invalidate_remote_user(email: str):
+    user_cache.delete(email)
+
+
+def _decode_token_email(token: str):
+    email = token_cache.get(token)
+    if email is not None:
+        return email
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    email = payload.get("sub")
+    if email is None:
+        return None
+    ttl = TOKEN_CACHE_TTL_SECONDS
+    if payload.get("exp") is not None:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, email, ttl=ttl)
+    return email
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
+        email = _decode_token_email(token)
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_email(db, email=email)
+    user = user_cache.get(email)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        db_user = await async_crud.get_user_by_email(db, email=email)
+        if db_user is None:
+            raise credentials_exception
+        user = CurrentUser.from_model(db_user)
+        user_cache.set(email, user)
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Пользователь заблокирован")
+    return user
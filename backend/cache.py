@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Простой потокобезопасный LRU-кэш с временем жизни записей.
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or item[0] <= now:
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl: float | None = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResponseCache:
+    """
+    LRU-кэш готовых тел ответов с ограничением по памяти.
+    Записи помечаются тегами и id объектов, по которым их можно точечно
+    сбросить. version растёт при каждом сбросе: ответ, посчитанный до сброса,
+    не сохраняется (иначе в кэш попали бы уже устаревшие данные).
+    """
+
+    ENTRY_OVERHEAD = 256  # примерный расход памяти на запись помимо тела
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 60.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self.size = 0
+        self._data = OrderedDict()  # key -> (expires_at, value, size, tags, ids)
+        self._by_tag = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        _, _, size, tags, ids = self._data.pop(key)
+        self.size -= size
+        for index, names in ((self._by_tag, tags), (self._by_id, ids)):
+            for name in names:
+                keys = index.get(name)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[name]
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, size: int, tags=(), ids=(), version: int | None = None):
+        size += self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, size, tuple(tags), tuple(ids))
+            self.size += size
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            for id_ in ids:
+                self._by_id.setdefault(id_, set()).add(key)
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._data)))
+
+    def invalidate(self, tags=(), ids=()):
+        with self._lock:
+            self.version += 1
+            keys = set()
+            for tag in tags:
+                keys |= self._by_tag.get(tag, set())
+            for id_ in ids:
+                keys |= self._by_id.get(id_, set())
+            for key in keys:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+            self._by_tag.clear()
+            self._by_id.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
@@ -1,9 +1,13 @@
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
-from .models import User, Company, Flight, UserRole, Ticket, TicketStatus
-from .auth import get_password_hash
-from . import schemas
-from sqlalchemy import func
+from .models import User, Company, Flight, UserRole, Ticket, TicketStatus, FlightArchive, TicketArchive
+from .hashing import hash_sync as get_password_hash
+from . import auth, schemas, inventory, stats, flight_cache, holds, events
+from .search import normalize_city, city_index
+from .routing import flight_graph
+from .pagination import paginate, DEFAULT_PAGE_SIZE
+from sqlalchemy import func, insert, select, update
+from datetime import datetime, timedelta
 
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
@@ -26,8 +30,10 @@ def check_user_active(db: Session, user_id: int):
         )
     return user
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str | None = None):
+    # Хэш можно посчитать заранее (в пуле hashing.py), чтобы не нагружать CPU здесь
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     
     # Конвертируем строку в enum
     if user.role == "admin":
@@ -49,15 +55,27 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
-def get_all_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(User).offset(skip).limit(limit).all()
+# Списки используют keyset-пагинацию (см. pagination.py): вместо OFFSET
+# передаётся курсор, функции возвращают (строки, курсор следующей страницы)
+USERS_ORDER = (User.id,)
+COMPANIES_ORDER = (Company.id,)
+COMPANY_FLIGHTS_ORDER = (Flight.id,)
+USER_TICKETS_ORDER = (Ticket.created_at, Ticket.id)  # по убыванию
+ARCHIVED_FLIGHTS_ORDER = (FlightArchive.id,)
+ARCHIVED_TICKETS_ORDER = (TicketArchive.created_at, TicketArchive.id)  # по убыванию
 
-def get_all_companies(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Company).offset(skip).limit(limit).all()
+def get_all_users(db: Session, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE):
+    return paginate(db.query(User), USERS_ORDER, cursor, limit)
+
+def get_all_companies(db: Session, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE):
+    return paginate(db.query(Company), COMPANIES_ORDER, cursor, limit)
 
 def create_company(db: Session, company: schemas.CompanyCreate):
     db_company = Company(name=company.name)
     db.add(db_company)
+    db.flush()
+    # Строка статистики появляется вместе с компанией (см. stats.py)
+    stats.create_stats_row(db, db_company.id)
     db.commit()
     db.refresh(db_company)
     return db_company
@@ -65,14 +83,15 @@ def create_company(db: Session, company: schemas.CompanyCreate):
 def get_company_by_name(db: Session, name: str):
     return db.query(Company).filter(Company.name == name).first()
 
-def create_manager(db: Session, manager: schemas.ManagerCreate):
+def create_manager(db: Session, manager: schemas.ManagerCreate, hashed_password: str | None = None):
     # Найти или создать компанию
     company = get_company_by_name(db, manager.company_name)
     if not company:
         company = create_company(db, schemas.CompanyCreate(name=manager.company_name))
     
     # Создать менеджера
-    hashed_password = get_password_hash(manager.password)
+    if hashed_password is None:
+        hashed_password = get_password_hash(manager.password)
     from .models import UserRole
     db_manager = User(
         email=manager.email, 
@@ -85,22 +104,33 @@ def create_manager(db: Session, manager: schemas.ManagerCreate):
     db.refresh(db_manager)
     return db_manager
 
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(hashed_password=hashed_password)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
 def update_user_status(db: Session, user_id: int, is_active: bool):
     user = db.query(User).filter(User.id == user_id).first()
     if user:
         user.is_active = is_active
         db.commit()
         db.refresh(user)
+        # Сбрасываем кэш авторизации, чтобы блокировка сработала сразу
+        auth.invalidate_user(user.email)
     return user
 
-def get_users_count(db: Session):
-    return db.query(User).count()
-
-def get_companies_count(db: Session):
-    return db.query(Company).count()
-
-def get_active_users_count(db: Session):
-    return db.query(User).filter(User.is_active == True).count()
+def get_admin_stats(db: Session):
+    # Одним запросом вместо трёх COUNT
+    row = db.execute(select(
+        select(func.count(User.id)).scalar_subquery().label("total_users"),
+        select(func.count(User.id)).where(User.is_active == True).scalar_subquery().label("active_users"),
+        select(func.count(Company.id)).scalar_subquery().label("total_companies"),
+    )).one()
+    return dict(row._mapping)
 
 # Flight CRUD operations
 def create_flight(db: Session, flight: schemas.FlightCreate, company_id: int):
@@ -117,6 +147,8 @@ def create_flight(db: Session, flight: schemas.FlightCreate, company_id: int):
         flight_number=flight.flight_number,
         departure_city=flight.departure_city,
         arrival_city=flight.arrival_city,
+        departure_city_key=normalize_city(flight.departure_city),
+        arrival_city_key=normalize_city(flight.arrival_city),
         departure_date=departure_date,
         departure_time=departure_time,
         arrival_date=arrival_date,
@@ -126,12 +158,32 @@ def create_flight(db: Session, flight: schemas.FlightCreate, company_id: int):
         price=flight.price
     )
     db.add(db_flight)
+    db.flush()
+    stats.apply_delta(
+        db, company_id,
+        total_flights=1, active_flights=1,
+        total_seats=db_flight.total_seats, available_seats=db_flight.available_seats,
+    )
     db.commit()
     db.refresh(db_flight)
+    city_index.add(db_flight.departure_city, db_flight.arrival_city)
+    flight_graph.add(db_flight)
+    flight_cache.invalidate_flight(db_flight)
     return db_flight
 
-def get_company_flights(db: Session, company_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Flight).filter(Flight.company_id == company_id).offset(skip).limit(limit).all()
+def company_flights_query(db: Session, company_id: int, archived: bool = False):
+    # archived=True — улетевшие рейсы, перенесённые в архив (archive.py)
+    model = FlightArchive if archived else Flight
+    return db.query(model).filter(model.company_id == company_id)
+
+def import_flight_schedule(db: Session, fileobj, fmt: str, company_id: int, atomic: bool = False):
+    from .schedule_import import import_schedule
+    return import_schedule(db, fileobj, fmt, company_id, atomic)
+
+def get_company_flights(db: Session, company_id: int, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                        archived: bool = False):
+    order = ARCHIVED_FLIGHTS_ORDER if archived else COMPANY_FLIGHTS_ORDER
+    return paginate(company_flights_query(db, company_id, archived), order, cursor, limit)
 
 def get_flight_by_id(db: Session, flight_id: int, company_id: int):
     return db.query(Flight).filter(Flight.id == flight_id, Flight.company_id == company_id).first()
@@ -139,9 +191,18 @@ def get_flight_by_id(db: Session, flight_id: int, company_id: int):
 def update_flight_status(db: Session, flight_id: int, company_id: int, is_active: bool):
     flight = db.query(Flight).filter(Flight.id == flight_id, Flight.company_id == company_id).first()
     if flight:
-        flight.is_active = is_active
+        if bool(flight.is_active) != is_active:
+            flight.is_active = is_active
+            db.flush()
+            stats.apply_delta(db, company_id, active_flights=1 if is_active else -1)
+            events.stage(db, events.flight_topic(flight_id), is_active=is_active)
         db.commit()
         db.refresh(flight)
+        if flight.is_active:
+            flight_graph.add(flight)
+        else:
+            flight_graph.remove(flight.id)
+        flight_cache.invalidate_flight(flight)
     return flight
 
 def delete_flight(db: Session, flight_id: int, company_id: int):
@@ -153,39 +214,59 @@ def delete_flight(db: Session, flight_id: int, company_id: int):
     if has_tickets:
         return False
     db.delete(flight)
+    db.flush()
+    stats.apply_delta(
+        db, company_id,
+        total_flights=-1, active_flights=-1 if flight.is_active else 0,
+        total_seats=-flight.total_seats, available_seats=-flight.available_seats,
+    )
+    events.stage(db, events.flight_topic(flight_id), is_active=False)
     db.commit()
+    flight_graph.remove(flight_id)
+    flight_cache.invalidate_flight(flight)
     return True
 
+def _flight_passenger_rows(db: Session, flight_id: int, company_id: int, ticket_model, flight_model):
+    return db.execute(
+        select(
+            ticket_model.id, ticket_model.status, ticket_model.price, ticket_model.created_at,
+            User.id.label("user_id"), User.email, User.first_name, User.last_name, User.is_active,
+        )
+        .join(flight_model, flight_model.id == ticket_model.flight_id)
+        .join(User, User.id == ticket_model.user_id)
+        .where(ticket_model.flight_id == flight_id, flight_model.company_id == company_id)
+        .order_by(ticket_model.created_at.desc())
+    ).all()
+
 def get_flight_passengers(db: Session, flight_id: int, company_id: int):
-    # Проверяем принадлежность рейса компании
-    flight = db.query(Flight).filter(Flight.id == flight_id, Flight.company_id == company_id).first()
-    if not flight:
-        return None
-    # Выгружаем билеты с пользователями
-    from sqlalchemy.orm import joinedload
-    tickets = (
-        db.query(Ticket)
-        .options(joinedload(Ticket.user))
-        .filter(Ticket.flight_id == flight_id)
-        .order_by(Ticket.created_at.desc())
-        .all()
-    )
-    result = []
-    for t in tickets:
-        result.append({
-            "ticket_id": t.id,
-            "status": t.status.value,
-            "price": t.price,
-            "created_at": t.created_at.isoformat(),
+    # Один запрос по нужным колонкам; принадлежность рейса компании — условие
+    # того же запроса, отдельная проверка нужна, только если пассажиров нет.
+    # Улетевший рейс мог уйти в архив вместе с билетами — тогда ищем там
+    rows = _flight_passenger_rows(db, flight_id, company_id, Ticket, Flight)
+    if not rows:
+        rows = _flight_passenger_rows(db, flight_id, company_id, TicketArchive, FlightArchive)
+    if not rows:
+        owned = db.scalar(
+            select(Flight.id).where(Flight.id == flight_id, Flight.company_id == company_id)
+            .union_all(select(FlightArchive.id).where(FlightArchive.id == flight_id, FlightArchive.company_id == company_id))
+        )
+        return [] if owned else None
+    return [
+        {
+            "ticket_id": r.id,
+            "status": r.status,
+            "price": r.price,
+            "created_at": r.created_at,
             "user": {
-                "id": t.user.id,
-                "email": t.user.email,
-                "first_name": getattr(t.user, "first_name", None),
-                "last_name": getattr(t.user, "last_name", None),
-                "is_active": t.user.is_active,
-            }
-        })
-    return result
+                "id": r.user_id,
+                "email": r.email,
+                "first_name": r.first_name,
+                "last_name": r.last_name,
+                "is_active": r.is_active,
+            },
+        }
+        for r in rows
+    ]
 
 def get_company_flights_count(db: Session, company_id: int):
     return db.query(Flight).filter(Flight.company_id == company_id).count()
@@ -194,58 +275,189 @@ def get_active_company_flights_count(db: Session, company_id: int):
     return db.query(Flight).filter(Flight.company_id == company_id, Flight.is_active == True).count()
 
 def get_company_stats(db: Session, company_id: int):
-    flights = db.query(Flight).filter(Flight.company_id == company_id).all()
-    
-    total_flights = len(flights)
-    active_flights = len([f for f in flights if f.is_active])
-    total_seats = sum(f.total_seats for f in flights)
-    available_seats = sum(f.available_seats for f in flights)
-    total_revenue = sum((f.total_seats - f.available_seats) * f.price for f in flights)
-    
-    return {
-        "total_flights": total_flights,
-        "active_flights": active_flights,
-        "total_seats": total_seats,
-        "available_seats": available_seats,
-        "total_revenue": total_revenue
-    }
+    # Читается одна материализованная строка (см. stats.py)
+    return stats.get_company_stats(db, company_id)
 
 # Tickets
-def create_ticket(db: Session, user_id: int, flight_id: int):
-    flight = db.query(Flight).filter(Flight.id == flight_id, Flight.is_active == True).first()
-    if not flight or flight.available_seats <= 0:
+def book_ticket(db: Session, user_id: int, flight_id: int):
+    """
+    Покупка одного места без коммита (его делает create_ticket или конвейер
+    group_commit). Если мест нет, ничего не меняет и возвращает None.
+    """
+    # Места списываются атомарно в inventory, без чтения-изменения-записи в Python
+    reserved = inventory.reserve_seats(db, flight_id)
+    if reserved is None:
         return None
-    flight.available_seats -= 1
-    ticket = Ticket(user_id=user_id, flight_id=flight_id, price=flight.price, status=TicketStatus.active)
+    price, company_id = reserved
+    ticket = Ticket(user_id=user_id, flight_id=flight_id, price=price, status=TicketStatus.active)
     db.add(ticket)
+    db.flush()
+    stats.apply_delta(db, company_id, available_seats=-1, total_revenue=price)
+    return ticket
+
+def create_ticket(db: Session, user_id: int, flight_id: int):
+    ticket = book_ticket(db, user_id, flight_id)
+    if ticket is None:
+        db.rollback()
+        return None
     db.commit()
+    flight_cache.invalidate_seats([flight_id])
     db.refresh(ticket)
     return ticket
 
-def get_user_tickets(db: Session, user_id: int):
-    # Возвращаем билеты вместе с данными рейса
-    from sqlalchemy.orm import joinedload
+MAX_SEATS_PER_BOOKING = 50
+
+def create_tickets(db: Session, user_id: int, items: list[schemas.TicketBatchItem], hold: bool = False):
+    """
+    Групповая покупка: все места на всех рейсах списываются в одной транзакции,
+    по одному условному UPDATE на рейс. Если хотя бы на одном рейсе мест не
+    хватает — откатывается всё.
+    hold=True создаёт временную бронь (held) вместо проданных билетов:
+    места списаны, выручка появится при подтверждении (confirm_holds).
+    """
+    seats_by_flight = {}
+    for item in items:
+        seats_by_flight[item.flight_id] = seats_by_flight.get(item.flight_id, 0) + item.seats
+    if sum(seats_by_flight.values()) > MAX_SEATS_PER_BOOKING:
+        raise HTTPException(status_code=400, detail=f"No more than {MAX_SEATS_PER_BOOKING} seats per booking")
+
+    ticket_status = TicketStatus.held if hold else TicketStatus.active
+    hold_expires_at = datetime.utcnow() + timedelta(seconds=holds.SEAT_HOLD_SECONDS) if hold else None
+    rows, deltas = [], {}
+    # Рейсы в порядке id — одинаковый порядок блокировок у параллельных транзакций
+    for flight_id in sorted(seats_by_flight):
+        seats = seats_by_flight[flight_id]
+        reserved = inventory.reserve_seats(db, flight_id, seats)
+        if reserved is None:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Flight {flight_id} is unavailable")
+        price, company_id = reserved
+        rows.extend(
+            {"user_id": user_id, "flight_id": flight_id, "price": price, "status": ticket_status, "hold_expires_at": hold_expires_at}
+            for _ in range(seats)
+        )
+        seats_delta, revenue_delta = deltas.get(company_id, (0, 0.0))
+        deltas[company_id] = (seats_delta + seats, revenue_delta + (0.0 if hold else price * seats))
+
+    tickets = db.execute(
+        insert(Ticket).returning(*TICKET_OUT_COLUMNS),
+        rows,
+    ).all()
+    for company_id, (seats, revenue) in deltas.items():
+        stats.apply_delta(db, company_id, available_seats=-seats, total_revenue=revenue)
+    db.commit()
+    flight_cache.invalidate_seats(seats_by_flight)
+    return [_ticket_out(t) for t in tickets]
+
+TICKET_OUT_COLUMNS = (Ticket.id, Ticket.flight_id, Ticket.price, Ticket.status, Ticket.created_at, Ticket.hold_expires_at)
+
+def _ticket_out(row):
+    return {
+        "id": row.id, "flight_id": row.flight_id, "price": row.price, "status": row.status.value,
+        "created_at": row.created_at, "hold_expires_at": row.hold_expires_at,
+    }
+
+def confirm_holds(db: Session, user_id: int, ticket_ids: list[int]):
+    """
+    Подтверждает брони пользователя: held -> active, все или ни одной.
+    Истёкшую (даже ещё не снятую сборщиком) бронь подтвердить нельзя.
+    """
+    ticket_ids = sorted(set(ticket_ids))
+    now = datetime.utcnow()
+    rows = db.execute(
+        select(Ticket.id, Ticket.price, Flight.company_id)
+        .join(Flight, Flight.id == Ticket.flight_id)
+        .where(
+            Ticket.id.in_(ticket_ids), Ticket.user_id == user_id,
+            Ticket.status == TicketStatus.held, Ticket.hold_expires_at > now,
+        )
+    ).all()
+    result = None
+    if len(rows) == len(ticket_ids):
+        # Условный переход: бронь, которую тем временем снял сборщик, не подтвердится
+        result = db.execute(
+            update(Ticket)
+            .where(Ticket.id.in_(ticket_ids), Ticket.status == TicketStatus.held, Ticket.hold_expires_at > now)
+            .values(status=TicketStatus.active, hold_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+    if result is None or result.rowcount != len(ticket_ids):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Some seat holds are missing or expired")
+    revenue = {}
+    for row in rows:
+        revenue[row.company_id] = revenue.get(row.company_id, 0.0) + row.price
+    for company_id, amount in revenue.items():
+        stats.apply_delta(db, company_id, total_revenue=amount)
+    db.commit()
+    return [_ticket_out(t) for t in db.execute(select(*TICKET_OUT_COLUMNS).where(Ticket.id.in_(ticket_ids)).order_by(Ticket.id))]
+
+def release_holds(db: Session, user_id: int, ticket_ids: list[int]):
+    """Отказ от броней пользователя до истечения срока; возвращает число снятых."""
+    released = holds.release_holds(db, sorted(set(ticket_ids)), TicketStatus.canceled, Ticket.user_id == user_id)
+    db.commit()
+    if released:
+        flight_cache.invalidate_seats(released)
+    return sum(released.values())
+
+def user_tickets_query(db: Session, user_id: int, archived: bool = False):
+    # Билеты с данными рейса — только нужные колонки, в форме schemas.MyTicketOut;
+    # archived=True — билеты улетевших рейсов из архива (archive.py)
+    ticket, flight = (TicketArchive, FlightArchive) if archived else (Ticket, Flight)
     return (
-        db.query(Ticket)
-        .options(joinedload(Ticket.flight))
-        .filter(Ticket.user_id == user_id)
-        .order_by(Ticket.created_at.desc())
-        .all()
+        db.query(
+            ticket.id, ticket.flight_id, flight.flight_number,
+            (flight.departure_city + " → " + flight.arrival_city).label("route"),
+            flight.departure_date.label("date"), flight.departure_time.label("time"),
+            ticket.price, ticket.status, ticket.created_at,
+        )
+        .join(flight, flight.id == ticket.flight_id)
+        .filter(ticket.user_id == user_id)
     )
 
-def cancel_ticket(db: Session, user_id: int, ticket_id: int):
-    from datetime import datetime, timedelta
-    ticket = db.query(Ticket).filter(Ticket.id == ticket_id, Ticket.user_id == user_id).first()
-    if not ticket or ticket.status != TicketStatus.active:
+def get_user_tickets(db: Session, user_id: int, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                     archived: bool = False):
+    order = ARCHIVED_TICKETS_ORDER if archived else USER_TICKETS_ORDER
+    return paginate(user_tickets_query(db, user_id, archived), order, cursor, limit, descending=True)
+
+def refund_ticket(db: Session, user_id: int, ticket_id: int):
+    """
+    Возврат билета без коммита. None — билета нет или он не активен,
+    False — до вылета меньше 24 часов; в обоих случаях ничего не меняется.
+    Иначе — (flight_id, released): вернулось ли место на рейс.
+    """
+    row = (
+        db.query(Ticket.flight_id, Ticket.price, Flight.company_id, Flight.departure_date, Flight.departure_time)
+        .join(Flight, Flight.id == Ticket.flight_id)
+        .filter(Ticket.id == ticket_id, Ticket.user_id == user_id, Ticket.status == TicketStatus.active)
+        .first()
+    )
+    if not row:
         return None
-    flight = db.query(Flight).filter(Flight.id == ticket.flight_id).first()
     # Проверка окна возврата 24ч
-    flight_dt = datetime.combine(flight.departure_date, flight.departure_time)
+    flight_dt = datetime.combine(row.departure_date, row.departure_time)
     if flight_dt - datetime.utcnow() < timedelta(hours=24):
         return False
-    ticket.status = TicketStatus.refunded
-    ticket.canceled_at = datetime.utcnow()
-    flight.available_seats += 1
+    # Условный переход active -> refunded: повторная отмена не вернёт место дважды
+    result = db.execute(
+        update(Ticket)
+        .where(Ticket.id == ticket_id, Ticket.status == TicketStatus.active)
+        .values(status=TicketStatus.refunded, canceled_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return None
+    released = inventory.release_seats(db, row.flight_id)
+    stats.apply_delta(db, row.company_id, available_seats=1 if released else 0, total_revenue=-row.price)
+    return row.flight_id, released
+
+def cancel_ticket(db: Session, user_id: int, ticket_id: int):
+    refund = refund_ticket(db, user_id, ticket_id)
+    if not refund:
+        db.rollback()
+        return refund
     db.commit()
-    db.refresh(ticket)
-    return ticket
+    flight_id, released = refund
+    if released:
+        flight_cache.invalidate_seats([flight_id])
+    return db.query(Ticket).filter(Ticket.id == ticket_id).first()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import shared_state
+
+# Push-уведомления о местах на рейсах и статистике компаний (Server-Sent Events).
+# inventory, stats и crud вызывают stage() внутри транзакции, а публикуются
+# изменения только после commit (событие after_commit сессии); при откате они
+# отбрасываются. События несут новые значения (available_seats, счётчики
+# компании), а не приращения: их можно склеивать и терять без расхождения.
+# Склейка: у каждой подписки — словарь «тема -> последнее значение», поэтому
+# медленный клиент не копит очередь, а получает только итоговое состояние;
+# отправка идёт не чаще раза в EVENTS_COALESCE_SECONDS.
+# Шина живёт в процессе; опубликованные изменения рассылаются остальным
+# воркерам через shared_state, поэтому клиент получает события всех воркеров.
+
+EVENTS_COALESCE_SECONDS = float(os.getenv("EVENTS_COALESCE_SECONDS", "0.25"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))
+MAX_TOPICS_PER_SUBSCRIPTION = 200
+CHANNEL = "events"
+
+_STAGED = "staged_events"
+
+
+def flight_topic(flight_id: int):
+    return ("flight", flight_id)
+
+
+def company_topic(company_id: int):
+    return ("company", company_id)
+
+
+class Subscription:
+    def __init__(self, bus, topics, loop):
+        self.bus = bus
+        self.topics = frozenset(topics)
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def push(self, topic, payload):
+        # Может вызываться из любого потока (пул потоков, greenlet run_sync)
+        with self._lock:
+            merged = self._pending.get(topic)
+            wake = not self._pending
+            if merged is None:
+                self._pending[topic] = dict(payload)
+            else:
+                merged.update(payload)
+        if wake:
+            try:
+                self._loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                pass  # цикл событий уже закрыт
+
+    async def next_batch(self, timeout: float):
+        """Накопленные изменения [(тема, значение)]; пустой список — по таймауту."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        if EVENTS_COALESCE_SECONDS:
+            await asyncio.sleep(EVENTS_COALESCE_SECONDS)
+        with self._lock:
+            self._ready.clear()
+            pending, self._pending = self._pending, {}
+        return list(pending.items())
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._by_topic = {}
+        self._count = 0
+
+    def is_full(self):
+        return self._count >= self.max_subscribers
+
+    def subscribe(self, topics):
+        """Подписка; вызывается из event loop, в котором будут читаться события."""
+        subscription = Subscription(self, topics, asyncio.get_running_loop())
+        with self._lock:
+            self._count += 1
+            for topic in subscription.topics:
+                self._by_topic.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._count -= 1
+            for topic in subscription.topics:
+                subscribers = self._by_topic.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_topic[topic]
+
+    def subscribed(self, topics):
+        """Темы из topics, на которые кто-то подписан."""
+        with self._lock:
+            return [topic for topic in topics if topic in self._by_topic]
+
+    def publish(self, changes: dict):
+        with self._lock:
+            targets = [(topic, payload, list(self._by_topic.get(topic, ()))) for topic, payload in changes.items()]
+        for topic, payload, subscribers in targets:
+            for subscription in subscribers:
+                subscription.push(topic, payload)
+
+    def __len__(self):
+        return self._count
+
+
+bus = EventBus()
+
+
+def stage(db: Session, topic, **values):
+    """Запоминает изменение темы до коммита транзакции db."""
+    db.info.setdefault(_STAGED, {}).setdefault(topic, {}).update(values)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged(session):
+    changes = session.info.pop(_STAGED, None)
+    if changes:
+        bus.publish(changes)
+        shared_state.broadcast(CHANNEL, [[list(topic), payload] for topic, payload in changes.items()])
+
+
+@shared_state.on(CHANNEL)
+def _publish_remote(changes):
+    bus.publish({tuple(topic): payload for topic, payload in changes})
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_staged(session, previous_transaction):
+    session.info.pop(_STAGED, None)
+
+
+def _sse(topic, payload):
+    kind, key = topic
+    data = json.dumps({f"{kind}_id": key, **payload}, separators=(",", ":"))
+    return f"event: {kind}\ndata: {data}\n\n"
+
+
+async def sse_stream(topics, load_snapshot=None):
+    """
+    Тело ответа text/event-stream: сначала текущие значения
+    (await load_snapshot() -> [(тема, значение)]), затем склеенные изменения;
+    комментарий-пинг держит соединение живым. Подписка оформляется до
+    чтения снимка, чтобы изменение между ними не потерялось, и снимается
+    при отключении клиента.
+    """
+    subscription = bus.subscribe(topics)
+    try:
+        yield "retry: 3000\n\n"
+        for topic, payload in (await load_snapshot() if load_snapshot else ()):
+            yield _sse(topic, payload)
+        while True:
+            batch = await subscription.next_batch(EVENTS_HEARTBEAT_SECONDS)
+            if not batch:
+                yield ": ping\n\n"
+                continue
+            yield "".join(_sse(topic, payload) for topic, payload in batch)
+    finally:
+        subscription.close()
@@ -0,0 +1,139 @@
+import hashlib
+import os
+
+from pydantic import TypeAdapter
+
+from . import schemas, shared_state
+from .cache import ResponseCache
+from .search import normalize_city
+
+# Кэш ответов публичного поиска рейсов (GET /flights).
+# Ключ — нормализованные (город вылета, город прилёта, дата, курсор, limit),
+# значение — готовое JSON-тело страницы и его ETag.
+# Сброс точечный:
+#   * состав выдачи меняется при создании/отключении/удалении рейса — сбрасываются
+#     записи, чьи префиксы городов и дата подходят под этот рейс;
+#   * места меняются при покупке/возврате — сбрасываются записи, где есть этот рейс.
+# У каждого процесса свой кэш: сбросы рассылаются остальным воркерам через
+# shared_state, а небольшое время жизни записи страхует от пропущенных рассылок.
+
+FLIGHT_CACHE_MAX_BYTES = int(os.getenv("FLIGHT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+FLIGHT_CACHE_TTL_SECONDS = float(os.getenv("FLIGHT_CACHE_TTL_SECONDS", "30"))
+# Импорт большого расписания проще сбросить целиком, чем перебирать маршруты
+MAX_ROUTES_TO_INVALIDATE = 1000
+
+ANY = "*"
+CHANNEL = "flight_cache"
+
+flight_search_cache = ResponseCache(max_bytes=FLIGHT_CACHE_MAX_BYTES, ttl=FLIGHT_CACHE_TTL_SECONDS)
+
+_flight_list = TypeAdapter(list[schemas.FlightOut])
+
+
+class CachedPage:
+    __slots__ = ("body", "etag", "next_cursor")
+
+    def __init__(self, body: bytes, next_cursor: str | None):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.next_cursor = next_cursor
+
+
+def _prefix(value: str | None):
+    return normalize_city(value) or ANY
+
+
+def _day(value):
+    # Дата ключа в том же виде, что и в тегах сброса (_route_tags)
+    if value is None:
+        return ANY
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def search_tag(departure_city=None, arrival_city=None, date=None):
+    return (_prefix(departure_city), _prefix(arrival_city), _day(date))
+
+
+def search_key(departure_city=None, arrival_city=None, date=None, cursor=None, limit=None):
+    return search_tag(departure_city, arrival_city, date) + (cursor, limit)
+
+
+def render_page(flights, next_cursor: str | None):
+    return CachedPage(_flight_list.dump_json(_flight_list.validate_python(flights, from_attributes=True)), next_cursor)
+
+
+def store_page(key, page: CachedPage, flight_ids, version: int):
+    flight_search_cache.set(
+        key, page, len(page.body), tags=(key[:3],), ids=flight_ids, version=version,
+    )
+
+
+def _city_prefixes(key: str | None):
+    # Все префиксы, по которым city_index найдёт этот город: префиксы полного
+    # названия и каждого слова (см. search.CityIndex)
+    prefixes = {ANY}
+    for token in {key or "", *(key or "").split(" ")}:
+        prefixes.update(token[:i] for i in range(1, len(token) + 1))
+    return prefixes
+
+
+def _route_tags(departure_key, arrival_key, departure_date):
+    dates = (ANY, _day(departure_date))
+    return [
+        (dep, arr, day)
+        for dep in _city_prefixes(departure_key)
+        for arr in _city_prefixes(arrival_key)
+        for day in dates
+    ]
+
+
+def _invalidate_routes(routes):
+    tags = set()
+    for route in routes:
+        tags.update(_route_tags(*route))
+    flight_search_cache.invalidate(tags=tags)
+
+
+def invalidate_routes(routes):
+    """Сбрасывает поиск по маршрутам: routes — (ключ вылета, ключ прилёта, дата вылета)."""
+    routes = set(routes)
+    if not routes:
+        return
+    if len(routes) > MAX_ROUTES_TO_INVALIDATE:
+        flight_search_cache.clear()
+        shared_state.broadcast(CHANNEL, {"clear": True})
+        return
+    _invalidate_routes(routes)
+    shared_state.broadcast(CHANNEL, {"routes": [
+        [departure_key, arrival_key, str(departure_date)] for departure_key, arrival_key, departure_date in routes
+    ]})
+
+
+def invalidate_flight(flight):
+    invalidate_routes([(flight.departure_city_key, flight.arrival_city_key, flight.departure_date)])
+
+
+def invalidate_seats(flight_ids):
+    flight_ids = list(flight_ids)
+    flight_search_cache.invalidate(ids=flight_ids)
+    shared_state.broadcast(CHANNEL, {"ids": flight_ids})
+
+
+@shared_state.on(CHANNEL)
+def _apply_remote(message):
+    if message.get("clear"):
+        flight_search_cache.clear()
+    if message.get("routes"):
+        _invalidate_routes(message["routes"])
+    if message.get("ids"):
+        flight_search_cache.invalidate(ids=message["ids"])
+
+
+def etag_matches(if_none_match: str | None, etag: str):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy.orm import Session
+
+from . import crud, flight_cache
+
+# Групповой коммит покупок и возвратов билетов (GROUP_COMMIT=1).
+# Без него каждая покупка — отдельная транзакция, а на SQLite каждый коммит —
+# запись в журнал с fsync. Здесь запросы встают в очередь, один писатель
+# забирает всё, что накопилось, пока шёл предыдущий коммит (не больше
+# GROUP_COMMIT_MAX_BATCH), выполняет операции подряд в одной транзакции и
+# коммитит один раз; каждый вызывающий получает свой результат.
+# Семантика запроса не меняется: book_ticket и refund_ticket при отказе
+# (нет мест, окно возврата закрыто) ничего не пишут, поэтому отказ одной
+# операции не затрагивает остальные. Если же пачка падает с ошибкой БД,
+# она откатывается и операции выполняются по одной, каждая со своим коммитом.
+# GROUP_COMMIT_MAX_WAIT_MS > 0 — подождать столько, добирая пачку, даже если
+# очередь пуста (выше пропускная способность ценой задержки).
+
+logger = logging.getLogger(__name__)
+
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "0").lower() in ("1", "true", "yes", "on")
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "128"))
+GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("GROUP_COMMIT_MAX_WAIT_MS", "0"))
+
+BOOK = "book"
+REFUND = "refund"
+
+# операция -> функции crud (без коммита, со своим коммитом для повтора по одной);
+# по имени, потому что crud импортируется раньше, чем успевает определить их
+_OPERATIONS = {
+    BOOK: ("book_ticket", "create_ticket"),
+    REFUND: ("refund_ticket", "cancel_ticket"),
+}
+
+
+def _touched_flight(kind, result):
+    # Рейс, чьи места изменились (для сброса кэша поиска после коммита)
+    if kind == BOOK and result is not None:
+        return result.flight_id
+    if kind == REFUND and result:
+        flight_id, released = result
+        return flight_id if released else None
+    return None
+
+
+def _apply_batch(db: Session, batch):
+    results = [getattr(crud, _OPERATIONS[kind][0])(db, *args) for kind, args in batch]
+    db.commit()
+    touched = {_touched_flight(kind, result) for (kind, _), result in zip(batch, results)}
+    touched.discard(None)
+    if touched:
+        flight_cache.invalidate_seats(touched)
+    return results
+
+
+class GroupCommitWriter:
+    def __init__(self, session_factory, max_batch: int = GROUP_COMMIT_MAX_BATCH, max_wait_ms: float = GROUP_COMMIT_MAX_WAIT_MS):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.operations = 0
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дожидается операций, уже стоящих в очереди, и останавливает писателя."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(None)
+        await task
+
+    async def submit(self, kind: str, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((kind, args, future))
+        return await future
+
+    async def book(self, user_id: int, flight_id: int):
+        """Как crud.create_ticket: билет или None, если мест нет."""
+        return await self.submit(BOOK, user_id, flight_id)
+
+    async def refund(self, user_id: int, ticket_id: int):
+        """Как crud.cancel_ticket: None, False (окно возврата закрыто) или истина при успехе."""
+        return await self.submit(REFUND, user_id, ticket_id)
+
+    async def _next_batch(self):
+        item = await self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                self._queue.put_nowait(None)  # остановка — после этой пачки
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if batch is None:
+                return
+            try:
+                await self._execute(batch)
+            except Exception as exc:
+                # Например, не удалось получить соединение: ответить всем из пачки
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    async def _execute(self, batch):
+        outcomes = await asyncio.to_thread(self._execute_sync, [(kind, args) for kind, args, _ in batch])
+        for (_, _, future), (ok, value) in zip(batch, outcomes):
+            if future.done():
+                continue  # вызывающий уже ушёл (отмена запроса)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        self.batches += 1
+        self.operations += len(batch)
+
+    def _execute_sync(self, operations):
+        # Синхронная сессия в отдельном потоке: операторы пачки идут подряд,
+        # без перехода в поток драйвера на каждый из них, как у aiosqlite
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            try:
+                return [(True, result) for result in _apply_batch(db, operations)]
+            except Exception:
+                logger.exception("Group commit of %s operations failed, retrying one by one", len(operations))
+                db.rollback()
+            outcomes = []
+            for kind, args in operations:
+                try:
+                    outcomes.append((True, getattr(crud, _OPERATIONS[kind][1])(db, *args)))
+                except Exception as exc:
+                    db.rollback()
+                    outcomes.append((False, exc))
+            return outcomes
+        finally:
+            db.close()
+
+
+writer = None
+
+
+def start(session_factory):
+    """
+    Запускает писателя, если GROUP_COMMIT включён (lifespan в main.py).
+    session_factory — синхронный sessionmaker (database.SessionLocal).
+    """
+    global writer
+    if GROUP_COMMIT:
+        writer = GroupCommitWriter(session_factory)
+        writer.start()
+    return writer
+
+
+async def stop():
+    global writer
+    if writer is not None:
+        await writer.stop()
+        writer = None
@@ -0,0 +1,111 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+# Хэширование паролей вне event loop.
+# pbkdf2 — это чистая нагрузка на CPU, поэтому хэши считаются в отдельном
+# пуле процессов. Число одновременных задач ограничено: если очередь
+# переполнена дольше HASH_QUEUE_TIMEOUT, запрос получает 503 вместо того,
+# чтобы копить задачи и тормозить все остальные запросы.
+#   PBKDF2_ROUNDS      — стоимость хэша; старые хэши с меньшим числом раундов
+#                        перехэшируются при успешном входе
+#   HASH_WORKERS       — число процессов; 0 — считать в пуле потоков
+#   HASH_QUEUE_LIMIT   — максимум задач в работе и в очереди
+# Пул создаётся при первом хэше, когда в процессе уже есть потоки (фоновые
+# задачи, пул потоков starlette), поэтому процессы запускаются не через fork:
+# копия чужой взятой блокировки в дочернем процессе может его повесить.
+
+PBKDF2_ROUNDS = int(os.getenv("PBKDF2_ROUNDS", "29000"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(max(1, HASH_WORKERS) * 8)))
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "2"))
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PBKDF2_ROUNDS,
+    pbkdf2_sha256__min_rounds=PBKDF2_ROUNDS,
+)
+
+_executor = None
+_slots = None
+
+
+def _truncate(password: str):
+    # Truncate password if it's too long for bcrypt
+    return password[:72] if len(password) > 72 else password
+
+
+def hash_sync(password: str):
+    return pwd_context.hash(_truncate(password))
+
+
+def verify_sync(password: str, hashed_password: str):
+    """Возвращает (пароль верный, новый хэш или None)."""
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def configure(workers: int | None = None, queue_limit: int | None = None):
+    """Меняет размер пула (используется в бенчмарках); текущий пул закрывается."""
+    global HASH_WORKERS, HASH_QUEUE_LIMIT, _slots
+    shutdown()
+    if workers is not None:
+        HASH_WORKERS = workers
+    if queue_limit is not None:
+        HASH_QUEUE_LIMIT = queue_limit
+    _slots = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None and HASH_WORKERS > 0:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _executor
+
+
+def _get_slots():
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(HASH_QUEUE_LIMIT)
+    return _slots
+
+
+async def _submit(func, *args):
+    slots = _get_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, try again later",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        executor = _get_executor()
+        if executor is None:
+            return await run_in_threadpool(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        slots.release()
+
+
+async def hash_password(password: str):
+    return await _submit(hash_sync, password)
+
+
+async def verify_password(password: str, hashed_password: str):
+    """Проверяет пароль в пуле; возвращает (ok, новый хэш, если текущий устарел)."""
+    return await _submit(verify_sync, password, hashed_password)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from . import flight_cache, inventory, stats
+from .models import Flight, Ticket, TicketStatus
+
+# Временные брони мест (двухфазная покупка).
+# POST /tickets/holds списывает места так же, как покупка, но создаёт билеты
+# в статусе held с hold_expires_at = сейчас + SEAT_HOLD_SECONDS. Подтверждение
+# переводит их в active (выручка считается только здесь), отказ или истечение
+# срока — в canceled/expired с возвратом мест.
+# hold_expires_at заполнен только у живых броней (при переходе из held
+# обнуляется), а индекс по нему частичный, поэтому фоновый сборщик читает
+# из индекса лишь истёкшие брони, не просматривая таблицу билетов.
+# Все переходы — условные UPDATE ... WHERE status = 'held': подтверждение,
+# отказ и сборщик (в том числе в нескольких воркерах) не вернут место дважды.
+
+logger = logging.getLogger(__name__)
+
+SEAT_HOLD_SECONDS = int(os.getenv("SEAT_HOLD_SECONDS", "600"))
+HOLD_SWEEP_INTERVAL_SECONDS = float(os.getenv("HOLD_SWEEP_INTERVAL_SECONDS", "5"))
+HOLD_SWEEP_BATCH = 500  # броней за одну транзакцию сборщика
+
+
+def release_holds(db: Session, ticket_ids, status: TicketStatus, *conditions):
+    """
+    Переводит брони из held в status и возвращает их места на рейсы.
+    conditions — дополнительные условия UPDATE (владелец, срок).
+    Возвращает {flight_id: мест} по снятым броням; коммит остаётся на вызывающей стороне.
+    """
+    if not ticket_ids:
+        return {}
+    stmt = (
+        update(Ticket)
+        .where(Ticket.id.in_(ticket_ids), Ticket.status == TicketStatus.held, *conditions)
+        .values(status=status, hold_expires_at=None, canceled_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if inventory._supports_returning(db):
+        flight_ids = db.execute(stmt.returning(Ticket.flight_id)).scalars().all()
+    else:
+        # Без RETURNING — по одной строке, чтобы знать, какие именно брони сняты
+        flight_by_ticket = dict(db.execute(select(Ticket.id, Ticket.flight_id).where(Ticket.id.in_(ticket_ids))).all())
+        flight_ids = [
+            flight_by_ticket[ticket_id] for ticket_id in ticket_ids
+            if db.execute(stmt.where(Ticket.id == ticket_id)).rowcount == 1
+        ]
+    if not flight_ids:
+        return {}
+
+    seats_by_flight = {}
+    for flight_id in flight_ids:
+        seats_by_flight[flight_id] = seats_by_flight.get(flight_id, 0) + 1
+    companies = dict(db.execute(select(Flight.id, Flight.company_id).where(Flight.id.in_(seats_by_flight))).all())
+    released_by_company = {}
+    for flight_id in sorted(seats_by_flight):
+        seats = seats_by_flight[flight_id]
+        if inventory.release_seats(db, flight_id, seats):
+            company_id = companies[flight_id]
+            released_by_company[company_id] = released_by_company.get(company_id, 0) + seats
+    for company_id, seats in released_by_company.items():
+        stats.apply_delta(db, company_id, available_seats=seats)
+    return seats_by_flight
+
+
+def expire_holds(db: Session, now: datetime | None = None, batch_size: int = HOLD_SWEEP_BATCH):
+    """Снимает до batch_size истёкших броней (самые старые первыми); возвращает их число."""
+    now = now or datetime.utcnow()
+    ticket_ids = db.execute(
+        select(Ticket.id)
+        .where(Ticket.hold_expires_at <= now)
+        .order_by(Ticket.hold_expires_at)
+        .limit(batch_size)
+    ).scalars().all()
+    released = release_holds(db, ticket_ids, TicketStatus.expired, Ticket.hold_expires_at <= now)
+    db.commit()
+    if released:
+        flight_cache.invalidate_seats(released)
+    return sum(released.values())
+
+
+def sweep_expired_holds(db: Session, batch_size: int = HOLD_SWEEP_BATCH):
+    """Снимает все истёкшие брони пачками по batch_size."""
+    now = datetime.utcnow()
+    total = 0
+    while True:
+        expired = expire_holds(db, now, batch_size)
+        total += expired
+        if expired < batch_size:
+            return total
+
+
+async def run_sweeper(session_factory, interval: float = HOLD_SWEEP_INTERVAL_SECONDS):
+    """Фоновая задача приложения (см. lifespan в main.py)."""
+    while True:
+        try:
+            async with session_factory() as db:
+                expired = await db.run_sync(sweep_expired_holds)
+            if expired:
+                logger.info("Released %s expired seat holds", expired)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Seat hold sweep failed")
+        await asyncio.sleep(interval)
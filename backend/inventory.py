@@ -0,0 +1,66 @@
+from sqlalchemy import update, select
+from sqlalchemy.orm import Session
+from . import events
+from .models import Flight
+
+# Учёт мест на рейсах.
+# Все изменения available_seats делаются одним условным UPDATE на стороне БД,
+# поэтому параллельные покупки не могут продать больше мест, чем есть:
+# строка либо меняется целиком, либо не меняется вовсе (rowcount == 0).
+# Новое число мест уходит подписчикам (events) после коммита.
+
+
+def _supports_returning(db: Session) -> bool:
+    return bool(getattr(db.get_bind().dialect, "update_returning", False))
+
+
+def reserve_seats(db: Session, flight_id: int, count: int = 1):
+    """
+    Атомарно списывает count мест с активного рейса.
+    Возвращает (цена продажи, company_id) рейса или None, если мест не хватает
+    или рейс неактивен. Коммит остаётся на вызывающей стороне.
+    """
+    stmt = (
+        update(Flight)
+        .where(
+            Flight.id == flight_id,
+            Flight.is_active == True,
+            Flight.available_seats >= count,
+        )
+        .values(available_seats=Flight.available_seats - count)
+        .execution_options(synchronize_session=False)
+    )
+    columns = (Flight.current_price, Flight.company_id, Flight.available_seats)
+    if _supports_returning(db):
+        row = db.execute(stmt.returning(*columns)).first()
+        if row is None:
+            return None
+    else:
+        if db.execute(stmt).rowcount != 1:
+            return None
+        row = db.execute(select(*columns).where(Flight.id == flight_id)).first()
+    events.stage(db, events.flight_topic(flight_id), available_seats=row.available_seats)
+    return row.current_price, row.company_id
+
+
+def release_seats(db: Session, flight_id: int, count: int = 1):
+    """
+    Возвращает count мест на рейс (отмена/возврат билета).
+    Не даёт available_seats превысить total_seats.
+    """
+    stmt = (
+        update(Flight)
+        .where(Flight.id == flight_id, Flight.available_seats + count <= Flight.total_seats)
+        .values(available_seats=Flight.available_seats + count)
+        .execution_options(synchronize_session=False)
+    )
+    if _supports_returning(db):
+        available = db.execute(stmt.returning(Flight.available_seats)).scalar()
+        if available is None:
+            return False
+    else:
+        if db.execute(stmt).rowcount != 1:
+            return False
+        available = db.execute(select(Flight.available_seats).where(Flight.id == flight_id)).scalar()
+    events.stage(db, events.flight_topic(flight_id), available_seats=available)
+    return True
@@ -1,14 +1,60 @@
 from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
-from backend.database import engine, Base
+from fastapi.responses import JSONResponse, PlainTextResponse
+from backend.database import AsyncSessionLocal, SessionLocal, engine
 from backend.routers import auth as auth_router, admin as admin_router, companies
-from backend.routers import public as public_router, tickets as tickets_router
-from backend import models, schemas, crud, auth
+from backend.routers import public as public_router, tickets as tickets_router, events as events_router
+from backend import models, schemas, crud, analytics, archive, auth, group_commit, hashing, holds, metrics, migrations, flight_cache, pricing, rate_limit, shared_state
+from backend.pagination import NEXT_CURSOR_HEADER
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import logging
 
-app = FastAPI()
+def _seed_admin():
+    db = SessionLocal()
+    try:
+        if not crud.get_user_by_email(db, "admin@gmail.com"):
+            crud.create_user(db, schemas.UserCreate(email="admin@gmail.com", password="admin123!", role="admin"))
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Рассылка изменений кэшей между воркерами (см. backend/shared_state.py)
+    shared_state.start()
+    # Схема приводится к актуальной версии (см. backend/migrations.py);
+    # если она уже актуальна, это один SELECT без DDL. При нескольких
+    # воркерах миграции и создание админа выполняет один из них, остальные ждут
+    with shared_state.startup_lock():
+        migrations.migrate(engine)
+        _seed_admin()
+    # Фоновые задачи: сборщик истёкших броней мест, пересчёт аналитики и цен,
+    # перенос улетевших рейсов в архив.
+    # Каждая работает на одном воркере — том, что держит её аренду
+    leader_tasks = {
+        "holds": lambda: holds.run_sweeper(AsyncSessionLocal),
+        "analytics": lambda: analytics.run_refresher(SessionLocal),
+    }
+    if pricing.DYNAMIC_PRICING:
+        leader_tasks["pricing"] = lambda: pricing.run_repricer(SessionLocal)
+    if archive.ARCHIVE_ENABLED:
+        leader_tasks["archive"] = lambda: archive.run_archiver(SessionLocal)
+    tasks = [asyncio.create_task(shared_state.run_as_leader(name, factory)) for name, factory in leader_tasks.items()]
+    # Конвейер группового коммита покупок (только при GROUP_COMMIT=1)
+    group_commit.start(SessionLocal)
+    yield
+    await group_commit.stop()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    shared_state.stop()
+    # Останавливаем пул процессов хэширования паролей
+    hashing.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -23,46 +69,36 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": exc.errors()}
     )
 
+# Метрики запросов и SQL (см. backend/metrics.py), GET /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.register_cache("auth_token", auth.token_cache)
+metrics.register_cache("auth_user", auth.user_cache)
+metrics.register_cache("flight_search", flight_cache.flight_search_cache)
+
+# Ограничение частоты запросов (см. backend/rate_limit.py): внутри CORS,
+# чтобы ответ 429 был виден браузеру, и до маршрутизации и БД
+app.add_middleware(rate_limit.RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Разрешаем все источники для разработки
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-Base.metadata.create_all(bind=engine)
-
-from sqlalchemy.orm import Session
-from backend.database import SessionLocal
-from backend.crud import get_user_by_email
-from backend.schemas import UserCreate
-from backend.auth import get_password_hash
-from sqlalchemy import text
-
-db = SessionLocal()
-# Лёгкая миграция для добавления колонок first_name/last_name в SQLite, если их нет
-try:
-    db.execute(text("ALTER TABLE users ADD COLUMN first_name VARCHAR"))
-except Exception:
-    pass
-try:
-    db.execute(text("ALTER TABLE users ADD COLUMN last_name VARCHAR"))
-except Exception:
-    pass
-db.commit()
-admin = get_user_by_email(db, "admin@gmail.com")
-if not admin:
-    admin_create = UserCreate(email="admin@gmail.com", password="admin123!", role="admin")
-    crud.create_user(db, admin_create)
-db.close()
-
 app.include_router(auth_router.router)
 app.include_router(admin_router.router)
 app.include_router(companies.router)
 app.include_router(public_router.router)
 app.include_router(tickets_router.router)
+app.include_router(events_router.router)
 
 @app.get("/users/me", response_model=schemas.UserOut)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
-    return current_user
\ No newline at end of file
+async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+    return current_user
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
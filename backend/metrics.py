@@ -0,0 +1,233 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Метрики производительности в формате Prometheus (GET /metrics).
+#   * задержка запросов по маршрутам (шаблон пути, метод, код ответа);
+#   * число и суммарное время SQL-запросов на один HTTP-запрос — через события
+#     движка SQLAlchemy и contextvar со счётчиками текущего запроса;
+#   * ожидание соединения из пула;
+#   * попадания/промахи кэшей, зарегистрированных через register_cache;
+#   * отказы 429 по правилам ограничения частоты (rate_limit.py).
+# SLOW_QUERY_MS > 0 включает журнал медленных SQL-запросов (логгер backend.slow_query).
+# Модуль не зависит от database.py, чтобы движки могли подключать его при создании.
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_MAX_LENGTH = 1000  # сколько символов SQL писать в журнал
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+slow_query_logger = logging.getLogger("backend.slow_query")
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [счётчики по корзинам..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for label_values, series in sorted(items):
+            base = [_label(name, value) for name, value in zip(self.labels, label_values)]
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(base + [_label('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(base + [_label('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(base)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(base)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: int = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_labels([_label(n, v) for n, v in zip(self.labels, label_values)])} {value}")
+        return lines
+
+
+def _label(name, value):
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'{name}="{escaped}"'
+
+
+def _labels(parts):
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", labels=("method", "route", "status"),
+)
+request_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements per HTTP request", labels=("route",), buckets=QUERY_COUNT_BUCKETS,
+)
+request_db_time = Histogram(
+    "http_request_db_seconds", "Total SQL time per HTTP request", labels=("route",),
+)
+db_query_latency = Histogram("db_query_duration_seconds", "SQL statement latency")
+pool_checkout_wait = Histogram("db_pool_checkout_seconds", "Time to get a connection from the pool")
+rate_limited_requests = Counter("rate_limited_requests_total", "Requests rejected with 429", labels=("rule",))
+
+_caches = {}
+
+
+def register_cache(name: str, cache):
+    """Кэш с атрибутами hits/misses (cache.TTLCache, cache.ResponseCache)."""
+    _caches[name] = cache
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "route")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.route = None
+
+
+# Изменяемый объект, а не число: его видят и пул потоков, и greenlet run_sync
+_current = ContextVar("request_stats", default=None)
+
+
+# SQL
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    db_query_latency.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_query_logger.warning(
+            "%.1f ms%s: %s", elapsed * 1000,
+            f" [{stats.route}]" if stats is not None and stats.route else "",
+            " ".join(statement.split())[:SLOW_QUERY_MAX_LENGTH],
+        )
+
+
+def _on_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine):
+    """Подключает счётчики SQL к синхронному движку (для async — к engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _on_error)
+
+
+class _TimedCheckout:
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+# HTTP
+
+def _route_name(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время ответа (до отправки последнего байта тела) и SQL на запрос."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                stats.route = _route_name(scope)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            route = _route_name(scope)
+            request_latency.observe(time.perf_counter() - started, scope["method"], route, str(status))
+            request_db_queries.observe(stats.queries, route)
+            request_db_time.observe(stats.db_seconds, route)
+
+
+def render():
+    lines = []
+    for histogram in (request_latency, request_db_queries, request_db_time, db_query_latency, pool_checkout_wait):
+        lines.extend(histogram.render())
+    lines.extend(rate_limited_requests.render())
+    if _caches:
+        for metric, attribute in (("cache_hits_total", "hits"), ("cache_misses_total", "misses")):
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(
+                f"{metric}{_labels([_label('cache', name)])} {getattr(cache, attribute)}"
+                for name, cache in _caches.items()
+            )
+        lines.append("# TYPE cache_entries gauge")
+        lines.extend(f"cache_entries{_labels([_label('cache', name)])} {len(cache)}" for name, cache in _caches.items())
+    return "\n".join(lines) + "\n"
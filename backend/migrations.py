@@ -0,0 +1,218 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, insert, select, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import Base
+
+# Версионные миграции схемы.
+# Применённые версии записываются в таблицу schema_version. При старте
+# приложения migrate() делает один SELECT и, если схема актуальна, больше
+# ничего не выполняет. Каждая миграция идемпотентна (проверяет наличие
+# колонок и индексов), поэтому её можно накатить и на БД, созданную до
+# появления этой таблицы, — прежние «ALTER TABLE в try/except» из main.py.
+# Для нескольких воркеров миграции лучше запускать отдельным шагом:
+#   python -m backend.migrations
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _add_column(conn, table: str, column: str, ddl_type: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_indexes(conn, table, *names):
+    # Только перечисленные индексы: у модели могут быть и более поздние,
+    # по колонкам, которых на этом шаге ещё нет
+    indexes = {index.name: index for index in table.indexes}
+    for name in names:
+        indexes[name].create(bind=conn, checkfirst=True)
+
+
+def _initial_schema(conn):
+    # Исходные таблицы; в новой БД сразу создаются в актуальном виде
+    Base.metadata.create_all(
+        bind=conn,
+        tables=[models.Company.__table__, models.User.__table__, models.Flight.__table__, models.Ticket.__table__],
+    )
+
+
+def _user_names(conn):
+    _add_column(conn, "users", "first_name", "VARCHAR")
+    _add_column(conn, "users", "last_name", "VARCHAR")
+
+
+def _city_keys(conn):
+    from .search import backfill_city_keys
+
+    _add_column(conn, "flights", "departure_city_key", "VARCHAR")
+    _add_column(conn, "flights", "arrival_city_key", "VARCHAR")
+    _create_indexes(conn, models.Flight.__table__, "ix_flights_route_search", "ix_flights_active_departure")
+    with Session(bind=conn) as db:
+        backfill_city_keys(db)
+
+
+def _company_stats(conn):
+    from .stats import SOURCES, rebuild_company_stats
+
+    models.CompanyStats.__table__.create(bind=conn, checkfirst=True)
+    with Session(bind=conn) as db:
+        # Архивных таблиц на этом шаге ещё нет (миграция 9)
+        rebuild_company_stats(db, sources=SOURCES[:1])
+        db.commit()
+
+
+def _hot_path_indexes(conn):
+    # «Мои билеты» (user_id, created_at, id), пассажиры рейса и проверка
+    # билетов при удалении (flight_id, created_at), рейсы компании (company_id, id)
+    _create_indexes(conn, models.Ticket.__table__, "ix_tickets_user_created", "ix_tickets_flight_created")
+    _create_indexes(conn, models.Flight.__table__, "ix_flights_company")
+
+
+def _seat_holds(conn):
+    if conn.dialect.name == "postgresql":
+        # В PostgreSQL статус — нативный ENUM, новые значения добавляются явно
+        for status in ("held", "expired"):
+            conn.execute(text(f"ALTER TYPE ticketstatus ADD VALUE IF NOT EXISTS '{status}'"))
+    _add_column(conn, "tickets", "hold_expires_at", "TIMESTAMP")
+    _create_indexes(conn, models.Ticket.__table__, "ix_tickets_hold_expires")
+
+
+def _analytics(conn):
+    for model in (models.CompanyDailyAnalytics, models.DailyAnalytics, models.RouteLoadAnalytics, models.AnalyticsRefresh):
+        model.__table__.create(bind=conn, checkfirst=True)
+    _create_indexes(conn, models.Ticket.__table__, "ix_tickets_created_at", "ix_tickets_canceled_at")
+    _create_indexes(conn, models.User.__table__, "ix_users_created_at")
+
+
+def _dynamic_pricing(conn):
+    _add_column(conn, "flights", "current_price", "FLOAT")
+    conn.execute(text("UPDATE flights SET current_price = price WHERE current_price IS NULL"))
+
+
+def _archive(conn):
+    for model in (models.FlightArchive, models.TicketArchive):
+        model.__table__.create(bind=conn, checkfirst=True)
+    _create_indexes(conn, models.Flight.__table__, "ix_flights_departure_date")
+
+
+def _sqlite_autoincrement(conn, table: str, archive: str):
+    # SQLite без AUTOINCREMENT выдаёт новой строке наибольший id + 1, то есть
+    # повторно использует id удалённых и перенесённых в архив строк. Добавить
+    # AUTOINCREMENT можно только пересозданием таблицы: новая таблица по
+    # текущим колонкам, копия строк, замена старой и прежние индексы
+    # (PRAGMA foreign_keys не включён, ссылки билетов на рейсы не мешают)
+    ddl = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table},
+    ).scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        indexes = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"),
+            {"name": table},
+        ).scalars().all()
+        metadata = MetaData()  # вместе с таблицами, на которые ссылаются внешние ключи
+        rebuilt = Table(table, metadata, autoload_with=conn).to_metadata(metadata, name=f"{table}_rebuilt")
+        rebuilt.dialect_kwargs["sqlite_autoincrement"] = True
+        columns = ", ".join(f'"{column.name}"' for column in rebuilt.columns)
+        conn.execute(CreateTable(rebuilt))
+        conn.execute(text(f"INSERT INTO {table}_rebuilt ({columns}) SELECT {columns} FROM {table}"))
+        conn.execute(text(f"DROP TABLE {table}"))
+        conn.execute(text(f"ALTER TABLE {table}_rebuilt RENAME TO {table}"))
+        for index in indexes:
+            conn.execute(text(index))
+    # Счётчик продолжается после наибольшего id и горячей таблицы, и архива
+    top = conn.execute(text(f"SELECT max(id) FROM (SELECT max(id) AS id FROM {table} UNION ALL SELECT max(id) FROM {archive})")).scalar()
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table})
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": table, "seq": top or 0})
+
+
+def _stable_ids(conn):
+    # В PostgreSQL id выдаёт последовательность, повторов и так нет
+    if conn.dialect.name == "sqlite":
+        _sqlite_autoincrement(conn, "flights", "flights_archive")
+        _sqlite_autoincrement(conn, "tickets", "tickets_archive")
+
+
+def _company_stats_rows(conn):
+    # Строки статистики создаются вместе с компанией; компаниям, у которых
+    # строки ещё нет (без рейсов), она пересчитывается здесь
+    from .stats import rebuild_company_stats
+
+    with Session(bind=conn) as db:
+        missing = db.execute(
+            select(models.Company.id).where(models.Company.id.not_in(select(models.CompanyStats.company_id)))
+        ).scalars().all()
+        for company_id in missing:
+            rebuild_company_stats(db, company_id)
+        db.commit()
+
+
+def _single_city_search_indexes(conn):
+    _create_indexes(conn, models.Flight.__table__, "ix_flights_departure_search", "ix_flights_arrival_search")
+
+
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "users.first_name, users.last_name", _user_names),
+    (3, "normalized city keys and search indexes", _city_keys),
+    (4, "company_stats", _company_stats),
+    (5, "indexes for ticket and company flight listings", _hot_path_indexes),
+    (6, "tickets.hold_expires_at for seat holds", _seat_holds),
+    (7, "analytics rollup tables", _analytics),
+    (8, "flights.current_price for dynamic pricing", _dynamic_pricing),
+    (9, "archive tables for departed flights and their tickets", _archive),
+    (10, "AUTOINCREMENT ids for flights and tickets", _stable_ids),
+    (11, "company_stats row for every company", _company_stats_rows),
+    (12, "indexes for search by departure or arrival city only", _single_city_search_indexes),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(engine):
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    except DBAPIError:
+        return 0  # таблицы schema_version ещё нет
+
+
+def migrate(engine):
+    """Накатывает недостающие миграции; возвращает список применённых версий."""
+    if current_version(engine) >= LATEST_VERSION:
+        return []
+    _metadata.create_all(bind=engine)
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        with engine.begin() as conn:
+            done = conn.execute(select(schema_version.c.version).where(schema_version.c.version == version)).first()
+            if done:
+                continue
+            logger.info("Applying migration %s: %s", version, description)
+            upgrade(conn)
+            conn.execute(insert(schema_version).values(
+                version=version, description=description, applied_at=datetime.utcnow(),
+            ))
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    versions = migrate(engine)
+    print(f"Схема в версии {current_version(engine)}, применено миграций: {len(versions)}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, Boolean, DateTime, ForeignKey, Float, Date, Time
+from sqlalchemy import text, Column, Integer, String, Enum, Boolean, DateTime, ForeignKey, Float, Date, Time, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 import enum
@@ -36,6 +36,15 @@ class User(Base):
     # Связь с компанией
     company = relationship("Company", back_populates="managers")
 
+    __table_args__ = (
+        # Регистрации по дням (analytics)
+        Index("ix_users_created_at", "created_at"),
+    )
+
+def _base_price(context):
+    return context.get_current_parameters()["price"]
+
+
 class Flight(Base):
     __tablename__ = "flights"
     id = Column(Integer, primary_key=True, index=True)
@@ -43,6 +52,9 @@ class Flight(Base):
     flight_number = Column(String, nullable=False)
     departure_city = Column(String, nullable=False)
     arrival_city = Column(String, nullable=False)
+    # Нормализованные названия городов для индексного поиска (см. search.normalize_city)
+    departure_city_key = Column(String, nullable=True)
+    arrival_city_key = Column(String, nullable=True)
     departure_date = Column(Date, nullable=False)
     departure_time = Column(Time, nullable=False)
     arrival_date = Column(Date, nullable=False)
@@ -50,17 +62,116 @@ class Flight(Base):
     total_seats = Column(Integer, nullable=False)
     available_seats = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
+    # Цена продажи с учётом загрузки и срока до вылета (см. pricing.py);
+    # до первого пересчёта равна базовой price
+    current_price = Column(Float, nullable=True, default=_base_price)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Связь с компанией
     company = relationship("Company", back_populates="flights")
 
+    __table_args__ = (
+        # Поиск по маршруту: сначала равенства, затем колонки сортировки,
+        # чтобы выдача шла в порядке индекса без отдельной сортировки
+        Index(
+            "ix_flights_route_search",
+            "departure_city_key", "arrival_city_key", "is_active", "departure_date", "departure_time",
+        ),
+        # Поиск только по городу вылета или только по городу прилёта
+        Index("ix_flights_departure_search", "departure_city_key", "is_active", "departure_date", "departure_time"),
+        Index("ix_flights_arrival_search", "arrival_city_key", "is_active", "departure_date", "departure_time"),
+        # Список всех активных рейсов по дате (без фильтра по городам)
+        Index("ix_flights_active_departure", "is_active", "departure_date", "departure_time"),
+        # Рейсы компании с keyset-пагинацией по id
+        Index("ix_flights_company", "company_id", "id"),
+        # Отбор улетевших рейсов для переноса в архив (archive.py)
+        Index("ix_flights_departure_date", "departure_date"),
+        # AUTOINCREMENT: SQLite не выдаёт id повторно, даже если строки с
+        # наибольшим id удалены или перенесены в архив
+        {"sqlite_autoincrement": True},
+    )
+
+
+class CompanyStats(Base):
+    """
+    Материализованная статистика компании для /company/stats.
+    Обновляется инкрементально в crud (см. stats.py), полностью
+    пересчитывается функцией stats.rebuild_company_stats.
+    """
+    __tablename__ = "company_stats"
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    total_flights = Column(Integer, nullable=False, default=0)
+    active_flights = Column(Integer, nullable=False, default=0)
+    total_seats = Column(Integer, nullable=False, default=0)
+    available_seats = Column(Integer, nullable=False, default=0)
+    # Сумма цен проданных (активных) билетов
+    total_revenue = Column(Float, nullable=False, default=0.0)
+
+
+# Сводные таблицы аналитики для админки (см. analytics.py). Пересчитываются
+# фоновой задачей сгруппированными запросами; эндпоинты читают только их.
+class CompanyDailyAnalytics(Base):
+    """Продажи и возвраты компании за день (продажи — по дню покупки, возвраты — по дню возврата)."""
+    __tablename__ = "analytics_company_daily"
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    bookings = Column(Integer, nullable=False, default=0)
+    refunds = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    refunded = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # Ряды по всем компаниям за период
+        Index("ix_analytics_company_daily_day", "day"),
+    )
+
+
+class DailyAnalytics(Base):
+    """Итоги дня по всему сервису."""
+    __tablename__ = "analytics_daily"
+    day = Column(Date, primary_key=True)
+    bookings = Column(Integer, nullable=False, default=0)
+    refunds = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    refunded = Column(Float, nullable=False, default=0.0)
+    # Покупатели дня (разные user_id среди покупок) и новые регистрации
+    active_users = Column(Integer, nullable=False, default=0)
+    new_users = Column(Integer, nullable=False, default=0)
+
+
+class RouteLoadAnalytics(Base):
+    """Загрузка маршрута по всем его рейсам: проданные места / все места."""
+    __tablename__ = "analytics_route_load"
+    departure_city_key = Column(String, primary_key=True)
+    arrival_city_key = Column(String, primary_key=True)
+    departure_city = Column(String, nullable=False)
+    arrival_city = Column(String, nullable=False)
+    flights = Column(Integer, nullable=False, default=0)
+    total_seats = Column(Integer, nullable=False, default=0)
+    sold_seats = Column(Integer, nullable=False, default=0)
+    load_factor = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # Самые загруженные / пустые маршруты без сортировки всей таблицы
+        Index("ix_analytics_route_load_factor", "load_factor"),
+    )
+
+
+class AnalyticsRefresh(Base):
+    """Время последнего пересчёта сводных таблиц."""
+    __tablename__ = "analytics_refresh"
+    name = Column(String, primary_key=True)
+    refreshed_at = Column(DateTime, nullable=False)
+
 
 class TicketStatus(enum.Enum):
     active = "active"
     canceled = "canceled"
     refunded = "refunded"
+    # Временная бронь до подтверждения (см. holds.py) и бронь, снятая по таймауту
+    held = "held"
+    expired = "expired"
 
 
 class Ticket(Base):
@@ -72,7 +183,79 @@ class Ticket(Base):
     status = Column(Enum(TicketStatus), default=TicketStatus.active)
     created_at = Column(DateTime, default=datetime.utcnow)
     canceled_at = Column(DateTime, nullable=True)
+    # Срок брони; заполнен только пока статус held
+    hold_expires_at = Column(DateTime, nullable=True)
 
     # relations
     user = relationship("User")
     flight = relationship("Flight")
+
+    __table_args__ = (
+        # «Мои билеты»: фильтр по пользователю и сортировка (created_at, id) по убыванию
+        Index("ix_tickets_user_created", "user_id", "created_at", "id"),
+        # Пассажиры рейса (по убыванию created_at) и проверка билетов при удалении рейса
+        Index("ix_tickets_flight_created", "flight_id", "created_at"),
+        # Аналитика: покупки и возвраты за последние дни (analytics.refresh_rollups)
+        Index("ix_tickets_created_at", "created_at"),
+        Index("ix_tickets_canceled_at", "canceled_at"),
+        # Сборщик истёкших броней: частичный индекс только по живым броням
+        Index(
+            "ix_tickets_hold_expires",
+            "hold_expires_at",
+            sqlite_where=text("hold_expires_at IS NOT NULL"),
+            postgresql_where=text("hold_expires_at IS NOT NULL"),
+        ),
+        # id билетов не выдаются повторно (см. Flight)
+        {"sqlite_autoincrement": True},
+    )
+
+
+# Архив улетевших рейсов и их билетов (см. archive.py): те же колонки, что
+# у flights и tickets, плюс время переноса. id сохраняются — ссылки билетов
+# на рейсы и номера билетов у пользователей остаются прежними.
+class FlightArchive(Base):
+    __tablename__ = "flights_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    flight_number = Column(String, nullable=False)
+    departure_city = Column(String, nullable=False)
+    arrival_city = Column(String, nullable=False)
+    departure_city_key = Column(String, nullable=True)
+    arrival_city_key = Column(String, nullable=True)
+    departure_date = Column(Date, nullable=False)
+    departure_time = Column(Time, nullable=False)
+    arrival_date = Column(Date, nullable=False)
+    arrival_time = Column(Time, nullable=False)
+    total_seats = Column(Integer, nullable=False)
+    available_seats = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+    current_price = Column(Float, nullable=True)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Архивные рейсы компании с keyset-пагинацией по id
+        Index("ix_flights_archive_company", "company_id", "id"),
+    )
+
+
+class TicketArchive(Base):
+    __tablename__ = "tickets_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    flight_id = Column(Integer, ForeignKey("flights_archive.id"), nullable=False)
+    price = Column(Float, nullable=False)
+    status = Column(Enum(TicketStatus))
+    created_at = Column(DateTime)
+    canceled_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Те же выборки, что и по tickets: история пользователя, пассажиры
+        # рейса, аналитика по дням покупки и возврата
+        Index("ix_tickets_archive_user_created", "user_id", "created_at", "id"),
+        Index("ix_tickets_archive_flight_created", "flight_id", "created_at"),
+        Index("ix_tickets_archive_created_at", "created_at"),
+        Index("ix_tickets_archive_canceled_at", "canceled_at"),
+    )
@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import date, datetime, time
+
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+
+# Keyset-пагинация и потоковая выдача списков.
+# Курсор — это значения колонок сортировки последней строки страницы,
+# закодированные в base64. Следующая страница берётся условием
+# (col1, col2, ...) > (v1, v2, ...) по индексу, без OFFSET.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _dump(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def _load(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is time:
+        return time.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps([_dump(v) for v in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_load(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class PageParams:
+    """Общие параметры списков: курсор, размер страницы и формат (json/ndjson)."""
+
+    def __init__(
+        self,
+        cursor: str | None = Query(default=None),
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.stream = format == "ndjson"
+
+
+def _ordered(query, columns, cursor, descending):
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+    return query.order_by(None).order_by(*[c.desc() if descending else c for c in columns])
+
+
+def paginate(query, columns, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE, descending: bool = False):
+    """
+    Возвращает (строки страницы, курсор следующей страницы или None).
+    columns — колонки сортировки; последняя должна быть уникальной (обычно id).
+    """
+    return page_of(_ordered(query, columns, cursor, descending).limit(limit + 1).all(), columns, limit)
+
+
+def page_of(rows, columns, limit: int):
+    """Страница из limit + 1 уже упорядоченных строк: (строки, курсор или None)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, c.key) for c in columns])
+
+
+def set_next_cursor(response: Response, next_cursor: str | None):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+def stream_ndjson(make_query, columns, serialize, cursor: str | None = None, descending: bool = False, rows: bool = False):
+    """
+    Потоковая выдача NDJSON: строки читаются серверным курсором пачками,
+    поэтому память не зависит от размера выборки.
+    make_query(db) строит запрос в собственной сессии — сессия запроса
+    к моменту отправки тела ответа может быть уже закрыта. Если make_query
+    вернул None, поток пустой. Сам make_query не должен обращаться к БД.
+    rows=True — запрос по колонкам, в serialize передаются строки, а не объекты.
+    """
+    from .database import AsyncSessionLocal
+
+    if cursor:
+        decode_cursor(cursor, columns)  # ошибку курсора отдаём до начала потока
+
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            query = make_query(db.sync_session)
+            if query is None:
+                return
+            query = _ordered(query, columns, cursor, descending)
+            result = await db.stream(query.statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+            async for row in (result if rows else result.scalars()):
+                yield serialize(row) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
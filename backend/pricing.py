@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+from bisect import bisect_right
+from datetime import date, datetime
+
+from sqlalchemy import String, bindparam, select, type_coerce, update
+from sqlalchemy.orm import Session
+
+from . import events, flight_cache, routing, shared_state
+from .models import Flight
+from .routing import flight_graph
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен: без него тарифы считаются в цикле Python
+    np = None
+
+# Динамические цены билетов.
+# Компания задаёт базовую цену рейса (Flight.price), а продаётся билет по
+# Flight.current_price: базовая цена × множитель загрузки × множитель срока
+# до вылета. Пересчёт идёт фоновой задачей раз в PRICING_REFRESH_SECONDS
+# пачками по PRICING_BATCH рейсов: колонки пачки читаются одним запросом,
+# тарифы считаются векторно (NumPy), а обратно пишутся только изменившиеся
+# цены — одним executemany. Поиск рейсов, маршруты и покупка читают
+# current_price, поэтому на запрос цена не вычисляется. Новый рейс до
+# первого пересчёта продаётся по базовой цене. Ручной пересчёт:
+#     python -m backend.pricing
+
+logger = logging.getLogger(__name__)
+
+DYNAMIC_PRICING = os.getenv("DYNAMIC_PRICING", "1").lower() in ("1", "true", "yes", "on")
+PRICING_REFRESH_SECONDS = float(os.getenv("PRICING_REFRESH_SECONDS", "300"))
+PRICING_BATCH = int(os.getenv("PRICING_BATCH", "50000"))
+
+# Тарифные корзины по доле проданных мест: с порога — множитель
+LOAD_THRESHOLDS = (0.3, 0.6, 0.8, 0.95)
+LOAD_MULTIPLIERS = (0.85, 1.0, 1.2, 1.45, 1.8)
+# По числу дней до вылета: меньше порога — множитель левее
+DAYS_THRESHOLDS = (3, 7, 14, 30, 60)
+DAYS_MULTIPLIERS = (1.6, 1.4, 1.25, 1.1, 1.0, 0.9)
+
+# Дата и время вылета читаются без обработчиков типов SQLAlchemy (на SQLite
+# это строки ISO, на PostgreSQL — date/time): их разбор регулярными
+# выражениями стоил дороже всего остального пересчёта
+COLUMNS = (
+    Flight.id, Flight.price, Flight.total_seats, Flight.available_seats,
+    type_coerce(Flight.departure_date, String).label("departure_date"),
+    type_coerce(Flight.departure_time, String).label("departure_time"),
+    Flight.current_price, Flight.is_active,
+)
+
+
+def fare(price: float, total_seats: int, available_seats: int, days_left: float):
+    """Тариф одного рейса (та же формула, что у compute_fares)."""
+    load = (total_seats - available_seats) / total_seats if total_seats > 0 else 0.0
+    multiplier = LOAD_MULTIPLIERS[bisect_right(LOAD_THRESHOLDS, load)] * DAYS_MULTIPLIERS[bisect_right(DAYS_THRESHOLDS, days_left)]
+    return round(price * multiplier, 2)
+
+
+def compute_fares(prices, total_seats, available_seats, days_left):
+    """Тарифы для колонок одинаковой длины (списки или массивы)."""
+    if np is None:
+        return [fare(*values) for values in zip(prices, total_seats, available_seats, days_left)]
+    prices = np.asarray(prices, dtype=float)
+    total = np.asarray(total_seats, dtype=float)
+    sold = total - np.asarray(available_seats, dtype=float)
+    load = np.divide(sold, total, out=np.zeros_like(total), where=total > 0)
+    multiplier = (
+        np.asarray(LOAD_MULTIPLIERS)[np.searchsorted(LOAD_THRESHOLDS, load, side="right")]
+        * np.asarray(DAYS_MULTIPLIERS)[np.searchsorted(DAYS_THRESHOLDS, np.asarray(days_left, dtype=float), side="right")]
+    )
+    return np.round(prices * multiplier, 2)
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _ordinal(value):
+    return value.toordinal() if isinstance(value, date) else date.fromisoformat(value[:10]).toordinal()
+
+
+def _seconds(value):
+    if isinstance(value, str):
+        return int(value[:2]) * 3600 + int(value[3:5]) * 60
+    return value.hour * 3600 + value.minute * 60
+
+
+def _days_left(departure_dates, departure_times, now: datetime):
+    # Дни до вылета с долями дня: порядковый номер даты + время суток
+    base = now.toordinal() + (now.hour * 3600 + now.minute * 60 + now.second) / 86400
+    if np is not None and isinstance(departure_times[0], str):
+        # Строки SQLite ('YYYY-MM-DD', 'HH:MM:SS.ffffff') разбираются в NumPy:
+        # дата — как datetime64, часы и минуты — из кодов первых пяти символов
+        days = np.array(departure_dates, dtype="datetime64[D]").astype(np.int64) + _EPOCH_ORDINAL
+        digits = np.array(departure_times, dtype="U5").view(np.uint32).reshape(-1, 5).astype(np.int64) - ord("0")
+        seconds = (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60
+        return days + seconds / 86400 - base
+    return [_ordinal(d) + _seconds(t) / 86400 - base for d, t in zip(departure_dates, departure_times)]
+
+
+def reprice_batch(db: Session, rows, now: datetime):
+    """
+    Пересчитывает пачку строк COLUMNS и записывает изменившиеся цены
+    (без коммита). Возвращает {flight_id: новая цена}.
+    """
+    if not rows:
+        return {}
+    ids, prices, total, available, dates, times, current, active = zip(*rows)
+    fares = compute_fares(prices, total, available, _days_left(dates, times, now))
+    if np is not None:
+        # None (ещё не пересчитана) становится NaN и не равна никакому тарифу
+        changed = np.flatnonzero((fares != np.array(current, dtype=float)) & np.array(active, dtype=bool))
+        updates = dict(zip(np.array(ids)[changed].tolist(), fares[changed].tolist()))
+    else:
+        updates = {
+            flight_id: new
+            for flight_id, new, old, is_active in zip(ids, fares, current, active)
+            if is_active and new != old
+        }
+    if updates:
+        table = Flight.__table__
+        db.execute(
+            update(table).where(table.c.id == bindparam("flight_id")).values(current_price=bindparam("fare")),
+            [{"flight_id": flight_id, "fare": price} for flight_id, price in updates.items()],
+        )
+        # Событие — только для рейсов, которые кто-то смотрит: пересчёт
+        # меняет сотни тысяч цен, и копить их все до коммита незачем
+        for topic in events.bus.subscribed(events.flight_topic(flight_id) for flight_id in updates):
+            events.stage(db, topic, current_price=updates[topic[1]])
+    return updates
+
+
+def reprice_all(db: Session, now: datetime | None = None, batch_size: int = PRICING_BATCH):
+    """
+    Пересчитывает цены всех активных рейсов, которые ещё не улетели.
+    Каждая пачка — своя транзакция, чтобы не держать блокировку записи долго;
+    после коммита сбрасываются кэш поиска и цены в графе маршрутов.
+    Возвращает число рейсов с новой ценой.
+    """
+    now = now or datetime.utcnow()
+    last_id, changed = 0, 0
+    while True:
+        # Пачки по первичному ключу: таблица читается подряд. is_active
+        # проверяется в reprice_batch — с ним в WHERE база пошла бы по индексу
+        # активных рейсов вразброс по таблице и сортировала бы их на каждую пачку.
+        # Запрос Core через соединение сессии: строки без обёрток ORM
+        rows = db.connection().execute(
+            select(*COLUMNS)
+            .where(Flight.id > last_id, Flight.departure_date >= now.date())
+            .order_by(Flight.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates = reprice_batch(db, rows, now)
+        db.commit()
+        if updates:
+            flight_cache.invalidate_seats(updates)
+            flight_graph.update_prices(updates)
+            changed += len(updates)
+    return changed
+
+
+@shared_state.on(routing.CHANNEL)
+def _publish_remote_prices(message):
+    # Пересчёт идёт на одном воркере и ставит события только своим
+    # подписчикам; подписчики остальных воркеров получают цены из рассылки графа
+    prices = dict(message.get("prices") or ())
+    if prices:
+        topics = events.bus.subscribed(events.flight_topic(flight_id) for flight_id in prices)
+        events.bus.publish({topic: {"current_price": prices[topic[1]]} for topic in topics})
+
+
+async def run_repricer(session_factory, interval: float = PRICING_REFRESH_SECONDS):
+    """
+    Фоновая задача приложения (см. lifespan в main.py). session_factory —
+    синхронный sessionmaker: пересчёт идёт в отдельном потоке и не занимает
+    цикл событий на время вычислений.
+    """
+    def reprice():
+        db = session_factory()
+        try:
+            return reprice_all(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            await asyncio.to_thread(reprice)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Repricing failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal, engine
+    from .migrations import migrate
+
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        started = datetime.utcnow()
+        count = reprice_all(db)
+        print(f"Цены пересчитаны за {(datetime.utcnow() - started).total_seconds():.1f} с, изменилось: {count}")
+    finally:
+        db.close()
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from jose import JWTError
+
+from . import auth, metrics, shared_state
+
+# Ограничение частоты запросов (ASGI-middleware, HTTP 429 + Retry-After).
+# Вёдра токенов по IP, по пользователю и по отдельным маршрутам: вход и
+# регистрация (pbkdf2 в пуле хэширования) и покупка билетов отсекаются до
+# того, как запрос дойдёт до БД или хэшера.
+# Ведро хранится одним числом — моментом, когда оно снова станет полным
+# (GCRA: то же ведро токенов, но без отдельного счётчика и пополнения по
+# таймеру — токены «доливаются» при следующем обращении). Ключи лежат в
+# OrderedDict с вытеснением давно не использованных сверх RATE_LIMIT_MAX_KEYS;
+# вытесняется обычно полное ведро, что равносильно его отсутствию.
+# При общем состоянии нескольких воркеров (shared_state) вёдра заменяются
+# счётчиками в окнах длиной period — лимит общий для всех воркеров.
+# Лимит задаётся как "ёмкость/секунды": "10/60" — 10 запросов подряд, затем
+# по одному каждые 6 с; "0" отключает правило. IP берётся из scope["client"]:
+# за балансировщиком запускайте uvicorn с --proxy-headers --forwarded-allow-ips.
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes", "on")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class Limit(NamedTuple):
+    capacity: int  # запросов подряд (размер ведра)
+    period: float  # за сколько секунд пустое ведро наполняется целиком
+
+    @property
+    def interval(self):
+        return self.period / self.capacity
+
+
+def parse_limit(value: str | None):
+    """'10/60' -> Limit(10, 60.0); пустая строка или '0' — без ограничения (None)."""
+    if not value or value.strip() == "0":
+        return None
+    capacity, _, period = value.partition("/")
+    limit = Limit(int(capacity), float(period or 1))
+    if limit.capacity <= 0 or limit.period <= 0:
+        raise ValueError(f"Invalid rate limit: {value!r}")
+    return limit
+
+
+class Rule(NamedTuple):
+    name: str
+    scope: str  # "ip" или "user" (запрос без токена считается по IP)
+    limit: Limit
+    method: str | None = None  # None — любые запросы
+    paths: frozenset = frozenset()
+
+    def matches(self, method: str, path: str):
+        return self.method is None or (method == self.method and path in self.paths)
+
+
+# Порядок важен: сначала правила маршрутов, чтобы отказ по ним не тратил
+# токены общих вёдер IP и пользователя
+RULES = [rule for rule in (
+    Rule("login", "ip", parse_limit(os.getenv("RATE_LIMIT_LOGIN", "10/60")), "POST", frozenset({"/auth/login"})),
+    Rule("register", "ip", parse_limit(os.getenv("RATE_LIMIT_REGISTER", "5/300")), "POST", frozenset({"/auth/register"})),
+    Rule(
+        "booking", "user", parse_limit(os.getenv("RATE_LIMIT_BOOKING", "20/60")), "POST",
+        frozenset({"/tickets", "/tickets/batch", "/tickets/holds"}),
+    ),
+    Rule("user", "user", parse_limit(os.getenv("RATE_LIMIT_USER", "300/30"))),
+    Rule("ip", "ip", parse_limit(os.getenv("RATE_LIMIT_IP", "300/30"))),
+) if rule.limit is not None]
+
+
+class TokenBuckets:
+    """Вёдра токенов в памяти процесса: ключ -> момент, когда ведро снова полное."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._full_at = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, limit: Limit, now: float | None = None):
+        """Берёт токен; возвращает 0, если запрос разрешён, иначе сколько секунд ждать."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            full_at = max(self._full_at.get(key, now), now)
+            # В ведре (capacity - (full_at - now) / interval) токенов
+            wait = full_at + limit.interval - now - limit.period
+            if wait > 0:
+                self._full_at.move_to_end(key)
+                return wait
+            self._full_at[key] = full_at + limit.interval
+            self._full_at.move_to_end(key)
+            if len(self._full_at) > self.max_keys:
+                self._full_at.popitem(last=False)
+            return 0.0
+
+    def __len__(self):
+        return len(self._full_at)
+
+
+class SharedWindows:
+    """
+    Счётчики в shared_state: не больше capacity запросов за окно длиной
+    period. На стыке окон возможен всплеск до 2×capacity — плата за один
+    атомарный incr вместо чтения и записи ведра.
+    """
+
+    def take(self, key, limit: Limit, now: float | None = None):
+        now = time.time() if now is None else now
+        window = int(now // limit.period)
+        count = shared_state.state.incr(f"rate:{key}:{window}", 1, limit.period + 1)
+        if count <= limit.capacity:
+            return 0.0
+        return (window + 1) * limit.period - now
+
+
+def _bearer_token(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token
+    return None
+
+
+def _user(scope):
+    # Тот же кэш token -> email, что и у get_current_user: подпись JWT
+    # проверяется один раз на токен
+    token = _bearer_token(scope)
+    if token is None:
+        return None
+    try:
+        return auth._decode_token_email(token)
+    except JWTError:
+        return None
+
+
+class RateLimiter:
+    def __init__(self, rules=RULES, buckets=None):
+        self.rules = rules
+        if buckets is None:
+            buckets = SharedWindows() if shared_state.state.shared else TokenBuckets()
+        self.buckets = buckets
+
+    def check(self, scope):
+        """Первое сработавшее правило: (имя, секунд до повтора) или None."""
+        method, path = scope["method"], scope["path"]
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+        user, user_checked = None, False
+        for rule in self.rules:
+            if not rule.matches(method, path):
+                continue
+            if rule.scope == "user" and not user_checked:
+                user, user_checked = _user(scope), True
+            if rule.scope == "ip":
+                key = f"{rule.name}:{ip}"
+            elif user is not None:
+                key = f"{rule.name}:{user}"
+            elif rule.method is not None:
+                # Маршрут без токена (ответит 401) — считаем по IP
+                key = f"{rule.name}:ip:{ip}"
+            else:
+                # Общее правило пользователя без токена не нужно: есть правило "ip"
+                continue
+            wait = self.buckets.take(key, rule.limit)
+            if wait:
+                return rule.name, wait
+        return None
+
+
+limiter = RateLimiter()
+
+
+class RateLimitMiddleware:
+    """ASGI-middleware: отказ 429 до маршрутизации, без обращения к БД."""
+
+    def __init__(self, app, limiter: RateLimiter = limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        try:
+            if isinstance(self.limiter.buckets, SharedWindows):
+                # Счётчики на сервере состояния — сетевой запрос, не в цикле событий
+                rejected = await asyncio.to_thread(self.limiter.check, scope)
+            else:
+                rejected = self.limiter.check(scope)
+        except Exception:
+            # Недоступное общее состояние не должно останавливать приложение
+            logger.warning("Rate limit check failed, letting the request through", exc_info=True)
+            rejected = None
+        if rejected is None:
+            return await self.app(scope, receive, send)
+        rule, wait = rejected
+        metrics.rate_limited_requests.inc(rule)
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,41 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from backend.database import get_db
-from backend import crud, schemas, auth, models
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
+from backend import analytics, async_crud, crud, hashing, schemas, auth, models
+from backend.pagination import PageParams, set_next_cursor, stream_ndjson
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-@router.get("/users")
-def get_all_users(db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+@router.get("/users", response_model=list[schemas.UserOut])
+async def get_all_users(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return crud.get_all_users(db)
+    if page.stream:
+        return stream_ndjson(
+            lambda s: s.query(models.User), crud.USERS_ORDER,
+            lambda u: schemas.UserOut.model_validate(u, from_attributes=True).model_dump_json(), page.cursor,
+        )
+    users, next_cursor = await async_crud.get_all_users(db, page.cursor, page.limit)
+    set_next_cursor(response, next_cursor)
+    return users
 
-@router.get("/companies")
-def get_all_companies(db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+@router.get("/companies", response_model=list[schemas.CompanyOut])
+async def get_all_companies(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return crud.get_all_companies(db)
+    if page.stream:
+        return stream_ndjson(
+            lambda s: s.query(models.Company), crud.COMPANIES_ORDER,
+            lambda c: schemas.CompanyOut.model_validate(c, from_attributes=True).model_dump_json(), page.cursor,
+        )
+    companies, next_cursor = await async_crud.get_all_companies(db, page.cursor, page.limit)
+    set_next_cursor(response, next_cursor)
+    return companies
 
 @router.post("/managers")
-def create_manager(manager: schemas.ManagerCreate, db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+async def create_manager(manager: schemas.ManagerCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return crud.create_manager(db, manager)
+    hashed_password = await hashing.hash_password(manager.password)
+    return await async_crud.create_manager(db, manager, hashed_password)
 
 @router.put("/users/{user_id}/status")
-def update_user_status(user_id: int, user_update: schemas.UserUpdate, db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+async def update_user_status(user_id: int, user_update: schemas.UserUpdate, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return crud.update_user_status(db, user_id, user_update.is_active)
+    return await async_crud.update_user_status(db, user_id, user_update.is_active)
 
-@router.get("/stats")
-def get_admin_stats(db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+@router.get("/stats", response_model=schemas.AdminStats)
+async def get_admin_stats(db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    return {
-        "total_users": crud.get_users_count(db),
-        "active_users": crud.get_active_users_count(db),
-        "total_companies": crud.get_companies_count(db)
-    }
+    return await async_crud.get_admin_stats(db)
+
+# Аналитика: читается из сводных таблиц, которые пересчитывает фоновая задача
+# (backend/analytics.py), поэтому время ответа не зависит от объёма билетов
+
+def _require_admin(current_user = Depends(auth.get_current_user)):
+    if current_user.role != models.UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return current_user
+
+AnalyticsDays = Query(30, ge=1, le=analytics.MAX_ANALYTICS_DAYS)
+
+@router.get("/analytics/overview", response_model=schemas.AnalyticsOverview)
+async def analytics_overview(
+    days: int = AnalyticsDays, bucket: Literal["day", "week", "month"] = "day",
+    db: AsyncSession = Depends(get_async_db), current_user = Depends(_require_admin),
+):
+    """Покупки, возвраты, выручка, доля возвратов, покупатели и регистрации по дням."""
+    return await async_crud.get_analytics_overview(db, days, bucket)
+
+@router.get("/analytics/companies", response_model=list[schemas.CompanyRevenueOut])
+async def analytics_companies(days: int = AnalyticsDays, db: AsyncSession = Depends(get_async_db), current_user = Depends(_require_admin)):
+    return await async_crud.get_company_revenue(db, days)
+
+@router.get("/analytics/companies/{company_id}", response_model=list[schemas.CompanyDayOut])
+async def analytics_company_daily(company_id: int, days: int = AnalyticsDays, db: AsyncSession = Depends(get_async_db), current_user = Depends(_require_admin)):
+    return await async_crud.get_company_daily(db, company_id, days)
+
+@router.get("/analytics/routes", response_model=list[schemas.RouteLoadOut])
+async def analytics_routes(
+    limit: int = Query(20, ge=1, le=500), order: Literal["desc", "asc"] = "desc",
+    db: AsyncSession = Depends(get_async_db), current_user = Depends(_require_admin),
+):
+    """Маршруты по загрузке (проданные места / все места)."""
+    return await async_crud.get_route_load(db, limit, order == "asc")
+
+@router.post("/analytics/refresh")
+async def analytics_refresh(full: bool = False, current_user = Depends(_require_admin)):
+    return {"refreshed_at": await async_crud.refresh_analytics(full)}
+
+@router.post("/pricing/reprice")
+async def pricing_reprice(current_user = Depends(_require_admin)):
+    """Пересчёт динамических цен всех рейсов (обычно его делает фоновая задача)."""
+    return {"repriced": await async_crud.reprice_flights()}
+
+@router.post("/archive/run")
+async def archive_run(current_user = Depends(_require_admin)):
+    """Перенос улетевших рейсов и их билетов в архив (обычно его делает фоновая задача)."""
+    return await async_crud.archive_departed()
@@ -1,24 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from backend.database import get_db  # Абсолютный импорт
-from backend import crud, auth, schemas  # Абсолютные импорты
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db  # Абсолютный импорт
+from backend import async_crud, auth, hashing, schemas  # Абсолютные импорты
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register")
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await async_crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     # Убираем проверку роли - теперь все могут регистрироваться как regular
-    return crud.create_user(db, user)
+    hashed_password = await hashing.hash_password(user.password)
+    return await async_crud.create_user(db, user, hashed_password)
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await async_crud.get_user_by_email(db, email=form_data.username)
+    if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
-    crud.check_user_active(db, user_id=user.id)
+    # pbkdf2 нагружает CPU — проверяем в пуле процессов (см. backend/hashing.py)
+    valid, new_hash = await hashing.verify_password(form_data.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+    if new_hash:
+        # Хэш с устаревшими параметрами — сохраняем пересчитанный
+        await async_crud.update_password_hash(db, user.id, new_hash)
+    await async_crud.check_user_active(db, user_id=user.id)
     access_token = auth.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
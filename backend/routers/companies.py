@@ -1,63 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException
+import logging
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from backend.database import get_db
-from backend import crud, schemas, auth, models
+from starlette.concurrency import run_in_threadpool
+from backend.database import get_async_db, get_db
+from backend import async_crud, crud, schemas, auth, models
+from backend.pagination import PageParams, set_next_cursor, stream_ndjson
 
 router = APIRouter(prefix="/company", tags=["company"])
+logger = logging.getLogger(__name__)
 
-@router.get("/flights")
-def get_company_flights(db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+@router.get("/flights", response_model=list[schemas.FlightOut])
+async def get_company_flights(response: Response, page: PageParams = Depends(), archived: bool = Query(default=False), db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.manager:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     if not current_user.company_id:
         raise HTTPException(status_code=400, detail="User is not associated with any company")
-    return crud.get_company_flights(db, current_user.company_id)
+    company_id = current_user.company_id
+    if page.stream:
+        return stream_ndjson(
+            lambda s: crud.company_flights_query(s, company_id, archived),
+            crud.ARCHIVED_FLIGHTS_ORDER if archived else crud.COMPANY_FLIGHTS_ORDER,
+            lambda f: schemas.FlightOut.model_validate(f, from_attributes=True).model_dump_json(), page.cursor,
+        )
+    flights, next_cursor = await async_crud.get_company_flights(db, company_id, page.cursor, page.limit, archived)
+    set_next_cursor(response, next_cursor)
+    return flights
 
-@router.post("/flights")
-def create_flight(flight: schemas.FlightCreate, db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
-    print(f"Получены данные рейса: {flight}")
+@router.post("/flights", response_model=schemas.FlightOut)
+async def create_flight(flight: schemas.FlightCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    logger.debug("Получены данные рейса: %s", flight)
     if current_user.role != models.UserRole.manager:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     if not current_user.company_id:
         raise HTTPException(status_code=400, detail="User is not associated with any company")
-    return crud.create_flight(db, flight, current_user.company_id)
+    return await async_crud.create_flight(db, flight, current_user.company_id)
 
-@router.put("/flights/{flight_id}/status")
-def update_flight_status(flight_id: int, flight_update: schemas.FlightUpdate, db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+@router.post("/flights/import", response_model=schemas.ScheduleImportResult)
+async def import_flights(
+    file: UploadFile = File(...),
+    format: str | None = Query(default=None, pattern="^(csv|ndjson)$"),
+    atomic: bool = Query(default=False),
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_user)
+):
     if current_user.role != models.UserRole.manager:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     if not current_user.company_id:
         raise HTTPException(status_code=400, detail="User is not associated with any company")
-    return crud.update_flight_status(db, flight_id, current_user.company_id, flight_update.is_active)
+    if format is None:
+        name = (file.filename or "").lower()
+        format = "ndjson" if name.endswith((".ndjson", ".jsonl")) or "json" in (file.content_type or "") else "csv"
+    # Разбор и вставка десятков тысяч строк — в пуле потоков с синхронной сессией,
+    # чтобы не занимать event loop
+    return await run_in_threadpool(crud.import_flight_schedule, db, file.file, format, current_user.company_id, atomic)
+
+@router.put("/flights/{flight_id}/status", response_model=schemas.FlightOut | None)
+async def update_flight_status(flight_id: int, flight_update: schemas.FlightUpdate, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    if current_user.role != models.UserRole.manager:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if not current_user.company_id:
+        raise HTTPException(status_code=400, detail="User is not associated with any company")
+    return await async_crud.update_flight_status(db, flight_id, current_user.company_id, flight_update.is_active)
 
 @router.get("/stats")
-def get_company_stats(db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+async def get_company_stats(db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.manager:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     if not current_user.company_id:
         raise HTTPException(status_code=400, detail="User is not associated with any company")
-    return crud.get_company_stats(db, current_user.company_id)
+    return await async_crud.get_company_stats(db, current_user.company_id)
 
 @router.delete("/flights/{flight_id}")
-def delete_flight(flight_id: int, db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+async def delete_flight(flight_id: int, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.manager:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     if not current_user.company_id:
         raise HTTPException(status_code=400, detail="User is not associated with any company")
-    result = crud.delete_flight(db, flight_id, current_user.company_id)
+    result = await async_crud.delete_flight(db, flight_id, current_user.company_id)
     if result is None:
         raise HTTPException(status_code=404, detail="Flight not found")
     if result is False:
         raise HTTPException(status_code=400, detail="Cannot delete flight with existing tickets")
     return {"status": "ok"}
 
-@router.get("/flights/{flight_id}/passengers")
-def flight_passengers(flight_id: int, db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
+_passengers = TypeAdapter(list[schemas.PassengerOut])
+
+@router.get("/flights/{flight_id}/passengers", response_model=list[schemas.PassengerOut])
+async def flight_passengers(flight_id: int, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
     if current_user.role != models.UserRole.manager:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     if not current_user.company_id:
         raise HTTPException(status_code=400, detail="User is not associated with any company")
-    result = crud.get_flight_passengers(db, flight_id, current_user.company_id)
+    result = await async_crud.get_flight_passengers(db, flight_id, current_user.company_id)
     if result is None:
         raise HTTPException(status_code=404, detail="Flight not found")
-    return result
+    return Response(_passengers.dump_json(_passengers.validate_python(result)), media_type="application/json")
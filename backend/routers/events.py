@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from backend.database import AsyncSessionLocal
+from backend import async_crud, auth, events, models
+
+# Server-Sent Events вместо опроса /flights и /company/stats (см. backend/events.py).
+# EventSource в браузере не передаёт заголовки, поэтому токен менеджера — в ?token=.
+# Сессии БД открываются только на время проверки токена и чтения снимка,
+# чтобы открытые подписки не держали соединения пула.
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+def _event_stream(topics, load_snapshot):
+    if events.bus.is_full():
+        raise HTTPException(status_code=503, detail="Too many event subscribers")
+    return StreamingResponse(
+        events.sse_stream(topics, load_snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _parse_ids(ids: str):
+    try:
+        parsed = sorted({int(part) for part in ids.split(",") if part.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not parsed or len(parsed) > events.MAX_TOPICS_PER_SUBSCRIPTION:
+        raise HTTPException(status_code=400, detail=f"From 1 to {events.MAX_TOPICS_PER_SUBSCRIPTION} flight ids")
+    return parsed
+
+@router.get("/flights")
+async def flight_events(ids: str = Query(..., description="id рейсов через запятую")):
+    """
+    События flight: сначала {"flight_id", "available_seats", "is_active", "current_price"},
+    затем flight_id и изменившиеся из этих полей при каждом изменении.
+    """
+    flight_ids = _parse_ids(ids)
+
+    async def snapshot():
+        async with AsyncSessionLocal() as db:
+            rows = await async_crud.get_flight_availability(db, flight_ids)
+        return [
+            (events.flight_topic(row.id), {
+                "available_seats": row.available_seats, "is_active": row.is_active, "current_price": row.current_price,
+            })
+            for row in rows
+        ]
+
+    return _event_stream([events.flight_topic(i) for i in flight_ids], snapshot)
+
+@router.get("/company")
+async def company_events(token: str = Query(...)):
+    """События company: счётчики /company/stats компании менеджера."""
+    async with AsyncSessionLocal() as db:
+        current_user = await auth.get_current_user(token, db)
+    if current_user.role != models.UserRole.manager:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if not current_user.company_id:
+        raise HTTPException(status_code=400, detail="User is not associated with any company")
+    company_id = current_user.company_id
+
+    async def snapshot():
+        async with AsyncSessionLocal() as db:
+            return [(events.company_topic(company_id), await async_crud.get_company_stats(db, company_id))]
+
+    return _event_stream([events.company_topic(company_id)], snapshot)
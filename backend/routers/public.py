@@ -1,24 +1,77 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from backend.database import get_db
-from backend.models import Flight
+from datetime import date as date_type
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
+from backend import async_crud, flight_cache, schemas
+from backend.pagination import NEXT_CURSOR_HEADER, PageParams, stream_ndjson
+from backend.search import SEARCH_ORDER, search_flights
+from backend import routing
 
 router = APIRouter(prefix="", tags=["public"])
 
-@router.get("/flights")
-def list_flights(
-    db: Session = Depends(get_db),
+def _flight_json(flight):
+    return schemas.FlightOut.model_validate(flight, from_attributes=True).model_dump_json()
+
+@router.get("/flights", response_model=list[schemas.FlightOut])
+async def list_flights(
+    db: AsyncSession = Depends(get_async_db),
     departure_city: str | None = Query(default=None),
     arrival_city: str | None = Query(default=None),
-    date: str | None = Query(default=None)
+    date: date_type | None = Query(default=None),
+    page: PageParams = Depends(),
+    if_none_match: str | None = Header(default=None)
+):
+    # Города ищутся по префиксу через индекс (см. backend/search.py)
+    if page.stream:
+        await async_crud.load_city_index(db)
+        return stream_ndjson(
+            lambda s: search_flights(s, departure_city, arrival_city, date),
+            SEARCH_ORDER, _flight_json, page.cursor,
+        )
+    # Готовые страницы берутся из кэша (см. backend/flight_cache.py);
+    # повторный опрос с тем же ETag получает 304 без обращения к БД
+    key = flight_cache.search_key(departure_city, arrival_city, date, page.cursor, page.limit)
+    cached = flight_cache.flight_search_cache.get(key)
+    if cached is None:
+        version = flight_cache.flight_search_cache.version
+        flights, next_cursor = await async_crud.search_flights(db, departure_city, arrival_city, date, page.cursor, page.limit)
+        cached = flight_cache.render_page(flights, next_cursor)
+        flight_cache.store_page(key, cached, [f.id for f in flights], version)
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if cached.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = cached.next_cursor
+    if flight_cache.etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+@router.get("/itineraries", response_model=list[schemas.ItineraryOut])
+async def search_itineraries(
+    departure_city: str = Query(min_length=1),
+    arrival_city: str = Query(min_length=1),
+    date: date_type = Query(),
+    max_connections: int = Query(default=1, ge=0, le=routing.MAX_CONNECTIONS),
+    min_layover_minutes: int = Query(default=routing.DEFAULT_MIN_LAYOVER_MINUTES, ge=0),
+    max_layover_minutes: int = Query(default=routing.DEFAULT_MAX_LAYOVER_MINUTES, ge=1, le=48 * 60),
+    sort: str = Query(default="price", pattern="^(price|duration)$"),
+    seats: int = Query(default=1, ge=1),
+    limit: int = Query(default=10, ge=1, le=50),
+):
+    # Маршруты с пересадками по графу рейсов (см. backend/routing.py)
+    if max_layover_minutes < min_layover_minutes:
+        raise HTTPException(status_code=400, detail="max_layover_minutes must not be less than min_layover_minutes")
+    return await async_crud.search_itineraries(
+        departure_city, arrival_city, date,
+        max_connections=max_connections, min_layover_minutes=min_layover_minutes,
+        max_layover_minutes=max_layover_minutes, sort=sort, seats=seats, limit=limit,
+    )
+
+@router.get("/cities")
+async def autocomplete_cities(
+    db: AsyncSession = Depends(get_async_db),
+    prefix: str = Query(default="", max_length=64),
+    limit: int = Query(default=10, ge=1, le=50)
 ):
-    query = db.query(Flight).filter(Flight.is_active == True)
-    if departure_city:
-        query = query.filter(Flight.departure_city.ilike(f"%{departure_city}%"))
-    if arrival_city:
-        query = query.filter(Flight.arrival_city.ilike(f"%{arrival_city}%"))
-    if date:
-        query = query.filter(Flight.departure_date == date)
-    return query.order_by(Flight.departure_date, Flight.departure_time).all()
+    return await async_crud.autocomplete_cities(db, prefix, limit)
 
 
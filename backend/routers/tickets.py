@@ -1,40 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from backend.database import get_db
-from backend import auth, crud, schemas
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
+from backend import async_crud, auth, crud, schemas
+from backend.pagination import PageParams, set_next_cursor, stream_ndjson
 
 router = APIRouter(prefix="/tickets", tags=["tickets"])
 
 @router.post("", response_model=schemas.TicketOut)
-def buy_ticket(payload: schemas.TicketCreate, db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
-    ticket = crud.create_ticket(db, user_id=current_user.id, flight_id=payload.flight_id)
+async def buy_ticket(payload: schemas.TicketCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    ticket = await async_crud.create_ticket(db, user_id=current_user.id, flight_id=payload.flight_id)
     if ticket is None:
         raise HTTPException(status_code=400, detail="Flight is unavailable")
     return ticket
 
-@router.get("/my")
-def my_tickets(db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
-    tickets = crud.get_user_tickets(db, current_user.id)
-    # Формируем удобный вывод с данными рейса
-    result = []
-    for t in tickets:
-        f = t.flight
-        result.append({
-            "id": t.id,
-            "flight_id": f.id,
-            "flight_number": f.flight_number,
-            "route": f"{f.departure_city} → {f.arrival_city}",
-            "date": str(f.departure_date),
-            "time": str(f.departure_time),
-            "price": t.price,
-            "status": t.status.value,
-            "created_at": t.created_at.isoformat(),
-        })
-    return result
+@router.post("/batch", response_model=list[schemas.TicketOut])
+async def buy_tickets(payload: schemas.TicketBatchCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    # Все места бронируются атомарно: либо все билеты, либо ни одного
+    return await async_crud.create_tickets(db, current_user.id, payload.items)
+
+@router.post("/holds", response_model=list[schemas.TicketOut])
+async def hold_tickets(payload: schemas.TicketBatchCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    # Места списываются сразу, но билеты остаются в статусе held до подтверждения;
+    # неподтверждённые брони снимает фоновый сборщик (backend/holds.py)
+    return await async_crud.create_tickets(db, current_user.id, payload.items, hold=True)
+
+@router.post("/holds/confirm", response_model=list[schemas.TicketOut])
+async def confirm_holds(payload: schemas.TicketIds, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    return await async_crud.confirm_holds(db, current_user.id, payload.ticket_ids)
+
+@router.post("/holds/release")
+async def release_holds(payload: schemas.TicketIds, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    released = await async_crud.release_holds(db, current_user.id, payload.ticket_ids)
+    return {"released": released}
+
+_my_tickets = TypeAdapter(list[schemas.MyTicketOut])
+
+def _ticket_json(row):
+    return schemas.MyTicketOut.model_validate(row).model_dump_json()
+
+@router.get("/my", response_model=list[schemas.MyTicketOut])
+async def my_tickets(page: PageParams = Depends(), archived: bool = Query(default=False), db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    user_id = current_user.id
+    if page.stream:
+        return stream_ndjson(
+            lambda s: crud.user_tickets_query(s, user_id, archived),
+            crud.ARCHIVED_TICKETS_ORDER if archived else crud.USER_TICKETS_ORDER,
+            _ticket_json, page.cursor, descending=True, rows=True,
+        )
+    tickets, next_cursor = await async_crud.get_user_tickets(db, user_id, page.cursor, page.limit, archived)
+    # Строки запроса сразу сериализуются в JSON (pydantic-core), минуя jsonable_encoder
+    response = Response(_my_tickets.dump_json(_my_tickets.validate_python(tickets, from_attributes=True)), media_type="application/json")
+    set_next_cursor(response, next_cursor)
+    return response
 
 @router.put("/{ticket_id}/cancel")
-def cancel(ticket_id: int, db: Session = Depends(get_db), current_user = Depends(auth.get_current_user)):
-    result = crud.cancel_ticket(db, current_user.id, ticket_id)
+async def cancel(ticket_id: int, db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    result = await async_crud.cancel_ticket(db, current_user.id, ticket_id)
     if result is None:
         raise HTTPException(status_code=400, detail="Cannot cancel this ticket")
     if result is False:
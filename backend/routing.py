@@ -0,0 +1,311 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import shared_state
+from .models import Flight
+from .search import city_index
+
+# Поиск маршрутов с пересадками.
+# Активные рейсы держатся в памяти как граф, развёрнутый во времени:
+# город -> дата вылета -> отсортированные по времени вылета рейсы.
+# Стыковки из города прилёта находятся бинарным поиском по окну пересадки,
+# а маршруты перебираются по возрастанию цены (или длительности) через кучу,
+# поэтому первые найденные маршруты — лучшие, и перебор останавливается рано.
+# Граф обновляется точечно при создании/отключении/удалении рейсов, импорте
+# расписания и пересчёте цен — в том числе по рассылкам других воркеров
+# (shared_state); полная перезагрузка — раз в ROUTING_RELOAD_SECONDS (то, что
+# рассылки не донесли) и для отбрасывания улетевших рейсов.
+
+ROUTING_RELOAD_SECONDS = 600
+CHANNEL = "flight_graph"
+MAX_CONNECTIONS = 3
+MAX_EXPANSIONS = 20000  # предел извлечений из кучи на один запрос
+DEFAULT_MIN_LAYOVER_MINUTES = 45
+DEFAULT_MAX_LAYOVER_MINUTES = 12 * 60
+# Сколько раз продолжается маршрут, заканчивающийся одним и тем же рейсом (на
+# каждый нужный результат). Вершина графа во времени — прилёт рейса, а не город:
+# как в поиске k кратчайших путей, дальше развивается только k лучших путей до
+# неё, остальные заведомо хуже. Ограничивать по городу нельзя: дешёвые прилёты
+# без стыковок занимали бы лимит хаба, и рабочие маршруты не рассматривались бы
+VISITS_PER_RESULT = 2
+# Места проверяются по БД в конце, поэтому кандидатов берётся с запасом; если
+# подходящих не хватило, поиск повторяется без проданных и отключённых рейсов
+OVERFETCH = 2
+MAX_SEARCH_ROUNDS = 10
+
+
+class Leg(NamedTuple):
+    id: int
+    origin: str
+    destination: str
+    departs: datetime
+    arrives: datetime
+    price: float
+
+
+def _leg(flight):
+    return Leg(
+        flight.id,
+        flight.departure_city_key,
+        flight.arrival_city_key,
+        datetime.combine(flight.departure_date, flight.departure_time),
+        datetime.combine(flight.arrival_date, flight.arrival_time),
+        flight.current_price,
+    )
+
+
+class FlightGraph:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # граф перестраивает один поток, остальные ждут его
+        self._legs = {}  # id -> Leg
+        self._departures = {}  # город -> дата -> ([время вылета], [id])
+        self._loaded_at = None
+
+    def _insert(self, leg: Leg):
+        by_date = self._departures.setdefault(leg.origin, {})
+        times, ids = by_date.setdefault(leg.departs.date(), ([], []))
+        position = bisect_right(times, leg.departs)
+        times.insert(position, leg.departs)
+        ids.insert(position, leg.id)
+        self._legs[leg.id] = leg
+
+    def _remove(self, flight_id: int):
+        leg = self._legs.pop(flight_id, None)
+        if leg is None:
+            return
+        times, ids = self._departures[leg.origin][leg.departs.date()]
+        start, end = bisect_left(times, leg.departs), bisect_right(times, leg.departs)
+        position = ids.index(flight_id, start, end)
+        del times[position], ids[position]
+
+    def load(self, db: Session):
+        rows = db.execute(
+            select(
+                Flight.id, Flight.departure_city_key, Flight.arrival_city_key,
+                Flight.departure_date, Flight.departure_time,
+                Flight.arrival_date, Flight.arrival_time, Flight.current_price,
+            )
+            .where(Flight.is_active == True, Flight.departure_date >= date.today())
+            .execution_options(yield_per=5000)
+        )
+        legs = [_leg(row) for row in rows]
+        with self._lock:
+            self._legs = {}
+            self._departures = {}
+            for leg in legs:
+                if leg.origin and leg.destination:
+                    self._insert(leg)
+            self._loaded_at = time.monotonic()
+
+    def _stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > ROUTING_RELOAD_SECONDS
+
+    def ensure_loaded(self, db: Session):
+        if self._stale():
+            with self._load_lock:
+                if self._stale():
+                    self.load(db)
+
+    def add(self, flight):
+        """Добавляет (или обновляет) активный рейс; до первой загрузки граф не меняется."""
+        self.add_many([flight])
+
+    def add_many(self, flights):
+        legs = [_leg(flight) for flight in flights if flight.departure_city_key and flight.arrival_city_key]
+        if not legs:
+            return
+        self._apply_legs(legs)
+        shared_state.broadcast(CHANNEL, {"add": [
+            [leg.id, leg.origin, leg.destination, leg.departs.isoformat(), leg.arrives.isoformat(), leg.price]
+            for leg in legs
+        ]})
+
+    def remove(self, flight_id: int):
+        self._apply_remove([flight_id])
+        shared_state.broadcast(CHANNEL, {"remove": [flight_id]})
+
+    def update_prices(self, prices: dict):
+        """Новые цены рейсов {id: цена} после пересчёта тарифов (pricing.py)."""
+        self._apply_prices(prices.items())
+        shared_state.broadcast(CHANNEL, {"prices": list(prices.items())})
+
+    def _apply_legs(self, legs):
+        if self._loaded_at is None:
+            return
+        with self._lock:
+            for leg in legs:
+                self._remove(leg.id)
+                self._insert(leg)
+
+    def _apply_remove(self, flight_ids):
+        if self._loaded_at is None:
+            return
+        with self._lock:
+            for flight_id in flight_ids:
+                self._remove(flight_id)
+
+    def _apply_prices(self, prices):
+        with self._lock:
+            for flight_id, price in prices:
+                leg = self._legs.get(flight_id)
+                if leg is not None:
+                    self._legs[flight_id] = leg._replace(price=price)
+
+    def departures(self, city: str, start: datetime, end: datetime):
+        """Рейсы из города с вылетом в интервале [start, end]."""
+        by_date = self._departures.get(city)
+        if not by_date:
+            return
+        day = start.date()
+        while day <= end.date():
+            bucket = by_date.get(day)
+            if bucket:
+                times, ids = bucket
+                lo = bisect_left(times, start) if day == start.date() else 0
+                hi = bisect_right(times, end) if day == end.date() else len(times)
+                for flight_id in ids[lo:hi]:
+                    leg = self._legs.get(flight_id)
+                    if leg is not None:
+                        yield leg
+            day += timedelta(days=1)
+
+    def search(self, origins, destinations, day: date, max_connections: int = 1,
+               min_layover: timedelta = timedelta(minutes=DEFAULT_MIN_LAYOVER_MINUTES),
+               max_layover: timedelta = timedelta(minutes=DEFAULT_MAX_LAYOVER_MINUTES),
+               sort: str = "price", limit: int = 10, exclude=frozenset()):
+        """
+        Возвращает до limit маршрутов (кортежей Leg) по возрастанию цены или
+        длительности. Маршрут не заходит дважды в один город и не использует
+        рейсы с id из exclude.
+        """
+        by_duration = sort == "duration"
+
+        def cost(first: Leg, last: Leg, price: float):
+            duration = last.arrives - first.departs
+            return (duration, price) if by_duration else (price, duration)
+
+        heap, counter = [], 0
+        day_start = datetime.combine(day, datetime.min.time())
+        for origin in origins:
+            for leg in self.departures(origin, day_start, day_start + timedelta(days=1) - timedelta(microseconds=1)):
+                if leg.destination in origins or leg.id in exclude:
+                    continue
+                heapq.heappush(heap, (cost(leg, leg, leg.price), counter, leg.price, (leg,)))
+                counter += 1
+
+        results, visits = [], {}
+        max_visits = max(1, limit) * VISITS_PER_RESULT
+        expansions = 0
+        while heap and len(results) < limit and expansions < MAX_EXPANSIONS:
+            _, _, price, path = heapq.heappop(heap)
+            expansions += 1
+            last = path[-1]
+            if last.destination in destinations:
+                results.append(path)
+                continue
+            seen = visits.get(last.id, 0)
+            if seen >= max_visits or len(path) > max_connections:
+                continue
+            visits[last.id] = seen + 1
+            cities = {path[0].origin, *(leg.destination for leg in path)}
+            # Последний допустимый перелёт обязан прилетать в пункт назначения
+            final_hop = len(path) == max_connections
+            for leg in self.departures(last.destination, last.arrives + min_layover, last.arrives + max_layover):
+                if leg.destination in cities or leg.id in exclude or (final_hop and leg.destination not in destinations):
+                    continue
+                total = price + leg.price
+                heapq.heappush(heap, (cost(path[0], leg, total), counter, total, path + (leg,)))
+                counter += 1
+        return results
+
+
+flight_graph = FlightGraph()
+
+
+@shared_state.on(CHANNEL)
+def _apply_remote(message):
+    # Изменения графа, сделанные другими воркерами (см. shared_state)
+    if message.get("add"):
+        flight_graph._apply_legs([
+            Leg(flight_id, origin, destination, datetime.fromisoformat(departs), datetime.fromisoformat(arrives), price)
+            for flight_id, origin, destination, departs, arrives, price in message["add"]
+        ])
+    if message.get("remove"):
+        flight_graph._apply_remove(message["remove"])
+    if message.get("prices"):
+        flight_graph._apply_prices(message["prices"])
+
+
+def _itinerary(flights):
+    departure = datetime.combine(flights[0].departure_date, flights[0].departure_time)
+    arrival = datetime.combine(flights[-1].arrival_date, flights[-1].arrival_time)
+    return {
+        "legs": flights,
+        "total_price": sum(f.current_price for f in flights),
+        "departure": departure,
+        "arrival": arrival,
+        "duration_minutes": int((arrival - departure).total_seconds() // 60),
+        "connections": len(flights) - 1,
+    }
+
+
+def search_itineraries(
+    db: Session,
+    departure_city: str,
+    arrival_city: str,
+    date: date,
+    max_connections: int = 1,
+    min_layover_minutes: int = DEFAULT_MIN_LAYOVER_MINUTES,
+    max_layover_minutes: int = DEFAULT_MAX_LAYOVER_MINUTES,
+    sort: str = "price",
+    seats: int = 1,
+    limit: int = 10,
+):
+    """
+    Маршруты между городами (префиксы, как в /flights) с вылетом в указанную дату.
+    Граф даёт кандидатов, а актуальные места и цены берутся запросом к БД;
+    маршруты через проданные рейсы отбрасываются, и поиск повторяется без них.
+    """
+    city_index.ensure_loaded(db)
+    origins = city_index.match(departure_city)
+    destinations = city_index.match(arrival_city)
+    if not origins or not destinations:
+        return []
+    flight_graph.ensure_loaded(db)
+    flights, excluded, itineraries = {}, set(), {}
+    for _ in range(MAX_SEARCH_ROUNDS):
+        candidates = flight_graph.search(
+            origins, destinations - origins, date,
+            max_connections=min(max_connections, MAX_CONNECTIONS),
+            min_layover=timedelta(minutes=min_layover_minutes),
+            max_layover=timedelta(minutes=max_layover_minutes),
+            sort=sort, limit=limit * OVERFETCH, exclude=excluded,
+        )
+        ids = {leg.id for path in candidates for leg in path} - flights.keys()
+        if ids:
+            # Только по первичному ключу: с условиями на is_active/места SQLite
+            # выбирает индекс по активным рейсам и сканирует его целиком
+            flights.update((f.id, f) for f in db.query(Flight).filter(Flight.id.in_(ids)))
+        # Удалённые, отключённые и рейсы без нужного числа мест
+        unavailable = {
+            flight_id for flight_id in ids
+            if (flight := flights.get(flight_id)) is None or not flight.is_active or flight.available_seats < seats
+        }
+        for path in candidates:
+            if not any(leg.id in unavailable for leg in path):
+                itineraries[tuple(leg.id for leg in path)] = _itinerary([flights[leg.id] for leg in path])
+        # Хватило, перебор исчерпан или все кандидаты годятся — больше искать нечего
+        if len(itineraries) >= limit or len(candidates) < limit * OVERFETCH or not unavailable:
+            break
+        excluded |= unavailable
+    key = (lambda i: (i["duration_minutes"], i["total_price"])) if sort == "duration" \
+        else (lambda i: (i["total_price"], i["duration_minutes"]))
+    return sorted(itineraries.values(), key=key)[:limit]
@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import flight_cache, schemas, stats
+from .models import Flight
+from .routing import flight_graph
+from .search import city_index, normalize_city
+
+# Массовая загрузка расписания рейсов (CSV или NDJSON).
+# Файл читается построчно, каждая строка проверяется отдельно, регулярные
+# рейсы разворачиваются в конкретные даты, а вставка идёт пачками
+# executemany в одной транзакции с одним обновлением статистики компании.
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_FLIGHTS = 100_000  # после разворачивания повторов
+IMPORT_MAX_ERRORS = 1000  # сколько ошибок строк возвращать клиенту
+MAX_OCCURRENCES_PER_ROW = 366
+
+GRAPH_COLUMNS = (
+    Flight.id, Flight.departure_city_key, Flight.arrival_city_key,
+    Flight.departure_date, Flight.departure_time, Flight.arrival_date, Flight.arrival_time, Flight.current_price,
+)
+
+
+class ScheduleRowError(ValueError):
+    pass
+
+
+def _read_rows(fileobj, fmt: str):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        # Номер строки считаем с учётом заголовка
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, {key.strip(): (value.strip() if isinstance(value, str) else value)
+                           for key, value in row.items() if key and value not in (None, "")}
+    else:
+        for number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield number, ScheduleRowError(f"Invalid JSON: {exc.msg}")
+                continue
+            if not isinstance(row, dict):
+                yield number, ScheduleRowError("Expected a JSON object")
+                continue
+            yield number, row
+
+
+def _format_validation_error(exc: ValidationError):
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in exc.errors())
+
+
+def _parse_date(value: str, field: str):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ScheduleRowError(f"{field}: expected YYYY-MM-DD")
+
+
+def _parse_time(value: str, field: str):
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        raise ScheduleRowError(f"{field}: expected HH:MM")
+
+
+def _occurrence_offsets(row: schemas.FlightScheduleRow, departure_date: date):
+    if not row.repeat_until:
+        return [0]
+    until = _parse_date(row.repeat_until, "repeat_until")
+    if until < departure_date:
+        raise ScheduleRowError("repeat_until is before departure_date")
+    weekdays = None
+    if row.days_of_week:
+        try:
+            weekdays = {int(day) for day in row.days_of_week.replace(" ", "").split(",") if day}
+        except ValueError:
+            weekdays = {0}
+        if not weekdays or not weekdays <= set(range(1, 8)):
+            raise ScheduleRowError("days_of_week: expected ISO weekdays 1-7, e.g. 1,3,5")
+    offsets = []
+    for offset in range(0, (until - departure_date).days + 1, row.interval_days):
+        if weekdays is None or (departure_date + timedelta(days=offset)).isoweekday() in weekdays:
+            offsets.append(offset)
+    if len(offsets) > MAX_OCCURRENCES_PER_ROW:
+        raise ScheduleRowError(f"Too many occurrences ({len(offsets)} > {MAX_OCCURRENCES_PER_ROW})")
+    return offsets
+
+
+def _expand_row(raw: dict, company_id: int):
+    """Проверяет строку и возвращает список словарей для вставки в flights."""
+    try:
+        row = schemas.FlightScheduleRow.model_validate(raw)
+    except ValidationError as exc:
+        raise ScheduleRowError(_format_validation_error(exc))
+    departure_date = _parse_date(row.departure_date, "departure_date")
+    arrival_date = _parse_date(row.arrival_date, "arrival_date")
+    departure_time = _parse_time(row.departure_time, "departure_time")
+    arrival_time = _parse_time(row.arrival_time, "arrival_time")
+    if datetime.combine(arrival_date, arrival_time) <= datetime.combine(departure_date, departure_time):
+        raise ScheduleRowError("Arrival must be after departure")
+    departure_key = normalize_city(row.departure_city)
+    arrival_key = normalize_city(row.arrival_city)
+    if not departure_key or not arrival_key:
+        raise ScheduleRowError("Departure and arrival cities are required")
+    now = datetime.utcnow()
+    return [
+        {
+            "company_id": company_id,
+            "flight_number": row.flight_number,
+            "departure_city": row.departure_city,
+            "arrival_city": row.arrival_city,
+            "departure_city_key": departure_key,
+            "arrival_city_key": arrival_key,
+            "departure_date": departure_date + timedelta(days=offset),
+            "departure_time": departure_time,
+            "arrival_date": arrival_date + timedelta(days=offset),
+            "arrival_time": arrival_time,
+            "total_seats": row.total_seats,
+            "available_seats": row.total_seats,
+            "price": row.price,
+            "is_active": True,
+            "created_at": now,
+        }
+        for offset in _occurrence_offsets(row, departure_date)
+    ]
+
+
+def import_schedule(db: Session, fileobj, fmt: str, company_id: int, atomic: bool = False):
+    """
+    Загружает расписание из файла. Ошибочные строки пропускаются и попадают
+    в отчёт; при atomic=True любая ошибка отменяет весь импорт.
+    """
+    result = {"rows": 0, "imported": 0, "failed": 0, "errors": []}
+    batch, cities, inserted = [], set(), []
+    total_seats = 0
+
+    def flush():
+        nonlocal batch
+        if batch:
+            # Вставленные строки нужны графу маршрутов (см. routing.py)
+            inserted.extend(db.execute(insert(Flight).returning(*GRAPH_COLUMNS), batch).all())
+            batch = []
+
+    for number, raw in _read_rows(fileobj, fmt):
+        result["rows"] += 1
+        try:
+            if isinstance(raw, ScheduleRowError):
+                raise raw
+            flights = _expand_row(raw, company_id)
+            if result["imported"] + len(flights) > IMPORT_MAX_FLIGHTS:
+                raise ScheduleRowError(f"Import is limited to {IMPORT_MAX_FLIGHTS} flights")
+        except ScheduleRowError as exc:
+            result["failed"] += 1
+            if len(result["errors"]) < IMPORT_MAX_ERRORS:
+                result["errors"].append({"row": number, "error": str(exc)})
+            continue
+        batch.extend(flights)
+        result["imported"] += len(flights)
+        total_seats += sum(f["total_seats"] for f in flights)
+        cities.update((flights[0]["departure_city"], flights[0]["arrival_city"]))
+        if atomic and result["failed"]:
+            batch = []  # импорт всё равно будет отменён — дальше только проверяем строки
+        elif len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+
+    if atomic and result["failed"]:
+        db.rollback()
+        result["imported"] = 0
+        return result
+    flush()
+    stats.apply_delta(
+        db, company_id,
+        total_flights=result["imported"], active_flights=result["imported"],
+        total_seats=total_seats, available_seats=total_seats,
+    )
+    db.commit()
+    city_index.add(*cities)
+    flight_graph.add_many(inserted)
+    flight_cache.invalidate_routes(
+        (f.departure_city_key, f.arrival_city_key, f.departure_date) for f in inserted
+    )
+    return result
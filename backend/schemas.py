@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from .models import UserRole
+from pydantic import BaseModel, Field
+from .models import TicketStatus, UserRole
 from typing import Optional
 from datetime import datetime, date, time
 
@@ -48,6 +48,24 @@ class FlightCreate(BaseModel):
     total_seats: int
     price: float
 
+class FlightScheduleRow(FlightCreate):
+    # Строка массового импорта; repeat_until разворачивает рейс в расписание
+    total_seats: int = Field(gt=0)
+    price: float = Field(ge=0)
+    repeat_until: str | None = None  # последняя дата вылета, YYYY-MM-DD
+    interval_days: int = Field(default=1, ge=1)
+    days_of_week: str | None = None  # ISO-дни недели через запятую: "1,3,5"
+
+class ScheduleImportError(BaseModel):
+    row: int
+    error: str
+
+class ScheduleImportResult(BaseModel):
+    rows: int  # строк в файле
+    imported: int  # создано рейсов (после разворачивания повторов)
+    failed: int
+    errors: list[ScheduleImportError]
+
 class FlightOut(BaseModel):
     id: int
     flight_number: str
@@ -59,11 +77,20 @@ class FlightOut(BaseModel):
     arrival_time: time
     total_seats: int
     available_seats: int
-    price: float
+    price: float  # базовая цена, заданная компанией
+    current_price: float | None = None  # цена продажи сейчас (pricing.py)
     is_active: bool
     created_at: datetime
     company_id: int
 
+class ItineraryOut(BaseModel):
+    legs: list[FlightOut]
+    total_price: float
+    departure: datetime
+    arrival: datetime
+    duration_minutes: int
+    connections: int
+
 class FlightUpdate(BaseModel):
     is_active: bool
 
@@ -75,16 +102,112 @@ class CompanyStats(BaseModel):
     total_revenue: float
 
 
+class AdminStats(BaseModel):
+    total_users: int
+    active_users: int
+    total_companies: int
+
+
+# Аналитика админки (analytics.py)
+class AnalyticsPoint(BaseModel):
+    day: date  # начало дня, недели или месяца
+    bookings: int
+    refunds: int
+    revenue: float
+    refunded: float
+    refund_rate: float
+    active_users: int
+    new_users: int
+
+class AnalyticsOverview(BaseModel):
+    refreshed_at: datetime | None
+    series: list[AnalyticsPoint]
+
+class CompanyRevenueOut(BaseModel):
+    company_id: int
+    company_name: str
+    bookings: int
+    refunds: int
+    revenue: float
+    refunded: float
+    refund_rate: float
+
+class CompanyDayOut(BaseModel):
+    day: date
+    bookings: int
+    refunds: int
+    revenue: float
+    refunded: float
+    refund_rate: float
+
+class RouteLoadOut(BaseModel):
+    departure_city: str
+    arrival_city: str
+    flights: int
+    total_seats: int
+    sold_seats: int
+    load_factor: float
+
+    class Config:
+        from_attributes = True
+
+
 class TicketCreate(BaseModel):
     flight_id: int
 
 
+class TicketBatchItem(BaseModel):
+    flight_id: int
+    seats: int = Field(default=1, ge=1)
+
+
+class TicketBatchCreate(BaseModel):
+    # Несколько мест и/или рейсов (например, стыковочные сегменты) одной транзакцией
+    items: list[TicketBatchItem] = Field(min_length=1)
+
+
+class TicketIds(BaseModel):
+    # Подтверждение или отказ от временных броней
+    ticket_ids: list[int] = Field(min_length=1, max_length=50)
+
+
+# Строки списков билетов и пассажиров: заполняются прямо из строк
+# запросов по колонкам, без загрузки ORM-объектов
+class MyTicketOut(BaseModel):
+    id: int
+    flight_id: int
+    flight_number: str
+    route: str
+    date: date
+    time: time
+    price: float
+    status: TicketStatus
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class PassengerUser(BaseModel):
+    id: int
+    email: str
+    first_name: str | None = None
+    last_name: str | None = None
+    is_active: bool
+
+class PassengerOut(BaseModel):
+    ticket_id: int
+    status: TicketStatus
+    price: float
+    created_at: datetime
+    user: PassengerUser
+
 class TicketOut(BaseModel):
     id: int
     flight_id: int
     price: float
     status: str
     created_at: datetime
+    hold_expires_at: datetime | None = None  # только у временной брони
 
     class Config:
         from_attributes = True
\ No newline at end of file
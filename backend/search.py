@@ -0,0 +1,238 @@
+import threading
+import time
+from datetime import date as date_type
+
+from sqlalchemy import select, union, union_all, update
+from sqlalchemy.orm import Session, aliased
+
+from . import shared_state
+from .models import Flight
+from .pagination import _ordered, page_of, paginate, DEFAULT_PAGE_SIZE
+
+# Поиск рейсов.
+# Города хранятся в нормализованном виде (departure_city_key/arrival_city_key),
+# а префиксы из строки поиска раскрываются в точные ключи через префиксное дерево.
+# Так запрос к БД идёт по равенству и читает индекс маршрута или одного города
+# (ix_flights_route_search, ix_flights_departure_search, ix_flights_arrival_search)
+# уже в порядке выдачи, вместо полного сканирования с ilike('%...%'). Индекс
+# упорядочивает рейсы только внутри одного ключа, поэтому если префикс
+# раскрылся в несколько городов, страница склеивается из страниц отдельных
+# ключей (_merged_page). Одним запросом с IN, который может обходить все
+# активные рейсы, идут только префиксы с очень многими городами (больше
+# MAX_MERGED_ROUTES): совпадений у них много, и страница набирается быстро.
+
+CITY_INDEX_TTL_SECONDS = 300  # как часто перечитывать список городов из БД
+CHANNEL = "city_index"
+
+
+def normalize_city(value: str | None):
+    if value is None:
+        return None
+    return " ".join(value.split()).casefold().replace("ё", "е")
+
+
+class CityIndex:
+    """
+    Префиксное дерево по нормализованным названиям городов.
+    Каждый узел хранит множество ключей городов под ним, поэтому поиск
+    по префиксу стоит O(длина префикса). Индексируется и полное название,
+    и каждое слово: «york» находит «new york».
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._root = {}
+        self._keys = set()
+        self._loaded_at = None
+
+    def _insert(self, key: str):
+        tokens = {key, *key.split(" ")}
+        for token in tokens:
+            node = self._root
+            for char in token:
+                node = node.setdefault(char, {})
+                node.setdefault("", set()).add(key)
+        self._keys.add(key)
+
+    def add(self, *cities: str | None):
+        keys = {key for key in map(normalize_city, cities) if key}
+        if not keys:
+            return
+        self._apply(keys)
+        shared_state.broadcast(CHANNEL, sorted(keys))
+
+    def _apply(self, keys):
+        new = [key for key in keys if key not in self._keys]
+        if new:
+            with self._lock:
+                for key in new:
+                    self._insert(key)
+
+    def load(self, db: Session):
+        keys = db.execute(
+            union(select(Flight.departure_city_key), select(Flight.arrival_city_key))
+        ).scalars().all()
+        with self._lock:
+            self._root = {}
+            self._keys = set()
+            for key in keys:
+                if key:
+                    self._insert(key)
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > CITY_INDEX_TTL_SECONDS:
+            self.load(db)
+
+    def match(self, prefix: str):
+        node = self._root
+        for char in normalize_city(prefix) or "":
+            node = node.get(char)
+            if node is None:
+                return set()
+        return set(node.get("", ()))
+
+    def autocomplete(self, prefix: str, limit: int = 10):
+        return [key.title() for key in sorted(self.match(prefix))[:limit]]
+
+
+city_index = CityIndex()
+
+
+@shared_state.on(CHANNEL)
+def _apply_remote(keys):
+    # Города новых рейсов других воркеров
+    city_index._apply(keys)
+
+
+def _city_filter(column, keys):
+    keys = sorted(keys)
+    return column == keys[0] if len(keys) == 1 else column.in_(keys)
+
+
+def _city_keys(db: Session, departure_city: str | None, arrival_city: str | None):
+    """
+    Ключи городов по префиксам: (вылет, прилёт), None — город не задан.
+    Если префикс не совпал ни с одним городом — возвращает None.
+    """
+    if departure_city or arrival_city:
+        city_index.ensure_loaded(db)
+    keys = []
+    for prefix in (departure_city, arrival_city):
+        matched = city_index.match(prefix) if prefix else None
+        if matched is not None and not matched:
+            return None
+        keys.append(matched)
+    return tuple(keys)
+
+
+def _filtered(query, departure_keys, arrival_keys, date):
+    if departure_keys:
+        query = query.filter(_city_filter(Flight.departure_city_key, departure_keys))
+    if arrival_keys:
+        query = query.filter(_city_filter(Flight.arrival_city_key, arrival_keys))
+    query = query.filter(Flight.is_active == True)
+    if date is not None:
+        query = query.filter(Flight.departure_date == date)
+    return query
+
+
+def search_flights(db: Session, departure_city: str | None = None, arrival_city: str | None = None, date: date_type | None = None):
+    """
+    Возвращает запрос по активным рейсам, упорядоченный по дате/времени вылета.
+    Если префикс города не совпал ни с одним городом — возвращает None
+    (результат заведомо пустой, в БД можно не ходить).
+    """
+    keys = _city_keys(db, departure_city, arrival_city)
+    if keys is None:
+        return None
+    return _filtered(db.query(Flight), *keys, date).order_by(Flight.departure_date, Flight.departure_time)
+
+
+# Порядок выдачи совпадает с индексами поиска; id делает ключ курсора уникальным
+SEARCH_ORDER = (Flight.departure_date, Flight.departure_time, Flight.id)
+# Сколько подзапросов по отдельным ключам склеивается через UNION ALL (_routes)
+MAX_MERGED_ROUTES = 32
+
+
+def _routes(departure_keys, arrival_keys):
+    """
+    Части выдачи, каждая из которых читается по индексу уже упорядоченной:
+    [(ключи вылета, ключи прилёта)]. None — хватает одного запроса (по
+    одному ключу на город) или частей слишком много.
+    """
+    pairs = len(departure_keys or ()) * len(arrival_keys or ()) or len(departure_keys or arrival_keys or ())
+    if pairs <= 1:
+        return None
+    if pairs <= MAX_MERGED_ROUTES:
+        return [
+            ({departure} if departure else None, {arrival} if arrival else None)
+            for departure in sorted(departure_keys or [None])
+            for arrival in sorted(arrival_keys or [None])
+        ]
+    # Пар много: делим по городу с меньшим числом ключей (индекс по одному
+    # городу), второй город остаётся фильтром IN
+    if arrival_keys and (not departure_keys or len(arrival_keys) < len(departure_keys)):
+        if len(arrival_keys) <= MAX_MERGED_ROUTES:
+            return [(departure_keys, {arrival}) for arrival in sorted(arrival_keys)]
+    elif len(departure_keys) <= MAX_MERGED_ROUTES:
+        return [({departure}, arrival_keys) for departure in sorted(departure_keys)]
+    return None
+
+
+def _merged_page(db: Session, routes, date, cursor, limit):
+    # Индекс упорядочивает рейсы только внутри одного ключа города, поэтому
+    # каждая пара ключей читается своим подзапросом (не больше limit + 1
+    # строк по индексу), а общий порядок наводится уже на их объединении
+    parts = [
+        _ordered(_filtered(select(Flight), departure, arrival, date), SEARCH_ORDER, cursor, False)
+        .limit(limit + 1).subquery()
+        for departure, arrival in routes
+    ]
+    merged = union_all(*(select(part) for part in parts)).subquery()
+    rows = db.execute(
+        select(aliased(Flight, merged))
+        .order_by(merged.c.departure_date, merged.c.departure_time, merged.c.id)
+        .limit(limit + 1)
+    ).scalars().all()
+    return page_of(rows, SEARCH_ORDER, limit)
+
+
+def search_flights_page(db: Session, departure_city=None, arrival_city=None, date=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    keys = _city_keys(db, departure_city, arrival_city)
+    if keys is None:
+        return [], None
+    departure_keys, arrival_keys = keys
+    routes = _routes(departure_keys, arrival_keys)
+    if routes is not None:
+        return _merged_page(db, routes, date, cursor, limit)
+    return paginate(_filtered(db.query(Flight), departure_keys, arrival_keys, date), SEARCH_ORDER, cursor, limit)
+
+
+def autocomplete(db: Session, prefix: str, limit: int = 10):
+    city_index.ensure_loaded(db)
+    return city_index.autocomplete(prefix, limit)
+
+
+def backfill_city_keys(db: Session, batch_size: int = 1000):
+    """Заполняет ключи городов у рейсов, созданных до появления этих колонок."""
+    while True:
+        rows = db.execute(
+            select(Flight.id, Flight.departure_city, Flight.arrival_city)
+            .where((Flight.departure_city_key == None) | (Flight.arrival_city_key == None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        db.execute(
+            update(Flight),
+            [
+                {
+                    "id": row.id,
+                    "departure_city_key": normalize_city(row.departure_city),
+                    "arrival_city_key": normalize_city(row.arrival_city),
+                }
+                for row in rows
+            ],
+        )
+        db.commit()
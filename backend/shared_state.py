@@ -0,0 +1,635 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from contextlib import contextmanager, suppress
+from urllib.parse import urlsplit
+
+# Общее состояние нескольких процессов (uvicorn --workers N, несколько машин).
+# Кэш поиска, граф маршрутов, индекс городов и шина событий SSE живут в
+# памяти процесса; чтобы воркеры не расходились, изменения рассылаются
+# остальным через pub/sub (broadcast/on), а каждый процесс применяет их у себя.
+# Здесь же общие счётчики (лимиты запросов), аренды для выбора лидера:
+# фоновые задачи (сборщик броней, аналитика, цены) работают на одном узле,
+# а миграции и создание админа при старте выполняются под общей блокировкой.
+# Брони мест хранятся в БД и общие сами по себе.
+#
+# Реализация выбирается SHARED_STATE_URL:
+#   memory://                      — в памяти процесса (по умолчанию, один воркер);
+#   unix:///tmp/flingt-state.sock  — локальный сервер состояния
+#   tcp://127.0.0.1:7400             (python -m backend.shared_state --listen URL);
+#   redis://host:6379/0            — Redis (pip install redis).
+# Пропущенные при обрыве связи сообщения не повторяются: кэш поиска живёт
+# недолго, а граф и индекс городов периодически перечитываются из БД.
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "memory://")
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "15"))
+STARTUP_LOCK_SECONDS = float(os.getenv("STARTUP_LOCK_SECONDS", "300"))
+PURGE_EVERY_WRITES = 1024
+RECONNECT_MAX_DELAY_SECONDS = 5
+# Ожидание ответа сервера состояния; зависший сервер не держит запросы вечно
+SHARED_STATE_TIMEOUT_SECONDS = float(os.getenv("SHARED_STATE_TIMEOUT_SECONDS", "5"))
+# Очередь сообщений подписчика на сервере; отставшего подписчика сервер отключает
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SHARED_STATE_SUBSCRIBER_QUEUE", "10000"))
+
+
+class SharedState:
+    """
+    Интерфейс хранилища. Значения — то, что сериализуется в JSON; ttl — в секундах.
+      get(key), set(key, value, ttl=None), delete(key)
+      incr(key, amount=1, ttl=None) -> новое значение; ttl ставится при создании ключа
+      acquire(name, owner, ttl) -> bool — взять или продлить аренду
+      release(name, owner) -> bool
+      publish(channel, message), subscribe(channel, callback)
+      start(), stop() — фоновые соединения (подписки регистрируются до start)
+    """
+
+    shared = True
+
+    def __init__(self):
+        self._handlers = {}
+
+    def subscribe(self, channel: str, callback):
+        self._handlers.setdefault(channel, []).append(callback)
+
+    def _dispatch(self, channel, message):
+        # Копия списка: на сервере подписчики отключаются из других потоков
+        for callback in tuple(self._handlers.get(channel, ())):
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Shared state handler for %s failed", channel)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class LocalState(SharedState):
+    """Состояние в памяти процесса; им же пользуется сервер состояния."""
+
+    shared = False
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._values = {}  # ключ -> (значение, момент истечения или None)
+        self._writes = 0
+
+    def _alive(self, key, now):
+        item = self._values.get(key)
+        if item is not None and item[1] is not None and item[1] <= now:
+            del self._values[key]
+            return None
+        return item
+
+    def _store(self, key, value, expires):
+        self._values[key] = (value, expires)
+        self._writes += 1
+        if self._writes % PURGE_EVERY_WRITES == 0:
+            now = time.monotonic()
+            for stale in [k for k, (_, e) in self._values.items() if e is not None and e <= now]:
+                del self._values[stale]
+
+    def get(self, key):
+        with self._lock:
+            item = self._alive(key, time.monotonic())
+        return None if item is None else item[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, time.monotonic() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = time.monotonic()
+            item = self._alive(key, now)
+            if item is None:
+                value, expires = amount, (now + ttl if ttl else None)
+            else:
+                value, expires = item[0] + amount, item[1]
+            self._store(key, value, expires)
+            return value
+
+    def acquire(self, name, owner, ttl):
+        with self._lock:
+            now = time.monotonic()
+            item = self._alive(name, now)
+            if item is not None and item[0] != owner:
+                return False
+            self._store(name, owner, now + ttl)
+            return True
+
+    def release(self, name, owner):
+        with self._lock:
+            item = self._alive(name, time.monotonic())
+            if item is None or item[0] != owner:
+                return False
+            del self._values[name]
+            return True
+
+    def publish(self, channel, message):
+        self._dispatch(channel, message)
+
+    def unsubscribe(self, channel, callback):
+        callbacks = self._handlers.get(channel, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+
+# Сервер состояния: LocalState за сокетом, протокол — строки JSON.
+# Запрос {"op": "incr", "args": [...]} -> {"result": ...} или {"error": "..."};
+# {"op": "subscribe", "args": [[каналы]]} превращает соединение в поток
+# {"channel": ..., "message": ...}.
+
+_OPERATIONS = {"get", "set", "delete", "incr", "acquire", "release", "publish"}
+
+
+def _address(url: str):
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        return socket.AF_UNIX, parts.path
+    if parts.scheme == "tcp":
+        return socket.AF_INET, (parts.hostname or "127.0.0.1", parts.port or 7400)
+    raise ValueError(f"Unsupported shared state socket URL: {url}")
+
+
+class _StateRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        state = self.server.state
+        write_lock = threading.Lock()
+        subscriptions = []
+        # Сообщения подписчику пишет свой поток из ограниченной очереди:
+        # медленный подписчик не задерживает публикующих (и весь LocalState)
+        outbox = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        writer = None
+        dropped = threading.Event()
+
+        def send(payload):
+            data = json.dumps(payload, separators=(",", ":")).encode() + b"\n"
+            with write_lock:
+                self.wfile.write(data)
+                self.wfile.flush()
+
+        def disconnect():
+            # Цикл чтения ниже завершится, подписки снимутся в finally
+            with suppress(OSError):
+                self.connection.shutdown(socket.SHUT_RDWR)
+
+        def write_messages():
+            while True:
+                payload = outbox.get()
+                if payload is None:
+                    return
+                try:
+                    send(payload)
+                except OSError:
+                    disconnect()
+                    return
+
+        def forward(channel):
+            def callback(message):
+                try:
+                    outbox.put_nowait({"channel": channel, "message": message})
+                except queue.Full:
+                    if not dropped.is_set():
+                        dropped.set()
+                        logger.warning("Shared state subscriber fell behind, disconnecting")
+                        disconnect()
+            return callback
+
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                    op, args = request["op"], request.get("args", [])
+                    if op == "subscribe":
+                        if writer is None:
+                            writer = threading.Thread(target=write_messages, name="shared-state-writer", daemon=True)
+                            writer.start()
+                        for channel in args[0]:
+                            callback = forward(channel)
+                            state.subscribe(channel, callback)
+                            subscriptions.append((channel, callback))
+                        result = True
+                    elif op in _OPERATIONS:
+                        result = getattr(state, op)(*args)
+                    else:
+                        raise ValueError(f"Unknown operation {op!r}")
+                    send({"result": result})
+                except (ValueError, KeyError, TypeError) as exc:
+                    send({"error": str(exc)})
+        except OSError:
+            pass
+        finally:
+            for channel, callback in subscriptions:
+                state.unsubscribe(channel, callback)
+            if writer is not None:
+                # Пишущий поток остановится на закрытом сокете или на None
+                # (если очередь полна, он не ждёт в get)
+                disconnect()
+                with suppress(queue.Full):
+                    outbox.put_nowait(None)
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(url: str):
+    family, address = _address(url)
+    if family == socket.AF_UNIX:
+        with suppress(FileNotFoundError):
+            os.unlink(address)
+        server = _ThreadingUnixServer(address, _StateRequestHandler)
+    else:
+        server = _ThreadingTCPServer(address, _StateRequestHandler)
+    server.state = LocalState()
+    return server
+
+
+class SocketState(SharedState):
+    """Клиент сервера состояния (make_server); для тестов и одной машины."""
+
+    def __init__(self, url: str):
+        super().__init__()
+        self._family, self._address = _address(url)
+        self._lock = threading.Lock()
+        self._socket = None
+        self._file = None
+        self._stopped = threading.Event()
+        self._listener = None
+        self._listener_socket = None
+
+    def _connect(self):
+        sock = socket.socket(self._family, socket.SOCK_STREAM)
+        sock.settimeout(SHARED_STATE_TIMEOUT_SECONDS)
+        try:
+            sock.connect(self._address)
+        except OSError:
+            sock.close()
+            raise
+        if self._family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, sock.makefile("rwb")
+
+    def _close(self):
+        if self._file is not None:
+            with suppress(OSError):
+                self._file.close()
+            with suppress(OSError):
+                self._socket.close()
+            self._file = None
+
+    def _call(self, op, *args):
+        request = json.dumps({"op": op, "args": args}, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            # Один повтор: соединение могло закрыться, пока простаивало
+            for attempt in (0, 1):
+                try:
+                    if self._file is None:
+                        self._socket, self._file = self._connect()
+                    self._file.write(request)
+                    self._file.flush()
+                    line = self._file.readline()
+                    if not line:
+                        raise ConnectionError("shared state server closed the connection")
+                    break
+                except OSError:
+                    self._close()
+                    if attempt:
+                        raise
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["result"]
+
+    def get(self, key):
+        return self._call("get", key)
+
+    def set(self, key, value, ttl=None):
+        self._call("set", key, value, ttl)
+
+    def delete(self, key):
+        self._call("delete", key)
+
+    def incr(self, key, amount=1, ttl=None):
+        return self._call("incr", key, amount, ttl)
+
+    def acquire(self, name, owner, ttl):
+        return self._call("acquire", name, owner, ttl)
+
+    def release(self, name, owner):
+        return self._call("release", name, owner)
+
+    def publish(self, channel, message):
+        self._call("publish", channel, message)
+
+    def start(self):
+        if self._handlers and self._listener is None:
+            self._stopped.clear()
+            self._listener = threading.Thread(target=self._listen, name="shared-state-listener", daemon=True)
+            self._listener.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._listener_socket is not None:
+            with suppress(OSError):
+                self._listener_socket.shutdown(socket.SHUT_RDWR)
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+        with self._lock:
+            self._close()
+
+    def _listen(self):
+        delay = 0.1
+        while not self._stopped.is_set():
+            try:
+                sock, stream = self._connect()
+            except OSError:
+                logger.warning("Shared state server is unavailable, retrying in %.1fs", delay)
+            else:
+                self._listener_socket = sock
+                try:
+                    # Подписка ждёт сообщений сколько угодно; таймаут — только на подключение
+                    sock.settimeout(None)
+                    stream.write(json.dumps({"op": "subscribe", "args": [sorted(self._handlers)]}).encode() + b"\n")
+                    stream.flush()
+                    delay = 0.1
+                    for line in stream:
+                        message = json.loads(line)
+                        if "channel" in message:
+                            self._dispatch(message["channel"], message["message"])
+                except (OSError, ValueError):
+                    pass
+                finally:
+                    with suppress(OSError):
+                        stream.close()
+                    with suppress(OSError):
+                        sock.close()
+                    self._listener_socket = None
+                if not self._stopped.is_set():
+                    logger.warning("Lost shared state subscription, reconnecting")
+            self._stopped.wait(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY_SECONDS)
+
+
+_REDIS_ACQUIRE = """
+local owner = redis.call('GET', KEYS[1])
+if owner == false or owner == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+_REDIS_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_REDIS_INCR = """
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value == tonumber(ARGV[1]) and tonumber(ARGV[2]) > 0 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return value
+"""
+
+
+def _ms(ttl):
+    return int(ttl * 1000) if ttl else 0
+
+
+class RedisState(SharedState):
+    """Redis: для нескольких машин."""
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis  # необязательная зависимость: нужна только при redis://
+
+        self._redis = redis.Redis.from_url(url)
+        self._acquire = self._redis.register_script(_REDIS_ACQUIRE)
+        self._release = self._redis.register_script(_REDIS_RELEASE)
+        self._incr = self._redis.register_script(_REDIS_INCR)
+        self._pubsub = None
+        self._thread = None
+
+    def get(self, key):
+        raw = self._redis.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(key, json.dumps(value), px=_ms(ttl) or None)
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+    def incr(self, key, amount=1, ttl=None):
+        return int(self._incr(keys=[key], args=[amount, _ms(ttl)]))
+
+    def acquire(self, name, owner, ttl):
+        return bool(self._acquire(keys=[name], args=[owner, _ms(ttl)]))
+
+    def release(self, name, owner):
+        return bool(self._release(keys=[name], args=[owner]))
+
+    def publish(self, channel, message):
+        self._redis.publish(channel, json.dumps(message, separators=(",", ":")))
+
+    def _on_message(self, message):
+        channel = message["channel"]
+        self._dispatch(channel.decode() if isinstance(channel, bytes) else channel, json.loads(message["data"]))
+
+    def start(self):
+        if self._handlers and self._thread is None:
+            self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{channel: self._on_message for channel in self._handlers})
+            self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._pubsub.close()
+            self._thread = None
+
+
+def open_state(url: str):
+    scheme = urlsplit(url).scheme
+    if scheme in ("", "memory"):
+        return LocalState()
+    if scheme in ("unix", "tcp"):
+        return SocketState(url)
+    if scheme in ("redis", "rediss"):
+        return RedisState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+state = open_state(SHARED_STATE_URL)
+
+_node = None
+
+
+def node_id():
+    """Имя процесса для аренд и рассылок (заново после fork)."""
+    global _node
+    if _node is None or _node[0] != os.getpid():
+        _node = (os.getpid(), f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}")
+    return _node[1]
+
+
+# Рассылка изменений другим процессам
+
+_outbox = None
+_sender = None
+
+
+def broadcast(channel: str, message):
+    """
+    Отправляет message (JSON) остальным процессам; себе сообщение не
+    возвращается. При memory:// ничего не делает. После start() отправка
+    идёт из отдельного потока и не задерживает запрос.
+    """
+    if not state.shared:
+        return
+    envelope = {"origin": node_id(), "message": message}
+    if _outbox is not None:
+        _outbox.put((channel, envelope))
+    else:
+        _send(channel, envelope)
+
+
+def _send(channel, envelope):
+    try:
+        state.publish(channel, envelope)
+    except Exception:
+        logger.warning("Broadcast to %s failed", channel, exc_info=True)
+
+
+def _drain():
+    while True:
+        item = _outbox.get()
+        if item is None:
+            return
+        _send(*item)
+
+
+def on(channel: str):
+    """Декоратор: обработчик сообщений broadcast(channel, ...) от других процессов."""
+    def register(handler):
+        def receive(envelope):
+            if envelope.get("origin") != node_id():
+                handler(envelope["message"])
+        state.subscribe(channel, receive)
+        return handler
+    return register
+
+
+def start():
+    """Подписки и поток рассылки; вызывается из lifespan в main.py."""
+    global _outbox, _sender
+    state.start()
+    if state.shared and _sender is None:
+        _outbox = queue.SimpleQueue()
+        _sender = threading.Thread(target=_drain, name="shared-state-sender", daemon=True)
+        _sender.start()
+
+
+def stop():
+    global _outbox, _sender
+    if _sender is not None:
+        _outbox.put(None)
+        _sender.join(timeout=5)
+        _outbox, _sender = None, None
+    state.stop()
+
+
+# Выбор лидера
+
+@contextmanager
+def startup_lock(name: str = "startup", timeout: float = STARTUP_LOCK_SECONDS):
+    """
+    Блокировка на время действий, которые при старте должен сделать один
+    процесс (миграции, создание админа); остальные ждут и затем видят
+    уже готовую схему. Аренда на timeout секунд — на случай падения.
+    """
+    lease = f"lock:{name}"
+    deadline = time.monotonic() + timeout
+    while not state.acquire(lease, node_id(), timeout):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Could not acquire the {name} lock in {timeout}s")
+        time.sleep(0.1)
+    try:
+        yield
+    finally:
+        with suppress(Exception):
+            state.release(lease, node_id())
+
+
+async def run_as_leader(name: str, factory, lease: float = LEADER_LEASE_SECONDS):
+    """
+    Фоновая задача factory() (корутина), которая должна работать на одном
+    процессе из всех. Аренда продлевается каждые lease/3 секунд; если её
+    не удалось продлить, задача останавливается, и её подхватит другой процесс.
+    """
+    key = f"leader:{name}"
+    task = None
+    try:
+        while True:
+            try:
+                leader = await asyncio.to_thread(state.acquire, key, node_id(), lease)
+            except Exception:
+                logger.warning("Could not renew the %s lease", name, exc_info=True)
+                leader = False
+            if leader and task is None:
+                logger.info("%s is now the leader for %s", node_id(), name)
+                task = asyncio.create_task(factory())
+            elif not leader and task is not None:
+                logger.info("%s lost the leadership for %s", node_id(), name)
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+                task = None
+            await asyncio.sleep(lease / 3)
+    finally:
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+            with suppress(Exception):
+                await asyncio.to_thread(state.release, key, node_id())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Сервер общего состояния для нескольких воркеров")
+    parser.add_argument("--listen", default="unix:///tmp/flingt-state.sock", help="unix:///путь или tcp://host:port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with make_server(args.listen) as server:
+        print(f"Shared state server listening on {args.listen}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
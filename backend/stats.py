@@ -0,0 +1,141 @@
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import events
+from .inventory import _supports_returning
+from .models import Company, CompanyStats, Flight, FlightArchive, Ticket, TicketArchive, TicketStatus
+
+# Статистика компаний.
+# crud вызывает apply_delta в той же транзакции, что и само изменение
+# (создание/удаление рейса, смена статуса, покупка/возврат билета),
+# поэтому /company/stats читает одну строку вместо всех рейсов компании.
+# Новые значения счётчиков уходят подписчикам (events) после коммита.
+# Строка статистики создаётся вместе с компанией (crud.create_company),
+# поэтому параллельные записи только прибавляют к ней, не пересоздавая её.
+# rebuild_company_stats пересчитывает таблицу с нуля — это задача сверки:
+#     python -m backend.stats
+# Перенос рейсов в архив (archive.py) счётчики не меняет, поэтому сверка
+# считает и горячие, и архивные таблицы.
+
+STATS_FIELDS = ("total_flights", "active_flights", "total_seats", "available_seats", "total_revenue")
+# (рейсы, билеты): горячие таблицы и архив
+SOURCES = ((Flight, Ticket), (FlightArchive, TicketArchive))
+
+
+def _flight_totals(company_id: int | None, flight=Flight):
+    query = select(
+        flight.company_id,
+        func.count(flight.id).label("total_flights"),
+        func.coalesce(func.sum(case((flight.is_active == True, 1), else_=0)), 0).label("active_flights"),
+        func.coalesce(func.sum(flight.total_seats), 0).label("total_seats"),
+        func.coalesce(func.sum(flight.available_seats), 0).label("available_seats"),
+    ).group_by(flight.company_id)
+    if company_id is not None:
+        query = query.where(flight.company_id == company_id)
+    return query
+
+
+def _revenue_totals(company_id: int | None, flight=Flight, ticket=Ticket):
+    query = (
+        select(flight.company_id, func.coalesce(func.sum(ticket.price), 0.0).label("total_revenue"))
+        .join(flight, flight.id == ticket.flight_id)
+        .where(ticket.status == TicketStatus.active)
+        .group_by(flight.company_id)
+    )
+    if company_id is not None:
+        query = query.where(flight.company_id == company_id)
+    return query
+
+
+def rebuild_company_stats(db: Session, company_id: int | None = None, sources=SOURCES):
+    """Пересчитывает статистику одной компании (или всех) агрегатными запросами."""
+    companies = [company_id] if company_id is not None else db.execute(select(Company.id)).scalars().all()
+    # Строка есть у каждой компании, в том числе без рейсов
+    rows = {
+        key: {"company_id": key, **{f: 0 for f in STATS_FIELDS}, "total_revenue": 0.0}
+        for key in companies
+    }
+    for flight, ticket in sources:
+        for row in db.execute(_flight_totals(company_id, flight)):
+            totals = rows.setdefault(row.company_id, {
+                "company_id": row.company_id, **{f: 0 for f in STATS_FIELDS}, "total_revenue": 0.0,
+            })
+            for field in ("total_flights", "active_flights", "total_seats", "available_seats"):
+                totals[field] += getattr(row, field)
+    for flight, ticket in sources:
+        for row in db.execute(_revenue_totals(company_id, flight, ticket)):
+            if row.company_id in rows:
+                rows[row.company_id]["total_revenue"] += float(row.total_revenue)
+
+    stmt = delete(CompanyStats)
+    if company_id is not None:
+        stmt = stmt.where(CompanyStats.company_id == company_id)
+    db.execute(stmt)
+    if rows:
+        db.execute(insert(CompanyStats), list(rows.values()))
+    return rows
+
+
+def create_stats_row(db: Session, company_id: int):
+    """
+    Нулевая строка статистики; если строка уже есть (в том числе вставлена
+    параллельной транзакцией), ничего не делает.
+    """
+    values = {"company_id": company_id, **{f: 0 for f in STATS_FIELDS}, "total_revenue": 0.0}
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    db.execute(dialect_insert(CompanyStats).values(**values).on_conflict_do_nothing(index_elements=["company_id"]))
+
+
+def _add(db: Session, company_id: int, values):
+    stmt = (
+        update(CompanyStats)
+        .where(CompanyStats.company_id == company_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    columns = [getattr(CompanyStats, name) for name in STATS_FIELDS]
+    if _supports_returning(db):
+        return db.execute(stmt.returning(*columns)).first()
+    if db.execute(stmt).rowcount == 1:
+        return db.execute(select(*columns).where(CompanyStats.company_id == company_id)).first()
+    return None
+
+
+def apply_delta(db: Session, company_id: int, **deltas):
+    """Атомарно прибавляет deltas к счётчикам компании (col = col + delta)."""
+    values = {name: getattr(CompanyStats, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    row = _add(db, company_id, values)
+    if row is None:
+        # Компания создана в обход crud.create_company (например, в бенчмарках)
+        create_stats_row(db, company_id)
+        row = _add(db, company_id, values)
+    events.stage(db, events.company_topic(company_id), **row._asdict())
+
+
+def get_company_stats(db: Session, company_id: int):
+    row = db.get(CompanyStats, company_id, populate_existing=True)
+    if row is None:
+        rebuild_company_stats(db, company_id)
+        db.commit()
+        row = db.get(CompanyStats, company_id, populate_existing=True)
+    return {name: getattr(row, name) for name in STATS_FIELDS}
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal, engine
+    from .migrations import migrate
+
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        rebuilt = rebuild_company_stats(db)
+        db.commit()
+        print(f"Пересчитана статистика {len(rebuilt)} компаний")
+    finally:
+        db.close()
@@ -0,0 +1,162 @@
+"""
+Горячие запросы до и после переноса улетевших рейсов в архив.
+
+    python -m benchmarks.archive --past-flights 200000 --future-flights 20000 --tickets-per-flight 3
+
+База заполняется рейсами за прошедший год (--past-flights) и на два месяца
+вперёд (--future-flights), на каждом — --tickets-per-flight билетов; часть
+билетов принадлежит одному «частому» пользователю. Замеряются медианы
+(--rounds повторов) запросов, которые видят клиенты и менеджеры: общий
+список /flights без даты, поиск на дату, «мои билеты», рейсы компании и их
+число, пассажиры рейса. Затем archive.archive_departed переносит всё
+улетевшее (время и скорость печатаются), и те же запросы повторяются;
+для архива отдельно — пассажиры архивного рейса и ?archived=true.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from .common import temp_database
+
+CITIES = ["Almaty", "Astana", "Shymkent", "Aktobe", "Karaganda", "Atyrau", "Pavlodar", "Oral"]
+
+
+def seed(SessionLocal, past_flights, future_flights, tickets_per_flight, seed_value=42):
+    from backend.models import Company, Flight, Ticket, TicketStatus, User, UserRole
+    from backend.search import normalize_city
+
+    rnd = random.Random(seed_value)
+    db = SessionLocal()
+    company = Company(name="Bench Air")
+    db.add(company)
+    db.flush()
+    company_id = company.id
+    db.execute(insert(User), [
+        {"email": f"bench{i}@example.com", "hashed_password": "x", "role": UserRole.regular, "is_active": True}
+        for i in range(1000)
+    ])
+    db.commit()
+    user_ids = db.execute(select(User.id).order_by(User.id)).scalars().all()
+    today = date.today()
+    # Рейсы идут в порядке дат, как их и создают: прошлые получают меньшие id
+    days = sorted(
+        [-rnd.randrange(1, 365) for _ in range(past_flights)] + [rnd.randrange(0, 60) for _ in range(future_flights)]
+    )
+    for start in range(0, len(days), 20_000):
+        flights, tickets = [], []
+        for offset in days[start:start + 20_000]:
+            day = today + timedelta(days=offset)
+            origin, destination = rnd.sample(CITIES, 2)
+            flights.append({
+                "company_id": company_id, "flight_number": f"BA-{len(flights)}",
+                "departure_city": origin, "arrival_city": destination,
+                "departure_city_key": normalize_city(origin), "arrival_city_key": normalize_city(destination),
+                "departure_date": day, "departure_time": dtime(rnd.randrange(24), rnd.choice((0, 30))),
+                "arrival_date": day, "arrival_time": dtime(23, 59),
+                "total_seats": 180, "available_seats": 180 - tickets_per_flight,
+                "price": 100.0, "current_price": 100.0, "is_active": True,
+                "created_at": datetime.combine(day, dtime()) - timedelta(days=30),
+            })
+        ids = db.execute(insert(Flight).returning(Flight.id), flights).scalars().all()
+        for flight_id, flight in zip(ids, flights):
+            for _ in range(tickets_per_flight):
+                tickets.append({
+                    "user_id": user_ids[0] if rnd.random() < 0.01 else rnd.choice(user_ids),
+                    "flight_id": flight_id, "price": 100.0,
+                    "status": TicketStatus.refunded if rnd.random() < 0.1 else TicketStatus.active,
+                    "created_at": flight["created_at"] + timedelta(minutes=rnd.randrange(40000)),
+                })
+        db.execute(insert(Ticket), tickets)
+        db.commit()
+    future = db.scalar(select(Flight.id).where(Flight.departure_date >= today).order_by(Flight.id.desc()).limit(1))
+    past = db.scalar(select(Flight.id).where(Flight.departure_date < today - timedelta(days=60)).limit(1))
+    db.close()
+    return company_id, user_ids[0], future, past
+
+
+def median_ms(SessionLocal, rounds, func):
+    db = SessionLocal()
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func(db)
+        samples.append(time.perf_counter() - started)
+        db.rollback()
+    db.close()
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def hot_queries(company_id, user_id, flight_id):
+    from backend import crud, search
+
+    day = date.today() + timedelta(days=10)
+    return {
+        "list_flights": lambda db: search.search_flights_page(db),
+        "search_date": lambda db: search.search_flights_page(db, "alm", "ast", day),
+        "my_tickets": lambda db: crud.get_user_tickets(db, user_id),
+        "company_flights": lambda db: crud.get_company_flights(db, company_id),
+        "company_count": lambda db: crud.get_company_flights_count(db, company_id),
+        "passengers": lambda db: crud.get_flight_passengers(db, flight_id, company_id),
+    }
+
+
+def sizes(SessionLocal):
+    from backend.models import Flight, FlightArchive, Ticket, TicketArchive
+
+    db = SessionLocal()
+    result = {model.__tablename__: db.scalar(select(func.count()).select_from(model))
+              for model in (Flight, Ticket, FlightArchive, TicketArchive)}
+    db.close()
+    return result
+
+
+def run(args):
+    from backend import archive, crud
+
+    engine, SessionLocal, _ = temp_database("archive")
+    started = time.perf_counter()
+    company_id, user_id, future, past = seed(SessionLocal, args.past_flights, args.future_flights, args.tickets_per_flight)
+    print(f"seeded {args.past_flights + args.future_flights} flights in {time.perf_counter() - started:.1f}s")
+    print("before: " + "  ".join(f"{key}={value}" for key, value in sizes(SessionLocal).items()))
+    queries = hot_queries(company_id, user_id, future)
+    before = {name: median_ms(SessionLocal, args.rounds, query) for name, query in queries.items()}
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    moved = archive.archive_departed(db, after_days=args.after_days, batch_size=args.batch)
+    elapsed = time.perf_counter() - started
+    db.close()
+    print(f"archive: flights={moved['flights']}  tickets={moved['tickets']}  seconds={elapsed:.1f}  "
+          f"flights_per_s={round(moved['flights'] / elapsed) if elapsed else 0}")
+    print(" after: " + "  ".join(f"{key}={value}" for key, value in sizes(SessionLocal).items()))
+
+    after = {name: median_ms(SessionLocal, args.rounds, query) for name, query in queries.items()}
+    for name in queries:
+        print(f"{name:>16}: before_ms={before[name]}  after_ms={after[name]}")
+    history = {
+        "archived_passengers": lambda db: crud.get_flight_passengers(db, past, company_id),
+        "archived_flights": lambda db: crud.get_company_flights(db, company_id, archived=True),
+        "archived_tickets": lambda db: crud.get_user_tickets(db, user_id, archived=True),
+    }
+    for name, query in history.items():
+        print(f"{name:>16}: ms={median_ms(SessionLocal, args.rounds, query)}")
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--past-flights", type=int, default=200_000)
+    parser.add_argument("--future-flights", type=int, default=20_000)
+    parser.add_argument("--tickets-per-flight", type=int, default=3)
+    parser.add_argument("--after-days", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Сравнение синхронного и асинхронного пути к БД под конкурентной нагрузкой.
+
+    python -m benchmarks.async_path --requests 2000 --concurrency 200
+
+sync  — как прежние роутеры на def: синхронная Session в пуле потоков
+        FastAPI (anyio, по умолчанию 40 потоков);
+async — роутеры на async def: AsyncSession и функции async_crud.
+Каждый «запрос» — поиск рейсов по маршруту и страница билетов пользователя.
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, time as dtime, timedelta
+
+import anyio
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend import async_crud, crud, search
+from backend.database import build_async_engine
+from backend.models import Company, Flight, Ticket, TicketStatus, User, UserRole
+
+from .common import percentile, temp_database
+
+CITIES = ["Almaty", "Astana", "Shymkent", "Aktobe", "Atyrau", "Oral", "Kostanay", "Pavlodar"]
+THREADPOOL_SIZE = 40  # размер пула потоков anyio по умолчанию
+
+
+def seed(SessionLocal, flights, users, tickets_per_user):
+    db = SessionLocal()
+    company = Company(name="Bench Air")
+    db.add(company)
+    db.flush()
+    start = date(2099, 1, 1)
+    db.add_all([
+        Flight(
+            company_id=company.id, flight_number=f"BA-{i}",
+            departure_city=CITIES[i % len(CITIES)], arrival_city=CITIES[(i + 1) % len(CITIES)],
+            departure_city_key=search.normalize_city(CITIES[i % len(CITIES)]),
+            arrival_city_key=search.normalize_city(CITIES[(i + 1) % len(CITIES)]),
+            departure_date=start + timedelta(days=i % 30), departure_time=dtime(i % 24, 0),
+            arrival_date=start + timedelta(days=i % 30), arrival_time=dtime(i % 24, 30),
+            total_seats=100, available_seats=100, price=100.0 + i % 50,
+        )
+        for i in range(flights)
+    ])
+    db.add_all([User(email=f"bench{i}@example.com", hashed_password="x", role=UserRole.regular) for i in range(users)])
+    db.flush()
+    user_ids = [row.id for row in db.query(User.id)]
+    flight_ids = [row.id for row in db.query(Flight.id)]
+    db.add_all([
+        Ticket(user_id=user_id, flight_id=flight_ids[(user_id * 7 + k) % len(flight_ids)], price=100.0, status=TicketStatus.active)
+        for user_id in user_ids for k in range(tickets_per_user)
+    ])
+    db.commit()
+    db.close()
+    return user_ids
+
+
+def sync_request(SessionLocal, user_id, i):
+    db = SessionLocal()
+    try:
+        search.search_flights_page(db, CITIES[i % len(CITIES)], CITIES[(i + 1) % len(CITIES)], limit=20)
+        crud.get_user_tickets(db, user_id, limit=20)
+    finally:
+        db.close()
+
+
+async def async_request(AsyncSessionLocal, user_id, i):
+    async with AsyncSessionLocal() as db:
+        await async_crud.search_flights(db, CITIES[i % len(CITIES)], CITIES[(i + 1) % len(CITIES)], limit=20)
+        await async_crud.get_user_tickets(db, user_id, limit=20)
+
+
+async def drive(make_call, total, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await make_call(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - started, latencies
+
+
+def report(mode, total, elapsed, latencies):
+    return {
+        "mode": mode,
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run(total, concurrency, flights, users):
+    engine, SessionLocal, path = temp_database("async_path")
+    user_ids = seed(SessionLocal, flights, users, tickets_per_user=20)
+    async_engine = build_async_engine(f"sqlite:///{path}", pool_size=concurrency, max_overflow=0)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    limiter = anyio.CapacityLimiter(THREADPOOL_SIZE)
+
+    async def sync_call(i):
+        await anyio.to_thread.run_sync(sync_request, SessionLocal, user_ids[i % len(user_ids)], i, limiter=limiter)
+
+    async def async_call(i):
+        await async_request(AsyncSessionLocal, user_ids[i % len(user_ids)], i)
+
+    results = []
+    for mode, call in (("sync", sync_call), ("async", async_call)):
+        await drive(call, min(total, 100), concurrency)  # прогрев пулов и кэшей
+        elapsed, latencies = await drive(call, total, concurrency)
+        results.append(report(mode, total, elapsed, latencies))
+    await async_engine.dispose()
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--flights", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+    for result in asyncio.run(run(args.requests, args.concurrency, args.flights, args.users)):
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Общие помощники для бенчмарков: временная БД и перцентили."""
+import os
+import tempfile
+
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import Base, build_engine
+from backend import models  # noqa: F401  регистрирует таблицы в Base.metadata
+
+
+def temp_database(name="bench"):
+    """Создаёт SQLite-файл во временной папке и возвращает (engine, SessionLocal, path)."""
+    path = os.path.join(tempfile.mkdtemp(prefix="flingt-"), f"{name}.db")
+    engine = build_engine(f"sqlite:///{path}", pool_size=64, max_overflow=64)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine), path
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,131 @@
+"""
+Синтетический набор данных для нагрузочных тестов, загружаемый через crud.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.dataset --flights 1000000 --users 5000
+
+Компании и менеджеры — crud.create_manager, рейсы — массовый импорт
+расписания (crud.import_flight_schedule, регулярные рейсы на --days дней),
+пользователи — crud.create_user, билеты — групповая покупка crud.create_tickets.
+Пароль у всех учёток один (PASSWORD), хэш считается один раз.
+Генерация детерминирована (--seed), поэтому набор воспроизводим.
+"""
+import argparse
+import io
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from fastapi import HTTPException
+
+from backend import crud, hashing, schemas
+from backend.models import Flight, User, UserRole
+
+PASSWORD = "bench-password"
+CITIES = [
+    "Almaty", "Astana", "Shymkent", "Aktobe", "Atyrau", "Oral", "Kostanay", "Pavlodar",
+    "Karaganda", "Taraz", "Semey", "Turkistan", "Kyzylorda", "Aktau", "Petropavl", "Oskemen",
+    "Tashkent", "Bishkek", "Moscow", "Istanbul", "Dubai", "Frankfurt", "London", "Paris",
+    "New York", "Seoul", "Beijing", "Delhi", "Baku", "Tbilisi", "Antalya", "Bangkok",
+]
+IMPORT_CHUNK = 50_000  # рейсов на один вызов импорта (предел импорта — 100 000)
+
+
+def manager_email(company: int):
+    return f"manager{company}@bench.example"
+
+
+def user_email(user: int):
+    return f"user{user}@bench.example"
+
+
+def _schedule_lines(rnd, count, days, start):
+    # Одна строка — регулярный рейс на days дней подряд
+    for i in range(count):
+        origin, destination = rnd.sample(CITIES, 2)
+        hour, minute = rnd.randrange(24), rnd.choice((0, 15, 30, 45))
+        duration = rnd.randrange(60, 10 * 60, 5)
+        arrival_offset, arrival_minutes = divmod(hour * 60 + minute + duration, 24 * 60)
+        yield json.dumps({
+            "flight_number": f"BN-{i}",
+            "departure_city": origin,
+            "arrival_city": destination,
+            "departure_date": start.isoformat(),
+            "departure_time": f"{hour:02d}:{minute:02d}",
+            "arrival_date": (start + timedelta(days=arrival_offset)).isoformat(),
+            "arrival_time": f"{arrival_minutes // 60:02d}:{arrival_minutes % 60:02d}",
+            "total_seats": rnd.choice((50, 120, 180, 300)),
+            "price": rnd.randrange(30, 900),
+            "repeat_until": (start + timedelta(days=days - 1)).isoformat(),
+        })
+
+
+def seed(SessionLocal, companies=20, flights=100_000, users=1000, tickets_per_user=5, days=60, seed_value=42):
+    rnd = random.Random(seed_value)
+    hashed = hashing.hash_sync(PASSWORD)
+    start = date.today() + timedelta(days=2)
+    report = {}
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        company_ids = []
+        for company in range(companies):
+            manager = crud.create_manager(
+                db, schemas.ManagerCreate(company_name=f"Bench Air {company}", email=manager_email(company), password=PASSWORD),
+                hashed_password=hashed,
+            )
+            company_ids.append(manager.company_id)
+
+        rows = max(1, flights // days)
+        lines = list(_schedule_lines(rnd, rows, days, start))
+        per_chunk = max(1, IMPORT_CHUNK // days)
+        for i in range(0, len(lines), per_chunk):
+            chunk = "\n".join(lines[i:i + per_chunk]).encode()
+            crud.import_flight_schedule(db, io.BytesIO(chunk), "ndjson", company_ids[(i // per_chunk) % len(company_ids)])
+        report["flights"] = db.query(Flight).count()
+        report["flights_sec"] = round(time.perf_counter() - started, 1)
+
+        started = time.perf_counter()
+        for user in range(users):
+            crud.create_user(db, schemas.UserCreate(email=user_email(user), password=PASSWORD), hashed_password=hashed)
+        report["users"] = users
+        report["users_sec"] = round(time.perf_counter() - started, 1)
+
+        started = time.perf_counter()
+        max_id = db.query(Flight.id).order_by(Flight.id.desc()).limit(1).scalar() or 0
+        user_ids = [row.id for row in db.query(User.id).filter(User.role == UserRole.regular)]
+        booked = 0
+        for user_id in user_ids:
+            items = [schemas.TicketBatchItem(flight_id=rnd.randint(1, max_id)) for _ in range(tickets_per_user)]
+            try:
+                booked += len(crud.create_tickets(db, user_id, items))
+            except HTTPException:
+                pass  # случайный рейс мог оказаться распроданным — create_tickets уже откатил покупку
+        report["tickets"] = booked
+        report["tickets_sec"] = round(time.perf_counter() - started, 1)
+    finally:
+        db.close()
+    return report
+
+
+def main():
+    from backend import migrations
+    from backend.database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--flights", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tickets-per-user", type=int, default=5)
+    parser.add_argument("--days", type=int, default=60, help="на сколько дней вперёд разворачивать расписание")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    migrations.migrate(engine)
+    report = seed(SessionLocal, args.companies, args.flights, args.users, args.tickets_per_user, args.days, args.seed)
+    for key, value in report.items():
+        print(f"{key:>14}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Пропускная способность покупок: коммит на каждый запрос против группового коммита.
+
+    python -m benchmarks.group_commit --bookings 3000 --concurrency 200 --synchronous FULL
+
+direct — как обычно: у каждой покупки своя AsyncSession и свой коммит
+         (crud.create_ticket через run_sync);
+group  — покупки идут в очередь group_commit.GroupCommitWriter, один
+         писатель коммитит их пачками.
+--synchronous FULL делает fsync на каждый коммит (как без WAL/NORMAL) —
+там разница заметнее всего. Проверяется, что каждый вызывающий получил свой
+билет и мест продано ровно столько, сколько было.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import date, time as dtime
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .common import percentile
+
+
+def seed(SessionLocal, flights, seats):
+    from backend.models import Company, Flight, User, UserRole
+
+    db = SessionLocal()
+    company = Company(name="Bench Air")
+    db.add(company)
+    db.flush()
+    db.add_all([
+        Flight(
+            company_id=company.id, flight_number=f"BA-{i}", departure_city="Almaty", arrival_city="Astana",
+            departure_date=date(2099, 1, 1), departure_time=dtime(10, 0),
+            arrival_date=date(2099, 1, 1), arrival_time=dtime(12, 0),
+            total_seats=seats, available_seats=seats, price=100.0,
+        )
+        for i in range(flights)
+    ])
+    user = User(email="bench@example.com", hashed_password="x", role=UserRole.regular)
+    db.add(user)
+    db.commit()
+    flight_ids = [row.id for row in db.query(Flight.id)]
+    result = flight_ids, user.id
+    db.close()
+    return result
+
+
+async def drive(book, flight_ids, user_id, total, concurrency):
+    latencies, tickets = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            flight_id = flight_ids[i % len(flight_ids)]
+            ticket = await book(user_id, flight_id)
+            latencies.append(time.perf_counter() - started)
+            tickets.append((flight_id, ticket))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - started, latencies, tickets
+
+
+async def run(total, concurrency, flights, synchronous, max_batch):
+    os.environ["SQLITE_SYNCHRONOUS"] = synchronous  # до импорта backend.database
+    from backend import crud, group_commit
+    from backend.database import build_async_engine
+    from backend.models import Flight, Ticket
+
+    from .common import temp_database
+
+    results = []
+    for mode in ("direct", "group"):
+        engine, SessionLocal, path = temp_database(f"group_commit_{mode}")
+        # Мест меньше, чем покупок: часть запросов должна получить отказ
+        seats = max(1, total * 3 // (4 * flights))
+        flight_ids, user_id = seed(SessionLocal, flights, seats)
+        async_engine = build_async_engine(f"sqlite:///{path}", pool_size=concurrency, max_overflow=0)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+        writer = None
+        if mode == "group":
+            writer = group_commit.GroupCommitWriter(SessionLocal, max_batch=max_batch)
+            writer.start()
+
+            async def book(user_id, flight_id):
+                return await writer.book(user_id, flight_id)
+        else:
+            async def book(user_id, flight_id):
+                async with AsyncSessionLocal() as db:
+                    return await db.run_sync(crud.create_ticket, user_id, flight_id)
+
+        elapsed, latencies, tickets = await drive(book, flight_ids, user_id, total, concurrency)
+        if writer is not None:
+            await writer.stop()
+
+        booked = [(flight_id, t) for flight_id, t in tickets if t is not None]
+        db = SessionLocal()
+        sold = db.execute(select(func.count(Ticket.id))).scalar()
+        available = db.execute(select(func.sum(Flight.available_seats))).scalar()
+        db.close()
+        results.append({
+            "mode": mode,
+            "bookings": total,
+            "booked": len(booked),
+            "throughput_rps": round(total / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "batches": writer.batches if writer else total,
+            # Каждый получил билет на свой рейс, продано не больше, чем было мест
+            "consistent": (
+                all(t.flight_id == flight_id for flight_id, t in booked)
+                and len({t.id for _, t in booked}) == len(booked) == sold
+                and available == flights * seats - sold
+            ),
+        })
+        await async_engine.dispose()
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--flights", type=int, default=20)
+    parser.add_argument("--synchronous", choices=("OFF", "NORMAL", "FULL"), default="FULL")
+    parser.add_argument("--max-batch", type=int, default=128)
+    args = parser.parse_args()
+    for result in asyncio.run(run(args.bookings, args.concurrency, args.flights, args.synchronous, args.max_batch)):
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
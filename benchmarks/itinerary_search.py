@@ -0,0 +1,99 @@
+"""
+Скорость поиска маршрутов с пересадками (backend/routing.py).
+
+    python -m benchmarks.itinerary_search --flights 300000 --cities 400 --queries 200
+
+Заполняет временную БД случайной сетью рейсов, замеряет загрузку графа
+и задержку search_itineraries (p50/p95/p99) для 0..3 пересадок.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from backend import routing, search
+from backend.models import Company, Flight
+
+from .common import percentile, temp_database
+
+
+def seed(SessionLocal, flights, cities, days, rnd):
+    db = SessionLocal()
+    company = Company(name="Bench Air")
+    db.add(company)
+    db.flush()
+    names = [f"City {i}" for i in range(cities)]
+    start = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    rows = []
+    for i in range(flights):
+        origin, destination = rnd.sample(names, 2)
+        departs = start + timedelta(minutes=rnd.randrange(days * 24 * 60))
+        arrives = departs + timedelta(minutes=rnd.randrange(60, 12 * 60))
+        rows.append({
+            "company_id": company.id, "flight_number": f"BA-{i}",
+            "departure_city": origin, "arrival_city": destination,
+            "departure_city_key": search.normalize_city(origin),
+            "arrival_city_key": search.normalize_city(destination),
+            "departure_date": departs.date(), "departure_time": departs.time(),
+            "arrival_date": arrives.date(), "arrival_time": arrives.time(),
+            "total_seats": 100, "available_seats": 100,
+            "price": round(rnd.uniform(30, 500), 2), "is_active": True,
+        })
+        if len(rows) == 5000:
+            db.execute(insert(Flight), rows)
+            rows = []
+    if rows:
+        db.execute(insert(Flight), rows)
+    db.commit()
+    db.close()
+    return names, start.date()
+
+
+def run(flights, cities, days, queries, limit, seed_value=1):
+    rnd = random.Random(seed_value)
+    engine, SessionLocal, path = temp_database("itinerary_search")
+    names, first_day = seed(SessionLocal, flights, cities, days, rnd)
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    routing.flight_graph.load(db)
+    search.city_index.load(db)
+    load_sec = time.perf_counter() - started
+
+    results = {"flights": flights, "cities": cities, "graph_load_sec": round(load_sec, 2)}
+    for connections in range(routing.MAX_CONNECTIONS + 1):
+        samples, found = [], 0
+        for _ in range(queries):
+            origin, destination = rnd.sample(names, 2)
+            day = first_day + timedelta(days=rnd.randrange(days))
+            started = time.perf_counter()
+            found += len(routing.search_itineraries(
+                db, origin, destination, day, max_connections=connections, limit=limit,
+            ))
+            samples.append((time.perf_counter() - started) * 1000)
+        results[f"connections_{connections}"] = (
+            f"p50={percentile(samples, 50):.1f}ms p95={percentile(samples, 95):.1f}ms "
+            f"p99={percentile(samples, 99):.1f}ms avg_found={found / queries:.1f}"
+        )
+    db.close()
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flights", type=int, default=300000)
+    parser.add_argument("--cities", type=int, default=400)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    result = run(args.flights, args.cities, args.days, args.queries, args.limit)
+    for key, value in result.items():
+        print(f"{key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Задержка списков пассажиров рейса и билетов пользователя.
+
+    python -m benchmarks.listings --seats 500 --user-tickets 5000 --rounds 50
+
+legacy — прежняя реализация: ORM-объекты через joinedload, словарь на каждую
+         строку с isoformat()/str() и сериализация через jsonable_encoder;
+current — запросы по колонкам из crud и сериализация схем pydantic-core.
+Билеты пользователя выдаются так же, как в GET /tickets/my (одна страница
+на MAX_PAGE_SIZE строк), манифест — целиком.
+"""
+import argparse
+import json
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+
+from backend import crud, schemas
+from backend.models import Company, Flight, Ticket, TicketStatus, User, UserRole
+from backend.pagination import MAX_PAGE_SIZE, paginate
+
+from .common import percentile, temp_database
+
+_passengers = TypeAdapter(list[schemas.PassengerOut])
+_my_tickets = TypeAdapter(list[schemas.MyTicketOut])
+
+
+def seed(SessionLocal, seats, user_tickets):
+    db = SessionLocal()
+    company = Company(name="Bench Air")
+    db.add(company)
+    db.flush()
+    flights = [
+        Flight(
+            company_id=company.id, flight_number=f"BA-{i}",
+            departure_city="Almaty", arrival_city="Astana",
+            departure_date=date(2099, 1, 1) + timedelta(days=i), departure_time=dtime(10, 0),
+            arrival_date=date(2099, 1, 1) + timedelta(days=i), arrival_time=dtime(12, 0),
+            total_seats=max(seats, user_tickets), available_seats=0, price=100.0,
+        )
+        for i in range(2)
+    ]
+    db.add_all(flights)
+    db.flush()
+    db.execute(insert(User), [
+        {"email": f"bench{i}@example.com", "hashed_password": "x", "role": UserRole.regular,
+         "first_name": "Bench", "last_name": str(i), "is_active": True}
+        for i in range(seats)
+    ])
+    user_ids = [row.id for row in db.query(User.id).order_by(User.id)]
+    now = datetime.utcnow()
+    manifest = [
+        {"user_id": user_id, "flight_id": flights[0].id, "price": 100.0, "status": TicketStatus.active,
+         "created_at": now + timedelta(seconds=i)}
+        for i, user_id in enumerate(user_ids)
+    ]
+    frequent = [
+        {"user_id": user_ids[0], "flight_id": flights[i % 2].id, "price": 100.0, "status": TicketStatus.active,
+         "created_at": now + timedelta(seconds=i)}
+        for i in range(user_tickets)
+    ]
+    db.execute(insert(Ticket), manifest + frequent)
+    db.commit()
+    result = flights[0].id, company.id, user_ids[0]
+    db.close()
+    return result
+
+
+def legacy_passengers(db, flight_id, company_id):
+    flight = db.query(Flight).filter(Flight.id == flight_id, Flight.company_id == company_id).first()
+    if not flight:
+        return None
+    tickets = (
+        db.query(Ticket).options(joinedload(Ticket.user))
+        .filter(Ticket.flight_id == flight_id).order_by(Ticket.created_at.desc()).all()
+    )
+    return [
+        {
+            "ticket_id": t.id, "status": t.status.value, "price": t.price, "created_at": t.created_at.isoformat(),
+            "user": {"id": t.user.id, "email": t.user.email, "first_name": t.user.first_name,
+                     "last_name": t.user.last_name, "is_active": t.user.is_active},
+        }
+        for t in tickets
+    ]
+
+
+def legacy_my_tickets(db, user_id):
+    query = db.query(Ticket).options(joinedload(Ticket.flight)).filter(Ticket.user_id == user_id)
+    tickets, _ = paginate(query, crud.USER_TICKETS_ORDER, None, MAX_PAGE_SIZE, descending=True)
+    return [
+        {
+            "id": t.id, "flight_id": t.flight.id, "flight_number": t.flight.flight_number,
+            "route": f"{t.flight.departure_city} → {t.flight.arrival_city}",
+            "date": str(t.flight.departure_date), "time": str(t.flight.departure_time),
+            "price": t.price, "status": t.status.value, "created_at": t.created_at.isoformat(),
+        }
+        for t in tickets
+    ]
+
+
+def _legacy_json(result):
+    # Так FastAPI отдаёт dict без response_model
+    return json.dumps(jsonable_encoder(result), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def measure(SessionLocal, func, rounds):
+    samples, body = [], b""
+    for _ in range(rounds):
+        db = SessionLocal()
+        started = time.perf_counter()
+        body = func(db)
+        samples.append((time.perf_counter() - started) * 1000)
+        db.close()
+    return samples, body
+
+
+def run(seats, user_tickets, rounds):
+    engine, SessionLocal, path = temp_database("listings")
+    flight_id, company_id, user_id = seed(SessionLocal, seats, user_tickets)
+
+    cases = {
+        "manifest_legacy": lambda db: _legacy_json(legacy_passengers(db, flight_id, company_id)),
+        "manifest_current": lambda db: _passengers.dump_json(
+            _passengers.validate_python(crud.get_flight_passengers(db, flight_id, company_id))),
+        "my_tickets_legacy": lambda db: _legacy_json(legacy_my_tickets(db, user_id)),
+        "my_tickets_current": lambda db: _my_tickets.dump_json(_my_tickets.validate_python(
+            crud.get_user_tickets(db, user_id, None, MAX_PAGE_SIZE)[0], from_attributes=True)),
+    }
+    results, bodies = {"seats": seats, "user_tickets": user_tickets}, {}
+    for name, func in cases.items():
+        samples, bodies[name] = measure(SessionLocal, func, rounds)
+        results[name] = f"p50={percentile(samples, 50):.1f}ms p99={percentile(samples, 99):.1f}ms"
+    # Формат ответа не изменился
+    results["same_output"] = all(
+        json.loads(bodies[f"{name}_legacy"]) == json.loads(bodies[f"{name}_current"])
+        for name in ("manifest", "my_tickets")
+    )
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seats", type=int, default=500)
+    parser.add_argument("--user-tickets", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    result = run(args.seats, args.user_tickets, args.rounds)
+    for key, value in result.items():
+        print(f"{key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
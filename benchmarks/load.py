@@ -0,0 +1,410 @@
+"""
+Нагрузочный тест API с типовыми сценариями и историей результатов.
+
+    python -m benchmarks.load --mix search --duration 30 --concurrency 50
+    python -m benchmarks.load --mix flash_sale --mode uvicorn --workers 4
+    python -m benchmarks.load --database sqlite:///./bench.db --mix all
+
+Сценарии (--mix):
+  search      — поиск рейсов по маршруту/дате, подсказки городов, маршруты с пересадками;
+  flash_sale  — распродажа: много покупок на несколько «горячих» рейсов и поиск по ним;
+  dashboard   — опрос кабинетов: рейсы и статистика компании, пассажиры, «мои билеты»;
+  all         — все три сценария вместе.
+Режимы (--mode): inprocess — приложение в том же процессе (httpx.ASGITransport),
+uvicorn — отдельный сервер uvicorn на локальном порту.
+
+Если БД пустая, она заполняется через benchmarks.dataset (--flights, --users ...).
+Для каждого эндпоинта печатаются запросы в секунду, p50/p95/p99, ошибки и число
+SQL-запросов на HTTP-запрос (по /metrics; при нескольких воркерах uvicorn —
+только по воркеру, ответившему на /metrics). Результаты дописываются в
+benchmarks/results/<mix>-<mode>.jsonl вместе с коммитом, и сравниваются
+с предыдущим прогоном с теми же параметрами.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SAMPLE_SIZE = 500  # сколько рейсов/пользователей/менеджеров брать в выборку для запросов
+HOT_FLIGHTS = 5  # рейсов в распродаже
+
+
+# Выборка данных для запросов
+
+def load_sample(SessionLocal, rnd):
+    from sqlalchemy import func
+
+    from backend import auth
+    from backend.models import Flight, User, UserRole
+
+    db = SessionLocal()
+    try:
+        max_id = db.query(func.max(Flight.id)).scalar() or 0
+        ids = rnd.sample(range(1, max_id + 1), min(max_id, SAMPLE_SIZE))
+        flights = db.query(
+            Flight.id, Flight.company_id, Flight.departure_city, Flight.arrival_city, Flight.departure_date,
+        ).filter(Flight.id.in_(ids), Flight.is_active == True).all()
+        users = db.query(User.email).filter(User.role == UserRole.regular, User.is_active == True).limit(SAMPLE_SIZE).all()
+        managers = db.query(User.email, User.company_id).filter(User.role == UserRole.manager).limit(SAMPLE_SIZE).all()
+    finally:
+        db.close()
+    if not flights or not users or not managers:
+        raise SystemExit("В БД нет данных для нагрузки: запустите python -m benchmarks.dataset")
+    by_company = {}
+    for flight in flights:
+        by_company.setdefault(flight.company_id, []).append(flight.id)
+    managers = [m for m in managers if m.company_id in by_company]
+    return {
+        "flights": flights,
+        "hot": rnd.sample(flights, min(HOT_FLIGHTS, len(flights))),
+        "user_tokens": [auth.create_access_token({"sub": u.email}) for u in users],
+        "managers": [(auth.create_access_token({"sub": m.email}), by_company[m.company_id]) for m in managers],
+    }
+
+
+# Сценарии: функции возвращают (имя эндпоинта, метод, путь, параметры httpx)
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def search_flights(rnd, sample):
+    f = rnd.choice(sample["flights"])
+    params = {"departure_city": f.departure_city[:rnd.randint(3, len(f.departure_city))],
+              "arrival_city": f.arrival_city, "date": f.departure_date.isoformat()}
+    return "GET /flights", "GET", "/flights", {"params": params}
+
+
+def search_by_date(rnd, sample):
+    f = rnd.choice(sample["flights"])
+    return "GET /flights", "GET", "/flights", {"params": {"date": f.departure_date.isoformat(), "limit": 50}}
+
+
+def autocomplete(rnd, sample):
+    f = rnd.choice(sample["flights"])
+    return "GET /cities", "GET", "/cities", {"params": {"prefix": f.departure_city[:rnd.randint(1, 3)]}}
+
+
+def itineraries(rnd, sample):
+    a, b = rnd.sample(sample["flights"], 2)
+    params = {"departure_city": a.departure_city, "arrival_city": b.arrival_city,
+              "date": a.departure_date.isoformat(), "max_connections": 2}
+    return "GET /itineraries", "GET", "/itineraries", {"params": params}
+
+
+def buy_hot(rnd, sample):
+    f = rnd.choice(sample["hot"])
+    return "POST /tickets", "POST", "/tickets", {
+        "json": {"flight_id": f.id}, "headers": _bearer(rnd.choice(sample["user_tokens"])),
+    }
+
+
+def buy_hot_group(rnd, sample):
+    f = rnd.choice(sample["hot"])
+    return "POST /tickets/batch", "POST", "/tickets/batch", {
+        "json": {"items": [{"flight_id": f.id, "seats": rnd.randint(2, 4)}]},
+        "headers": _bearer(rnd.choice(sample["user_tokens"])),
+    }
+
+
+def search_hot(rnd, sample):
+    f = rnd.choice(sample["hot"])
+    params = {"departure_city": f.departure_city, "arrival_city": f.arrival_city, "date": f.departure_date.isoformat()}
+    return "GET /flights", "GET", "/flights", {"params": params}
+
+
+def company_flights(rnd, sample):
+    token, _ = rnd.choice(sample["managers"])
+    return "GET /company/flights", "GET", "/company/flights", {"params": {"limit": 50}, "headers": _bearer(token)}
+
+
+def company_stats(rnd, sample):
+    token, _ = rnd.choice(sample["managers"])
+    return "GET /company/stats", "GET", "/company/stats", {"headers": _bearer(token)}
+
+
+def passengers(rnd, sample):
+    token, flight_ids = rnd.choice(sample["managers"])
+    return ("GET /company/flights/{flight_id}/passengers", "GET",
+            f"/company/flights/{rnd.choice(flight_ids)}/passengers", {"headers": _bearer(token)})
+
+
+def my_tickets(rnd, sample):
+    return "GET /tickets/my", "GET", "/tickets/my", {
+        "params": {"limit": 20}, "headers": _bearer(rnd.choice(sample["user_tokens"])),
+    }
+
+
+MIXES = {
+    "search": [(60, search_flights), (15, search_by_date), (15, autocomplete), (10, itineraries)],
+    "flash_sale": [(55, buy_hot), (10, buy_hot_group), (35, search_hot)],
+    "dashboard": [(30, company_flights), (20, company_stats), (20, passengers), (30, my_tickets)],
+}
+MIXES["all"] = [item for name in ("search", "flash_sale", "dashboard") for item in MIXES[name]]
+
+# Ожидаемые отказы, а не ошибки: распроданный рейс
+EXPECTED_STATUSES = {"POST /tickets": {400}, "POST /tickets/batch": {400}}
+
+
+# Прогон
+
+async def drive(client, mix, sample, concurrency, duration, requests, seed_value):
+    weights = [w for w, _ in mix]
+    scenarios = [s for _, s in mix]
+    samples, statuses = {}, {}
+    deadline = time.perf_counter() + duration
+    issued = 0
+
+    async def worker(index):
+        nonlocal issued
+        rnd = random.Random(seed_value * 1000 + index)
+        while time.perf_counter() < deadline and (not requests or issued < requests):
+            issued += 1
+            name, method, path, options = rnd.choices(scenarios, weights)[0](rnd, sample)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **options)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.setdefault(name, []).append(time.perf_counter() - started)
+            by_status = statuses.setdefault(name, {})
+            by_status[status] = by_status.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples, statuses, time.perf_counter() - started
+
+
+_METRIC_LINE = re.compile(r'^http_request_db_queries_(sum|count)\{route="([^"]*)"\} ([0-9.e+-]+)$')
+
+
+async def scrape_db_queries(client):
+    """route -> [сумма SQL-запросов, число HTTP-запросов] из /metrics."""
+    try:
+        text = (await client.get("/metrics")).text
+    except httpx.HTTPError:
+        return {}
+    totals = {}
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if match:
+            kind, route, value = match.groups()
+            totals.setdefault(route, [0.0, 0.0])[0 if kind == "sum" else 1] += float(value)
+    return totals
+
+
+def summarize(samples, statuses, elapsed, before, after):
+    # .common импортирует backend.database, а тот читает DATABASE_URL при
+    # импорте — поэтому не на уровне модуля, а после того, как main() задал URL
+    from .common import percentile
+
+    endpoints = {}
+    for name in sorted(samples):
+        latencies = samples[name]
+        route = name.split(" ", 1)[1]
+        queries, count = (after.get(route, [0, 0])[i] - before.get(route, [0, 0])[i] for i in (0, 1))
+        errors = sum(
+            n for status, n in statuses[name].items()
+            if status == 0 or status >= 500 or (status >= 400 and status not in EXPECTED_STATUSES.get(name, ()))
+        )
+        endpoints[name] = {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "errors": errors,
+            "statuses": {str(k): v for k, v in sorted(statuses[name].items())},
+            "db_queries_per_request": round(queries / count, 2) if count else None,
+        }
+    total = sum(len(v) for v in samples.values())
+    return {"total_rps": round(total / elapsed, 1), "elapsed_sec": round(elapsed, 2), "endpoints": endpoints}
+
+
+async def run_inprocess(args, sample):
+    from backend.main import app
+
+    # ASGITransport не запускает lifespan — запускаем его сами
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await _measure(client, args, sample)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(args, sample):
+    port = args.port or _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        cwd=REPO_ROOT, env=dict(os.environ, DATABASE_URL=args.database),
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            for _ in range(300):
+                if server.poll() is not None:
+                    raise SystemExit("uvicorn завершился при запуске")
+                try:
+                    await client.get("/metrics")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            return await _measure(client, args, sample)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+async def _measure(client, args, sample):
+    before = await scrape_db_queries(client)
+    samples, statuses, elapsed = await drive(
+        client, MIXES[args.mix], sample, args.concurrency, args.duration, args.requests, args.seed,
+    )
+    after = await scrape_db_queries(client)
+    return summarize(samples, statuses, elapsed, before, after)
+
+
+# История результатов
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True,
+        ).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _same_setup(a, b):
+    keys = ("mix", "mode", "workers", "concurrency", "duration", "requests", "dataset")
+    return all(a.get(k) == b.get(k) for k in keys)
+
+
+def save_and_compare(record, results_dir):
+    results_dir.mkdir(parents=True, exist_ok=True)
+    path = results_dir / f"{record['mix']}-{record['mode']}.jsonl"
+    previous = None
+    if path.exists():
+        for line in path.read_text().splitlines():
+            if line.strip():
+                candidate = json.loads(line)
+                if _same_setup(candidate, record):
+                    previous = candidate
+    with path.open("a") as fh:
+        fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path, previous
+
+
+def _delta(current, previous):
+    if not previous:
+        return ""
+    return f" ({(current - previous) / previous * 100:+.0f}%)"
+
+
+def report(record, previous):
+    base = previous["endpoints"] if previous else {}
+    print(f"commit {record['commit']}  mix={record['mix']}  mode={record['mode']}  "
+          f"concurrency={record['concurrency']}  total_rps={record['total_rps']}"
+          + _delta(record["total_rps"], previous and previous["total_rps"]))
+    if previous:
+        print(f"сравнение с {previous['commit']} от {previous['timestamp']}")
+    for name, stats in record["endpoints"].items():
+        old = base.get(name, {})
+        print(
+            f"  {name:<45} rps={stats['rps']}{_delta(stats['rps'], old.get('rps'))}"
+            f"  p50={stats['p50_ms']}ms{_delta(stats['p50_ms'], old.get('p50_ms'))}"
+            f"  p95={stats['p95_ms']}ms  p99={stats['p99_ms']}ms{_delta(stats['p99_ms'], old.get('p99_ms'))}"
+            f"  errors={stats['errors']}  sql/req={stats['db_queries_per_request']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="search")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--database", default=None, help="URL БД; по умолчанию — новый SQLite во временной папке")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="секунд нагрузки")
+    parser.add_argument("--requests", type=int, default=0, help="остановиться после N запросов (0 — по времени)")
+    parser.add_argument("--workers", type=int, default=1, help="воркеров uvicorn")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--results", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--flights", type=int, default=100_000, help="размер набора данных, если БД пустая")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--tickets-per-user", type=int, default=5)
+    args = parser.parse_args()
+
+    # Движок backend создаётся при импорте, поэтому URL задаётся до него
+    args.database = args.database or f"sqlite:///{tempfile.mkdtemp(prefix='flingt-')}/load.db"
+    os.environ["DATABASE_URL"] = args.database
+    # Вся нагрузка идёт с одного адреса и от нескольких пользователей — без
+    # этого её срезал бы rate_limit (RATE_LIMIT_ENABLED=1 проверяет и его)
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+    from backend import migrations
+    from backend.database import SessionLocal, engine
+    from backend.models import Flight
+
+    from . import dataset
+
+    migrations.migrate(engine)
+    db = SessionLocal()
+    empty = db.query(Flight.id).first() is None
+    db.close()
+    if empty:
+        print("Заполнение БД:", dataset.seed(
+            SessionLocal, args.companies, args.flights, args.users, args.tickets_per_user, seed_value=args.seed,
+        ))
+    db = SessionLocal()
+    dataset_size = db.query(Flight).count()
+    db.close()
+    sample = load_sample(SessionLocal, random.Random(args.seed))
+    engine.dispose()  # в режиме uvicorn БД дальше использует только сервер
+
+    runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+    result = asyncio.run(runner(args, sample))
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "mix": args.mix,
+        "mode": args.mode,
+        "workers": args.workers if args.mode == "uvicorn" else 1,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "requests": args.requests,
+        "dataset": {"flights": dataset_size},
+        **result,
+    }
+    path, previous = save_and_compare(record, args.results)
+    report(record, previous)
+    print(f"результат сохранён в {path}")
+
+
+if __name__ == "__main__":
+    main()
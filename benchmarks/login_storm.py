@@ -0,0 +1,105 @@
+"""
+Нагрузочный тест входа: шквал POST /auth/login против приложения в процессе.
+
+    python -m benchmarks.login_storm --logins 400 --concurrency 50 --workers 4
+
+Сравнивает проверку пароля в пуле потоков (HASH_WORKERS=0) и в пуле процессов
+(--workers). Печатает пропускную способность входа, p50/p99 и задержку лёгкого
+запроса GET /cities, выполняемого параллельно со шквалом.
+"""
+import os
+import tempfile
+
+# Приложение должно подключиться к временной БД, поэтому URL задаётся до импорта backend
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='flingt-')}/login_storm.db")
+# Сравнивается хэширование, а не ограничение частоты (см. benchmarks/rate_limit.py)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from backend import crud, hashing, migrations, schemas
+from backend.database import SessionLocal, engine
+from backend.main import app
+
+from .common import percentile
+
+
+def seed_users(count):
+    # ASGITransport не запускает lifespan приложения — схему создаём сами
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        for i in range(count):
+            email = f"storm{i}@example.com"
+            if not crud.get_user_by_email(db, email):
+                crud.create_user(db, schemas.UserCreate(email=email, password=f"password{i}"))
+    finally:
+        db.close()
+
+
+async def storm(logins, concurrency, users):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, probes, statuses = [], [], {}
+        done = asyncio.Event()
+
+        async def login(i):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/auth/login",
+                    data={"username": f"storm{i % users}@example.com", "password": f"password{i % users}"},
+                )
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/cities", params={"prefix": "a"})
+                probes.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+    return {
+        "logins_per_sec": round(logins / elapsed, 1),
+        "login_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "login_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "probe_p99_ms": round(percentile(probes, 99) * 1000, 1),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процессов в пуле хэширования")
+    args = parser.parse_args()
+
+    seed_users(args.users)
+    asyncio.run(compare(args))
+
+
+async def compare(args):
+    # Один event loop на оба прогона: пул соединений async-движка привязан к циклу
+    for label, workers in (("threads", 0), (f"processes x{args.workers}", args.workers)):
+        hashing.configure(workers=workers, queue_limit=max(1, workers) * 8 + args.concurrency)
+        result = await storm(args.logins, args.concurrency, args.users)
+        print(f"{label:>16}: " + "  ".join(f"{key}={value}" for key, value in result.items()))
+    hashing.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Пересчёт динамических цен: построчный ORM-цикл против пакетного pricing.reprice_all.
+
+    python -m benchmarks.pricing --flights 1000000 --orm-flights 100000
+
+orm    — прежний подход: объекты Flight по одному, цена считается в Python,
+         UPDATE на каждый изменённый рейс (на --orm-flights рейсах);
+python — reprice_all без NumPy (колонки пачкой, тарифы в цикле Python);
+numpy  — reprice_all с векторным расчётом.
+Перед каждым прогоном цены сбрасываются к базовым, так что меняются почти
+все рейсы; steady — повторный прогон numpy, когда цены уже актуальны.
+"""
+import argparse
+import random
+import time
+from datetime import date, time as dtime, timedelta
+
+from sqlalchemy import insert, update
+
+from .common import temp_database
+
+
+def seed(SessionLocal, flights, seed_value=42):
+    from backend.models import Company, Flight
+
+    rnd = random.Random(seed_value)
+    db = SessionLocal()
+    company = Company(name="Bench Air")
+    db.add(company)
+    db.commit()
+    today = date.today()
+    for start in range(0, flights, 50_000):
+        rows = []
+        for i in range(start, min(flights, start + 50_000)):
+            total = rnd.choice((50, 120, 180, 300))
+            day = today + timedelta(days=rnd.randrange(0, 120))
+            rows.append({
+                "company_id": company.id, "flight_number": f"BP-{i}",
+                "departure_city": "Almaty", "arrival_city": "Astana",
+                "departure_date": day, "departure_time": dtime(rnd.randrange(24), rnd.choice((0, 30))),
+                "arrival_date": day, "arrival_time": dtime(23, 59),
+                "total_seats": total, "available_seats": rnd.randrange(0, total + 1),
+                "price": float(rnd.randrange(30, 900)), "is_active": True,
+            })
+        db.execute(insert(Flight), rows)
+        db.commit()
+    db.close()
+
+
+def reset_prices(SessionLocal):
+    from backend.models import Flight
+
+    db = SessionLocal()
+    db.execute(update(Flight).values(current_price=Flight.price))
+    db.commit()
+    db.close()
+
+
+def reprice_orm(db, limit):
+    from datetime import datetime
+
+    from backend import pricing
+    from backend.models import Flight
+
+    now = datetime.utcnow()
+    changed = 0
+    flights = db.query(Flight).filter(Flight.is_active == True, Flight.departure_date >= now.date()).limit(limit)
+    for flight in flights:
+        days_left = (datetime.combine(flight.departure_date, flight.departure_time) - now).total_seconds() / 86400
+        price = pricing.fare(flight.price, flight.total_seats, flight.available_seats, days_left)
+        if price != flight.current_price:
+            flight.current_price = price
+            changed += 1
+    db.commit()
+    return changed
+
+
+def timed(SessionLocal, func):
+    db = SessionLocal()
+    started = time.perf_counter()
+    changed = func(db)
+    elapsed = time.perf_counter() - started
+    db.close()
+    return elapsed, changed
+
+
+def run(flights, orm_flights):
+    from backend import pricing
+
+    engine, SessionLocal, _ = temp_database("pricing")
+    started = time.perf_counter()
+    seed(SessionLocal, flights)
+    print(f"seeded {flights} flights in {time.perf_counter() - started:.1f}s")
+
+    numpy = pricing.np
+    modes = [("orm", lambda db: reprice_orm(db, orm_flights), orm_flights)]
+    modes.append(("python", pricing.reprice_all, flights))
+    if numpy is not None:
+        modes.append(("numpy", pricing.reprice_all, flights))
+
+    results = []
+    for mode, func, count in modes:
+        reset_prices(SessionLocal)
+        pricing.np = None if mode == "python" else numpy
+        elapsed, changed = timed(SessionLocal, func)
+        results.append({"mode": mode, "flights": count, "changed": changed, "seconds": round(elapsed, 2),
+                        "flights_per_s": round(count / elapsed)})
+    pricing.np = numpy
+    elapsed, changed = timed(SessionLocal, pricing.reprice_all)
+    results.append({"mode": "steady", "flights": flights, "changed": changed, "seconds": round(elapsed, 2),
+                    "flights_per_s": round(flights / elapsed)})
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flights", type=int, default=1_000_000)
+    parser.add_argument("--orm-flights", type=int, default=100_000)
+    args = parser.parse_args()
+    for result in run(args.flights, min(args.orm_flights, args.flights)):
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Ограничение частоты запросов: бот перебирает пароли, пока обычный клиент
+пользуется сайтом.
+
+    python -m benchmarks.rate_limit --duration 10 --bot-rps 300 --concurrency 50
+
+С одного адреса идёт поток POST /auth/login с неверными паролями (--bot-rps
+в секунду, не больше --concurrency одновременно: бот работает в том же
+процессе, и без темпа он занял бы процессор сам, а не сервер); с другого —
+GET /cities раз в 200 мс и вход с верным паролем раз в 2 с. Прогоны без
+ограничения и с ним (backend/rate_limit.py, лимиты по умолчанию). Печатается,
+сколько попыток бота дошло до проверки пароля и сколько отсечено ответом 429,
+и задержки обычного клиента. Отдельно — скорость TokenBuckets.take и память
+на RATE_LIMIT_MAX_KEYS ключей.
+"""
+import os
+import tempfile
+
+# Приложение должно подключиться к временной БД, поэтому URL задаётся до импорта backend
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='flingt-')}/rate_limit.db")
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import httpx
+
+from backend import crud, hashing, migrations, rate_limit, schemas
+from backend.database import SessionLocal, engine
+from backend.main import app
+
+from .common import percentile
+
+BOT = ("10.0.0.66", 40000)
+CLIENT = ("10.0.0.7", 40001)
+
+
+def seed_user():
+    # ASGITransport не запускает lifespan приложения — схему создаём сами
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        if not crud.get_user_by_email(db, "client@example.com"):
+            crud.create_user(db, schemas.UserCreate(email="client@example.com", password="client-password"))
+    finally:
+        db.close()
+
+
+async def attack(duration, bot_rps, concurrency):
+    bot = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=BOT), base_url="http://bench")
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=CLIENT), base_url="http://bench")
+    statuses, probes, logins, client_statuses = {}, [], [], {}
+    deadline = time.perf_counter() + duration
+
+    async def bot_worker(worker):
+        attempt = 0
+        next_at = time.perf_counter()
+        while time.perf_counter() < deadline:
+            attempt += 1
+            response = await bot.post(
+                "/auth/login", data={"username": "client@example.com", "password": f"guess-{worker}-{attempt}"},
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            next_at += concurrency / bot_rps
+            # sleep(0) и при отставании: отказ 429 в ASGITransport не уступает
+            # цикл событий (нет сетевого ввода-вывода)
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+    async def probe():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get("/cities", params={"prefix": "a"})
+            probes.append(time.perf_counter() - started)
+            client_statuses[response.status_code] = client_statuses.get(response.status_code, 0) + 1
+            await asyncio.sleep(0.2)
+
+    async def client_logins():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.post("/auth/login", data={"username": "client@example.com", "password": "client-password"})
+            logins.append(time.perf_counter() - started)
+            client_statuses[response.status_code] = client_statuses.get(response.status_code, 0) + 1
+            await asyncio.sleep(2)
+
+    started = time.perf_counter()
+    async with bot, client:
+        await asyncio.gather(*(bot_worker(i) for i in range(concurrency)), probe(), client_logins())
+    elapsed = time.perf_counter() - started
+    return {
+        "bot_rps": round(sum(statuses.values()) / elapsed),
+        "bot_checked": statuses.get(401, 0),
+        "bot_429": statuses.get(429, 0),
+        "bot_other": sum(n for status, n in statuses.items() if status not in (401, 429)),
+        "probe_p50_ms": round(percentile(probes, 50) * 1000, 1),
+        "probe_p99_ms": round(percentile(probes, 99) * 1000, 1),
+        "client_login_p99_ms": round(percentile(logins, 99) * 1000, 1),
+        "client_statuses": client_statuses,
+    }
+
+
+def bucket_cost(keys):
+    buckets = rate_limit.TokenBuckets(max_keys=keys)
+    limit = rate_limit.Limit(300, 30)
+    names = [f"ip:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(keys)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for name in names:
+        buckets.take(name, limit)
+    for name in names:
+        buckets.take(name, limit)
+    elapsed = time.perf_counter() - started
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        "keys": len(buckets),
+        "takes_per_sec": round(2 * keys / elapsed),
+        "bytes_per_key": round(used / keys),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--bot-rps", type=float, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--keys", type=int, default=rate_limit.RATE_LIMIT_MAX_KEYS)
+    args = parser.parse_args()
+
+    seed_user()
+    print("buckets: " + "  ".join(f"{key}={value}" for key, value in bucket_cost(args.keys).items()))
+    asyncio.run(compare(args))
+
+
+async def compare(args):
+    for label, enabled in (("no limit", False), ("rate limit", True)):
+        rate_limit.RATE_LIMIT_ENABLED = enabled
+        rate_limit.limiter.buckets = rate_limit.TokenBuckets()
+        result = await attack(args.duration, args.bot_rps, args.concurrency)
+        print(f"{label:>10}: " + "  ".join(f"{key}={value}" for key, value in result.items()))
+    hashing.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Стресс-тест учёта мест: много потоков одновременно покупают билеты на один рейс.
+
+    python -m benchmarks.seat_inventory --workers 64 --attempts 2000 --seats 500
+
+Печатает количество бронирований в секунду и число перепроданных мест.
+С флагом --legacy используется старая схема «прочитать, уменьшить в Python, записать».
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as dtime
+
+from sqlalchemy.exc import OperationalError
+
+from backend import crud
+from backend.models import Company, Flight, Ticket, TicketStatus, User, UserRole
+
+from .common import temp_database
+
+
+def legacy_create_ticket(db, user_id, flight_id):
+    # Прежняя реализация crud.create_ticket — для сравнения
+    flight = db.query(Flight).filter(Flight.id == flight_id, Flight.is_active == True).first()
+    if not flight or flight.available_seats <= 0:
+        return None
+    flight.available_seats -= 1
+    ticket = Ticket(user_id=user_id, flight_id=flight_id, price=flight.price, status=TicketStatus.active)
+    db.add(ticket)
+    db.commit()
+    return ticket
+
+
+def seed(SessionLocal, seats, users):
+    db = SessionLocal()
+    company = Company(name="Bench Air")
+    db.add(company)
+    db.flush()
+    flight = Flight(
+        company_id=company.id, flight_number="BA-1",
+        departure_city="Almaty", arrival_city="Astana",
+        departure_date=date(2099, 1, 1), departure_time=dtime(10, 0),
+        arrival_date=date(2099, 1, 1), arrival_time=dtime(12, 0),
+        total_seats=seats, available_seats=seats, price=100.0,
+    )
+    db.add(flight)
+    db.add_all([User(email=f"bench{i}@example.com", hashed_password="x", role=UserRole.regular) for i in range(users)])
+    db.commit()
+    user_ids = [u.id for u in db.query(User.id).all()]
+    flight_id = flight.id
+    db.close()
+    return flight_id, user_ids
+
+
+def run(workers, attempts, seats, legacy=False):
+    engine, SessionLocal, path = temp_database("seat_inventory")
+    flight_id, user_ids = seed(SessionLocal, seats, users=min(attempts, 1000))
+    book = legacy_create_ticket if legacy else crud.create_ticket
+
+    def attempt(i):
+        db = SessionLocal()
+        try:
+            return "ok" if book(db, user_ids[i % len(user_ids)], flight_id) else "sold_out"
+        except OperationalError:
+            db.rollback()
+            return "error"
+        finally:
+            db.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(attempt, range(attempts)))
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    sold = db.query(Ticket).filter(Ticket.flight_id == flight_id).count()
+    available = db.query(Flight.available_seats).filter(Flight.id == flight_id).scalar()
+    db.close()
+    engine.dispose()
+
+    booked = outcomes.count("ok")
+    return {
+        "mode": "legacy" if legacy else "inventory",
+        "workers": workers,
+        "attempts": attempts,
+        "seats": seats,
+        "booked": booked,
+        "sold_out": outcomes.count("sold_out"),
+        "errors": outcomes.count("error"),
+        "bookings_per_sec": round(booked / elapsed, 1) if elapsed else 0.0,
+        "elapsed_sec": round(elapsed, 3),
+        # Перепродажа: продано билетов больше, чем мест на рейсе
+        "oversell": max(0, sold - seats),
+        # Расхождение счётчика available_seats с реально проданными билетами
+        "seat_counter_drift": (seats - available) - sold,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--attempts", type=int, default=2000)
+    parser.add_argument("--seats", type=int, default=500)
+    parser.add_argument("--legacy", action="store_true", help="старая схема без атомарного списания")
+    args = parser.parse_args()
+    result = run(args.workers, args.attempts, args.seats, legacy=args.legacy)
+    for key, value in result.items():
+        print(f"{key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
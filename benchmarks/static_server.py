@@ -0,0 +1,146 @@
+"""
+Сервер фронтенда: прежний socketserver.TCPServer + SimpleHTTPRequestHandler
+против start_frontend_server.FrontendServer.
+
+    python -m benchmarks.static_server --requests 3000 --concurrency 32 --slow-clients 1
+
+Клиенты в потоках запрашивают страницы и картинки из frontend/
+(Accept-Encoding: gzip, повторные запросы с If-None-Match, как браузер).
+--slow-clients открывают соединение и --slow-seconds не дописывают запрос:
+однопоточный сервер всё это время никого не обслуживает.
+"""
+import argparse
+import http.client
+import http.server
+import os
+import socket
+import socketserver
+import threading
+import time
+from functools import partial
+
+from .common import percentile
+
+PATHS = ["/index.html", "/login.html", "/user_dashboard.html", "/company_dashboard.html", "/images/jet2.jpeg"]
+
+
+def legacy_server(root):
+    # Прежний start_frontend_server.py
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    class Server(socketserver.TCPServer):
+        def handle_error(self, request, client_address):
+            pass  # обрывы соединений при переполненной очереди accept
+
+    return Server(("127.0.0.1", 0), partial(Handler, directory=root))
+
+
+def new_server(root):
+    from start_frontend_server import FrontendServer
+
+    server = FrontendServer(("127.0.0.1", 0), root, quiet=True)
+    server.cache.preload()
+    return server
+
+
+def slow_client(port, seconds, stop):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(b"GET /index.html HTTP/1.1\r\n")  # запрос без конца заголовков
+    stop.wait(seconds)
+    sock.close()
+
+
+def drive(port, total, concurrency):
+    latencies, counters = [], {"bytes": 0, "not_modified": 0, "errors": 0}
+    lock = threading.Lock()
+    next_index = iter(range(total))
+
+    def worker():
+        connection, etags = None, {}
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                break
+            path = PATHS[i % len(PATHS)]
+            headers = {"Accept-Encoding": "gzip"}
+            if path in etags:
+                headers["If-None-Match"] = etags[path]
+            started = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+                if response.will_close:
+                    connection.close()
+                    connection = None
+            except (OSError, http.client.HTTPException):
+                connection = None
+                with lock:
+                    counters["errors"] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                counters["bytes"] += len(body)
+                counters["not_modified"] += response.status == 304
+            if response.getheader("ETag"):
+                etags[path] = response.getheader("ETag")
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, counters
+
+
+def run(total, concurrency, slow_clients, slow_seconds, root):
+    results = []
+    for name, factory in (("legacy", legacy_server), ("threaded", new_server)):
+        server = factory(root)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stop = threading.Event()
+        slow = [threading.Thread(target=slow_client, args=(port, slow_seconds, stop)) for _ in range(slow_clients)]
+        for thread in slow:
+            thread.start()
+        time.sleep(0.1)  # медленные клиенты подключаются первыми
+        elapsed, latencies, counters = drive(port, total, concurrency)
+        stop.set()
+        for thread in slow:
+            thread.join()
+        server.shutdown()
+        server.server_close()
+        results.append({
+            "server": name,
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "not_modified": counters["not_modified"],
+            "mb_sent": round(counters["bytes"] / 1e6, 2),
+            "errors": counters["errors"],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--slow-clients", type=int, default=1)
+    parser.add_argument("--slow-seconds", type=float, default=2.0)
+    parser.add_argument("--root", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend"))
+    args = parser.parse_args()
+    for result in run(args.requests, args.concurrency, args.slow_clients, args.slow_seconds, args.root):
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,404 @@
 #!/usr/bin/env python3
-import http.server
-import socketserver
-import webbrowser
+"""
+Сервер фронтенда.
+
+    python start_frontend_server.py                         # http://localhost:3000
+    python start_frontend_server.py --api http://localhost:8000 --port 8080 --no-browser
+
+Потоковый (по потоку на соединение, keep-alive), поэтому медленный клиент
+не задерживает остальных. Файлы из frontend/ читаются один раз и держатся
+в памяти вместе со сжатыми вариантами (gzip, brotli — если установлен пакет
+brotli); изменённый на диске файл перечитывается при следующем запросе.
+Ответы несут ETag и Last-Modified, повторный запрос с If-None-Match /
+If-Modified-Since получает 304. Картинки (frontend/images) кэшируются
+браузером на 30 дней, страницы — с проверкой при каждом открытии.
+Путь без расширения отдаёт одноимённую страницу (/login -> login.html),
+а если такой нет — index.html.
+
+С --api запросы /api/... проксируются на бэкенд (без префикса /api, включая
+потоки /events), а в страницах адрес http://localhost:8000 заменяется на /api:
+фронтенд и API работают с одного порта, без CORS.
+"""
+import argparse
+import email.utils
+import gzip
+import hashlib
+import http.client
+import mimetypes
 import os
+import posixpath
+import shutil
+import stat
+import sys
+import threading
+import urllib.parse
+import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаётся только gzip
+    brotli = None
 
 PORT = 3000
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend')
+INDEX = 'index.html'
+
+API_PREFIX = '/api'
+API_ORIGIN = 'http://localhost:8000'  # адрес бэкенда, прописанный в страницах
+API_TIMEOUT_SECONDS = 300  # потоки /events присылают пинг каждые 15 с
+
+LONG_CACHE_DIRS = ('images/',)
+LONG_CACHE_CONTROL = 'public, max-age=2592000'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+MAX_CACHED_FILE_BYTES = 8 * 1024 * 1024  # файлы крупнее отдаются с диска
+MIN_COMPRESS_BYTES = 512
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+COPY_CHUNK_BYTES = 64 * 1024
+
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host',
+}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+mimetypes.add_type('image/avif', '.avif')
+
+
+class Asset:
+    """Файл в памяти: тело в каждом варианте сжатия, ETag и заголовки кэширования."""
+
+    def __init__(self, path, rel, st, rewrite_api=False):
+        self.path = path
+        self.key = (st.st_mtime_ns, st.st_size)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        self.mtime = int(st.st_mtime)
+        long_cache = rel.startswith(LONG_CACHE_DIRS)
+        self.cache_control = LONG_CACHE_CONTROL if long_cache else REVALIDATE_CACHE_CONTROL
+        if self.content_type.startswith('text/'):
+            self.content_type += '; charset=utf-8'
+
+        self.bodies = {}
+        if st.st_size > MAX_CACHED_FILE_BYTES:
+            self.etag = '"%x-%x"' % self.key
+            self.etags = {'identity': self.etag}
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        if rewrite_api and self.content_type.startswith('text/html'):
+            body = body.replace(API_ORIGIN.encode(), API_PREFIX.encode())
+        self.bodies['identity'] = body
+        if self.content_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= MIN_COMPRESS_BYTES:
+            compressed = {'gzip': gzip.compress(body, 9, mtime=0)}
+            if brotli is not None:
+                compressed['br'] = brotli.compress(body, quality=11)
+            for encoding, data in compressed.items():
+                if len(data) < len(body):
+                    self.bodies[encoding] = data
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        # Сильный ETag у каждого варианта сжатия свой
+        self.etags = {encoding: self.etag if encoding == 'identity' else f'"{self.etag[1:-1]}-{encoding}"'
+                      for encoding in self.bodies}
+
+    @property
+    def compressed(self):
+        return len(self.bodies) > 1
 
-class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def end_headers(self):
+    def pick_encoding(self, accept_encoding):
+        if not self.compressed or not accept_encoding:
+            return 'identity'
+        accepted = set()
+        for part in accept_encoding.split(','):
+            token, _, params = part.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(token.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and (encoding in accepted or '*' in accepted):
+                return encoding
+        return 'identity'
+
+    def not_modified(self, headers):
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return bool(tags & set(self.etags.values()))
+        if_modified_since = headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since is not None and self.mtime <= since.timestamp()
+        return False
+
+
+class FileCache:
+    def __init__(self, root, rewrite_api=False):
+        self.root = os.path.realpath(root)
+        self.rewrite_api = rewrite_api
+        self._lock = threading.Lock()
+        self._assets = {}
+
+    def get(self, rel):
+        """Asset для пути относительно root или None; изменённый файл перечитывается."""
+        path = os.path.join(self.root, *rel.split('/'))
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        asset = self._assets.get(rel)
+        if asset is None or asset.key != (st.st_mtime_ns, st.st_size):
+            asset = Asset(path, rel, st, self.rewrite_api)
+            with self._lock:
+                self._assets[rel] = asset
+        return asset
+
+    def preload(self):
+        """Читает и сжимает все файлы заранее, чтобы первые запросы не ждали."""
+        count = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                rel = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+                if self.get(rel) is not None:
+                    count += 1
+        return count
+
+
+class FrontendHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FlingtFrontend/1.0'
+    timeout = 60  # простаивающее keep-alive соединение освобождает поток
+
+    _upstream = None
+
+    # Маршрутизация
+
+    def do_GET(self):
+        if self._is_api():
+            self._proxy()
+        else:
+            self._serve_static(head=False)
+
+    def do_HEAD(self):
+        if self._is_api():
+            self._proxy()
+        else:
+            self._serve_static(head=True)
+
+    def do_OPTIONS(self):
+        if self._is_api():
+            self._proxy()
+            return
+        self.send_response(204)
+        self._send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _api_only(self):
+        if self._is_api():
+            self._proxy()
+        else:
+            self.send_error(405)
+
+    do_POST = do_PUT = do_PATCH = do_DELETE = _api_only
+
+    def _is_api(self):
+        path = self.path.split('?', 1)[0]
+        return self.server.api is not None and (path == API_PREFIX or path.startswith(API_PREFIX + '/'))
+
+    # Статика
+
+    def _resolve(self):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        parts = [part for part in posixpath.normpath(path).split('/') if part and part != '.']
+        if '..' in parts or any('\\' in part or '\0' in part for part in parts):
+            return None
+        rel = '/'.join(parts)
+        cache = self.server.cache
+        if not rel or path.endswith('/'):
+            return cache.get(posixpath.join(rel, INDEX))
+        asset = cache.get(rel)
+        if asset is not None or posixpath.splitext(rel)[1]:
+            return asset
+        # Путь без расширения: страница с таким именем или index.html
+        return cache.get(rel + '.html') or cache.get(INDEX)
+
+    def _serve_static(self, head):
+        asset = self._resolve()
+        if asset is None:
+            self.send_error(404)
+            return
+        encoding = asset.pick_encoding(self.headers.get('Accept-Encoding'))
+        if asset.not_modified(self.headers):
+            self.send_response(304)
+            self._send_asset_headers(asset, encoding)
+            self.end_headers()
+            return
+        body = asset.bodies.get(encoding)
+        self.send_response(200)
+        self._send_asset_headers(asset, encoding)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body) if body is not None else asset.key[1]))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if head:
+            return
+        if body is not None:
+            self.wfile.write(body)
+        else:
+            with open(asset.path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, COPY_CHUNK_BYTES)
+
+    def _send_asset_headers(self, asset, encoding):
+        self.send_header('ETag', asset.etags[encoding])
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Cache-Control', asset.cache_control)
+        if asset.compressed:
+            self.send_header('Vary', 'Accept-Encoding')
+        self._send_cors_headers()
+
+    def _send_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', '*')
-        super().end_headers()
 
-    def do_OPTIONS(self):
-        self.send_response(200)
+    # Прокси к API
+
+    def _connect(self):
+        api = self.server.api
+        connection_class = http.client.HTTPSConnection if api.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(api.netloc, timeout=API_TIMEOUT_SECONDS)
+
+    def _proxy(self):
+        target = self.path[len(API_PREFIX):]
+        if not target.startswith('/'):
+            target = '/' + target
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.send_error(411)
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        headers = {name: value for name, value in self.headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+        headers['Host'] = self.server.api.netloc
+        headers['X-Forwarded-For'] = self.client_address[0]
+        if self.headers.get('Host'):
+            headers['X-Forwarded-Host'] = self.headers['Host']
+
+        # Соединение с бэкендом живёт столько же, сколько соединение клиента;
+        # если бэкенд успел закрыть простаивавшее соединение — один повтор
+        for attempt in (0, 1):
+            reused = self._upstream is not None
+            if not reused:
+                self._upstream = self._connect()
+            try:
+                self._upstream.request(self.command, target, body=body, headers=headers)
+                response = self._upstream.getresponse()
+                break
+            except (http.client.HTTPException, OSError):
+                self._close_upstream()
+                if attempt or not reused or self.command not in IDEMPOTENT_METHODS:
+                    self.send_error(502, 'API is unavailable')
+                    return
+        try:
+            self._relay(response)
+        except OSError:
+            # Клиент отключился (например, закрыл страницу с потоком событий)
+            self.close_connection = True
+            self._close_upstream()
+            return
+        if response.will_close:
+            self._close_upstream()
+
+    def _relay(self, response):
+        self.send_response_only(response.status, response.reason)
+        for name, value in response.getheaders():
+            if name.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(name, value)
+        no_body = self.command == 'HEAD' or response.status in (204, 304) or 100 <= response.status < 200
+        if no_body or response.length is not None:
+            self.end_headers()
+            if not no_body:
+                shutil.copyfileobj(response, self.wfile, COPY_CHUNK_BYTES)
+            response.read()
+            return
+        # Длина неизвестна (поток /events): отдаём кусками по мере поступления
+        chunked = self.request_version != 'HTTP/1.0'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
         self.end_headers()
+        while True:
+            data = response.read1(COPY_CHUNK_BYTES)
+            if not data:
+                break
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data) if chunked else data)
+            self.wfile.flush()
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
 
-if __name__ == "__main__":
-    os.chdir('frontend')
-    
-    with socketserver.TCPServer(("", PORT), MyHTTPRequestHandler) as httpd:
-        print(f"Frontend server running at http://localhost:{PORT}")
-        print("Opening browser...")
-        webbrowser.open(f'http://localhost:{PORT}')
+    def _close_upstream(self):
+        if self._upstream is not None:
+            self._upstream.close()
+            self._upstream = None
+
+    def finish(self):
+        self._close_upstream()
+        super().finish()
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class FrontendServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, root=ROOT, api=None, quiet=False):
+        super().__init__(address, FrontendHandler)
+        self.api = urllib.parse.urlsplit(api.rstrip('/')) if api else None
+        self.cache = FileCache(root, rewrite_api=self.api is not None)
+        self.quiet = quiet
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return  # клиент закрыл соединение посреди ответа
+        super().handle_error(request, client_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--root', default=ROOT)
+    parser.add_argument('--api', help=f'адрес бэкенда для проксирования {API_PREFIX}/..., например {API_ORIGIN}')
+    parser.add_argument('--quiet', action='store_true', help='не писать журнал запросов')
+    parser.add_argument('--no-browser', action='store_true')
+    args = parser.parse_args()
+
+    with FrontendServer((args.host, args.port), args.root, args.api, args.quiet) as httpd:
+        files = httpd.cache.preload()
+        print(f"Frontend server running at http://localhost:{args.port} ({files} files cached)")
+        if args.api:
+            print(f"Proxying {API_PREFIX}/ to {args.api}")
+        if not args.no_browser:
+            print("Opening browser...")
+            webbrowser.open(f'http://localhost:{args.port}')
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\nServer stopped.")
+
+
+if __name__ == "__main__":
+    main()
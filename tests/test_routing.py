@@ -0,0 +1,57 @@
+from datetime import date, datetime, timedelta
+
+from backend.routing import FlightGraph, Leg
+
+DAY = date.today() + timedelta(days=7)
+
+
+def at(hour, minute=0):
+    return datetime.combine(DAY, datetime.min.time()) + timedelta(hours=hour, minutes=minute)
+
+
+def make_graph(legs):
+    graph = FlightGraph()
+    for leg in legs:
+        graph._insert(leg)
+    return graph
+
+
+def test_hub_arrivals_without_connections_do_not_hide_itinerary():
+    # Дешёвые поздние прилёты в хаб не стыкуются ни с чем и не должны
+    # исчерпать лимит перебора до единственного рабочего маршрута
+    dead_ends = [Leg(100 + i, "a", "h", at(20), at(22), 10.0) for i in range(50)]
+    first = Leg(1, "a", "h", at(6), at(7), 100.0)
+    second = Leg(2, "h", "b", at(9), at(10), 100.0)
+    graph = make_graph(dead_ends + [first, second])
+
+    result = graph.search({"a"}, {"b"}, DAY, max_connections=1, limit=20)
+
+    assert result == [(first, second)]
+
+
+def test_search_orders_by_price_and_respects_layover():
+    legs = [
+        Leg(1, "a", "b", at(8), at(12), 300.0),
+        Leg(2, "a", "h", at(6), at(7), 50.0),
+        Leg(3, "h", "b", at(9), at(10), 50.0),
+        # Стыковка короче минимальной пересадки
+        Leg(4, "h", "b", at(7, 20), at(8, 20), 10.0),
+    ]
+    graph = make_graph(legs)
+
+    result = graph.search({"a"}, {"b"}, DAY, max_connections=1, limit=10)
+
+    assert [[leg.id for leg in path] for path in result] == [[2, 3], [1]]
+
+
+def test_excluded_legs_are_skipped():
+    legs = [
+        Leg(1, "a", "h", at(6), at(7), 50.0),
+        Leg(2, "h", "b", at(9), at(10), 50.0),
+        Leg(3, "a", "b", at(8), at(12), 300.0),
+    ]
+    graph = make_graph(legs)
+
+    result = graph.search({"a"}, {"b"}, DAY, max_connections=1, limit=10, exclude={2})
+
+    assert [[leg.id for leg in path] for path in result] == [[3]]